@@ -0,0 +1,160 @@
+"""
+Filename    :   BM25Index.py
+Copyright   :   FoundAItion Inc.
+Description :   Lexical inverted index with BM25 ranking
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from collections import Counter
+
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class BM25Index():
+    """Inverted index of chunk terms in SQLite, kept in sync with the vector store by chunk ids.
+    Identifiers like DOI or product codes are indexed whole as well as by words
+    """
+    DEFAULT_DB_NAME = "fai-bm25.db"
+    K1 = 1.2
+    B = 0.75
+    WORD = re.compile(r"\w+")
+    COMPOUND = re.compile(r"\w+(?:[./:\-]\w+)+")
+    MAX_QUERY_PARAMS = 500  # keep below SQLite host parameters limit
+    MAX_TERM_SHARE = 0.5  # of chunks, more common query terms are not scored
+
+    def __init__(self, db_path=DEFAULT_DB_NAME) -> None:
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.stats = None  # documents count, average length
+
+    @staticmethod
+    def tokenize(text) -> list[str]:
+        text = text.lower()
+        return BM25Index.WORD.findall(text) + BM25Index.COMPOUND.findall(text)
+
+    def _open(self) -> sqlite3.Connection:
+        if self.connection is None:
+            folder = os.path.dirname(self.db_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER, terms TEXT)")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS postings (
+                term TEXT, id TEXT, tf INTEGER, length INTEGER, PRIMARY KEY (term, id)) WITHOUT ROWID""")
+            self.connection.commit()
+            log.debug(f"BM25 index opened, {self.db_path=}")
+        return self.connection
+
+    def _stats(self) -> tuple((int, float)):
+        if self.stats is None:
+            count, average = self._open().execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            self.stats = count, average or 0.0
+        return self.stats
+
+    def count(self) -> int:
+        with self.lock:
+            return self._stats()[0]
+
+    def add(self, ids, texts) -> None:
+        docs = []
+        postings = []
+        for id, text in zip(ids, texts):
+            terms = Counter(BM25Index.tokenize(text))
+            length = sum(terms.values())
+            docs.append((id, length, json.dumps(list(terms))))
+            postings.extend((term, id, tf, length) for term, tf in terms.items())
+
+        with self.lock:
+            connection = self._open()
+            connection.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", docs)
+            connection.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?)", postings)
+            connection.commit()
+            self.stats = None
+
+    def delete(self, ids) -> None:
+        with self.lock:
+            connection = self._open()
+            for start in range(0, len(ids), BM25Index.MAX_QUERY_PARAMS):
+                chunk = ids[start:start + BM25Index.MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(f"SELECT id, terms FROM docs WHERE id IN ({placeholders})", chunk).fetchall()
+                connection.executemany("DELETE FROM postings WHERE term = ? AND id = ?",
+                                       [(term, id) for id, terms in rows for term in json.loads(terms)])
+                connection.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", chunk)
+            connection.commit()
+            self.stats = None
+
+    def clear(self) -> None:
+        """Remove the index file, it is created again on next use
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            if os.path.exists(self.db_path):
+                os.remove(self.db_path)
+            self.stats = None
+
+    def compact(self) -> None:
+        """Reclaim space of deleted postings
+        """
+        with self.lock:
+            self._open().execute("VACUUM")
+
+    def search(self, query, k) -> list[tuple[str, float]]:
+        """Rank chunks containing query terms by BM25, summed and ranked in SQLite. Terms found in
+        MAX_TERM_SHARE of chunks or more (classic idf <= 0) are skipped, unless all query terms are such
+        returns list of (id, score) in descending order
+        """
+        terms = list(set(BM25Index.tokenize(query)))[:BM25Index.MAX_QUERY_PARAMS // 2]
+        if not terms:
+            return []
+
+        with self.lock:
+            connection = self._open()
+            count, average_length = self._stats()
+            if not count:
+                return []
+
+            placeholders = ",".join("?" * len(terms))
+            frequencies = connection.execute(f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) "
+                                              "GROUP BY term", terms).fetchall()
+            if not frequencies:
+                return []
+
+            # common terms cost a scan of most of the index for almost no ranking signal
+            selected = [(term, frequency) for term, frequency in frequencies
+                        if frequency < BM25Index.MAX_TERM_SHARE * count]
+            selected = selected or [min(frequencies, key=lambda item: item[1])]
+
+            weights = []
+            for term, frequency in selected:
+                weights.extend((term, math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))))
+
+            values = ",".join(["(?, ?)"] * len(selected))
+            norm = BM25Index.K1 * BM25Index.B / average_length
+            rows = connection.execute(
+                f"""WITH query (term, idf) AS (VALUES {values})
+                SELECT id, SUM(idf * tf * ? / (tf + ? + ? * length)) AS score
+                FROM query JOIN postings USING (term) GROUP BY id ORDER BY score DESC LIMIT ?""",
+                (*weights, BM25Index.K1 + 1, BM25Index.K1 * (1 - BM25Index.B), norm, k)).fetchall()
+
+        return [(id, score) for id, score in rows]
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,87 @@
+"""
+Filename    :   ContextPacker.py
+Copyright   :   FoundAItion Inc.
+Description :   Token-budgeted selection of retrieved chunks for the prompt
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from FaiCommon.OAIAccess import get_encoding
+
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class ContextPacker():
+    """Picks relevant but not redundant chunks by maximal marginal relevance
+    and fits them into the token budget, the last one may be cut
+    """
+    DEFAULT_LAMBDA = 0.5  # 1 is relevance only, 0 is diversity only
+    MIN_CHUNK_TOKENS = 32  # shorter remainder of a cut chunk is not worth adding
+
+    def __init__(self, model, lambda_mult=DEFAULT_LAMBDA) -> None:
+        self.encoding = get_encoding(model)
+        self.lambda_mult = lambda_mult
+
+    def count_tokens(self, text) -> int:
+        return len(self.encoding.encode(text))
+
+    def mmr_order(self, relevance, vectors) -> list[int]:
+        """Greedy maximal marginal relevance: relevance to the question minus similarity
+        to chunks selected before
+        returns chunk indexes in selection order
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        similarities = vectors @ vectors.T
+
+        relevance = np.asarray(relevance, dtype=np.float32)
+        redundancy = np.zeros(len(relevance), dtype=np.float32)
+        selected = np.zeros(len(relevance), dtype=bool)
+        order = []
+        for _ in range(len(relevance)):
+            scores = self.lambda_mult * relevance - (1 - self.lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            index = int(np.argmax(scores))
+            order.append(index)
+            selected[index] = True
+            redundancy = np.maximum(redundancy, similarities[index])
+        return order
+
+    def pack(self, chunks, relevance, vectors, budget, max_chunks, overheads=None) -> list:
+        """Select chunks in MMR order while they fit the budget
+        chunks are RAGManager.Chunk, relevance is their 0..1 relevance to the question,
+        vectors are their embeddings, overheads are extra tokens of formatting every chunk into the prompt
+        returns selected chunks, text of the last one may be trimmed
+        """
+        if not chunks or budget <= 0:
+            return []
+
+        overheads = overheads or [0] * len(chunks)
+        order = self.mmr_order(relevance, vectors)
+
+        packed = []
+        used = 0
+        for index in order:
+            if len(packed) >= max_chunks:
+                break
+
+            chunk = chunks[index]
+            tokens = self.encoding.encode(chunk.text)
+            available = budget - used - overheads[index]
+            if len(tokens) <= available:
+                packed.append(chunk)
+                used += len(tokens) + overheads[index]
+                continue
+
+            if available >= ContextPacker.MIN_CHUNK_TOKENS:
+                packed.append(chunk._replace(text=self.encoding.decode(tokens[:available])))
+                used += available + overheads[index]
+            break
+
+        log.debug(f"Context packed: {len(packed)} of {len(chunks)} chunk(s) / {used} of {budget} token(s)")
+        return packed
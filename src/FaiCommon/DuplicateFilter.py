@@ -0,0 +1,125 @@
+"""
+Filename    :   DuplicateFilter.py
+Copyright   :   FoundAItion Inc.
+Description :   Near-duplicate text detection
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from langchain.schema import Document
+
+from typing import Any, Iterable, Iterator
+
+import hashlib
+import logging
+import numpy as np
+import re
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class DuplicateFilter():
+    """SimHash fingerprints of word shingles, near-duplicates are found by banded lookup
+    """
+    SHINGLE_SIZE = 3  # words
+    MAX_DISTANCE = 3  # bits of 64 bit fingerprint which may differ
+    BANDS = 4  # must be more than MAX_DISTANCE, so near-duplicates share at least one band
+    BAND_BITS = 64 // BANDS
+    WORD = re.compile(r"\w+")
+    BITS = np.arange(64, dtype=np.uint64)
+
+    def __init__(self, max_distance=MAX_DISTANCE) -> None:
+        if max_distance >= DuplicateFilter.BANDS:
+            raise Exception(f"Invalid distance {max_distance}, must be less than {DuplicateFilter.BANDS}")
+
+        self.max_distance = max_distance
+        self.bands = [{} for _ in range(DuplicateFilter.BANDS)]
+        self.origins = {}  # fingerprints by origin, to forget them
+        self.lock = threading.Lock()
+        self.count = 0
+        self.skipped = 0
+
+    @staticmethod
+    def fingerprint(text) -> int:
+        """64 bit SimHash of the text
+        returns fingerprint
+        """
+        words = DuplicateFilter.WORD.findall(text.lower())
+        size = min(DuplicateFilter.SHINGLE_SIZE, len(words))
+        shingles = [" ".join(words[index:index + size]) for index in range(len(words) - size + 1)] if size else [text]
+
+        hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+                           for shingle in shingles], dtype=np.uint64)
+        bits = (hashes[:, None] >> DuplicateFilter.BITS) & np.uint64(1)
+
+        # majority vote of every bit over all shingles
+        votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(shingles)
+        return int(np.packbits((votes > 0)[::-1]).view(">u8")[0])
+
+    def _keys(self, fingerprint) -> list[int]:
+        mask = (1 << DuplicateFilter.BAND_BITS) - 1
+        return [(fingerprint >> (band * DuplicateFilter.BAND_BITS)) & mask for band in range(DuplicateFilter.BANDS)]
+
+    def add(self, fingerprint, origin=None) -> None:
+        """Remember fingerprint without checking it, e.g. of a text stored before
+        """
+        with self.lock:
+            for band, key in enumerate(self._keys(fingerprint)):
+                self.bands[band].setdefault(key, []).append((fingerprint, origin))
+            self.origins.setdefault(origin, []).append(fingerprint)
+
+    def remove(self, origin) -> None:
+        """Forget fingerprints of the origin, e.g. of a changed or removed document
+        """
+        with self.lock:
+            for fingerprint in self.origins.pop(origin, ()):
+                for band, key in enumerate(self._keys(fingerprint)):
+                    entries = self.bands[band].get(key, [])
+                    entries.remove((fingerprint, origin))
+                    if not entries:
+                        del self.bands[band][key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.bands = [{} for _ in range(DuplicateFilter.BANDS)]
+            self.origins.clear()
+
+    def match(self, fingerprint, origin=None) -> tuple((bool, Any)):
+        """Check fingerprint against all seen before, new one is remembered with its origin (e.g. source)
+        returns True/False if near-duplicate, origin of the text seen before
+        """
+        keys = self._keys(fingerprint)
+        with self.lock:
+            self.count += 1
+            for band, key in enumerate(keys):
+                for candidate, candidate_origin in self.bands[band].get(key, ()):
+                    if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                        self.skipped += 1
+                        return True, candidate_origin
+
+            for band, key in enumerate(keys):
+                self.bands[band].setdefault(key, []).append((fingerprint, origin))
+            self.origins.setdefault(origin, []).append(fingerprint)
+        return False, None
+
+    def duplicate_of(self, text, origin=None) -> tuple((bool, Any)):
+        """Check text against all texts seen before, new one is remembered with its origin (e.g. source)
+        returns True/False if near-duplicate, origin of the text seen before
+        """
+        return self.match(DuplicateFilter.fingerprint(text), origin)
+
+    def is_duplicate(self, text) -> bool:
+        """Check text against all texts seen before, new one is remembered
+        returns True if near-duplicate
+        """
+        return self.duplicate_of(text)[0]
+
+    def filter(self, chunks: Iterable[Document]) -> Iterator[Document]:
+        """Drop near-duplicate chunks (generator)
+        yields unique chunks
+        """
+        for chunk in chunks:
+            if not self.is_duplicate(chunk.page_content):
+                yield chunk
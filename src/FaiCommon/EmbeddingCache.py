@@ -0,0 +1,97 @@
+"""
+Filename    :   EmbeddingCache.py
+Copyright   :   FoundAItion Inc.
+Description :   Content-addressed local cache of text embeddings
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import hashlib
+import logging
+import numpy as np
+import os
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class EmbeddingCache():
+    DEFAULT_DB_NAME = "fai-embedding-cache.db"
+    MAX_QUERY_PARAMS = 500  # keep below SQLite host parameters limit
+
+    def __init__(self, db_path=DEFAULT_DB_NAME) -> None:
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = None
+
+    @staticmethod
+    def make_key(text) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _open(self) -> sqlite3.Connection:
+        if self.connection is None:
+            folder = os.path.dirname(self.db_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT, hash BLOB, vector BLOB, PRIMARY KEY (model, hash)) WITHOUT ROWID""")
+            self.connection.commit()
+            log.debug(f"Embedding cache opened, {self.db_path=}")
+        return self.connection
+
+    def get_many(self, model, texts) -> list:
+        """Cached embeddings of the texts for the model
+        returns list of float32 vectors or None if not found, in texts order
+        """
+        keys = [EmbeddingCache.make_key(text) for text in texts]
+        found = {}
+
+        with self.lock:
+            connection = self._open()
+            unique_keys = list(set(keys))
+
+            for start in range(0, len(unique_keys), EmbeddingCache.MAX_QUERY_PARAMS):
+                chunk = unique_keys[start:start + EmbeddingCache.MAX_QUERY_PARAMS]
+                rows = connection.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk]).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+
+        vectors = [found.get(key) for key in keys]
+        hits = sum(vector is not None for vector in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model, texts, embeddings) -> None:
+        """Store embeddings of the texts for the model, float32 blobs
+        """
+        rows = [(model, EmbeddingCache.make_key(text), np.asarray(embedding, dtype=np.float32).tobytes())
+                for text, embedding in zip(texts, embeddings)]
+
+        with self.lock:
+            connection = self._open()
+            connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            connection.commit()
+
+    def stats(self) -> dict:
+        """Cache counters
+        returns hits and misses
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,169 @@
+"""
+Filename    :   EmbeddingQuantizer.py
+Copyright   :   FoundAItion Inc.
+Description :   Compressed embedding codes, int8 scalar or product quantization
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class EmbeddingQuantizer():
+    """Encodes embeddings into uint8 codes, optionally after PCA reduction,
+    and scores codes against a query without decoding them.
+    Scores approximate dot products, candidates are expected to be re-ranked with full vectors
+    """
+    INT8 = "int8"  # 1 byte per dimension, 4x smaller than float32
+    PQ = "pq"  # 1 byte per subspace
+    PQ_CENTROIDS = 256
+    DEFAULT_SUBSPACE_SIZE = 4  # dimensions per PQ subspace, 16x smaller than float32
+    KMEANS_ITERATIONS = 20
+    TRAIN_SAMPLE = 65536  # rows
+    BLOCK_BYTES = 2 * 1024 * 1024  # float32 temporaries of a block of rows scored at once, stays in cache
+
+    def __init__(self, kind=INT8, pca_dim=None, subspaces=None) -> None:
+        if kind not in (EmbeddingQuantizer.INT8, EmbeddingQuantizer.PQ):
+            raise Exception(f"Invalid quantization {kind}")
+
+        self.kind = kind
+        self.pca_dim = pca_dim
+        self.subspaces = subspaces
+        self.mean = None
+        self.components = None  # (dim, pca_dim)
+        self.low = None
+        self.step = None
+        self.codebooks = None  # (subspaces, PQ_CENTROIDS, subspace size)
+
+    @property
+    def code_size(self) -> int:
+        return self.subspaces if self.kind == EmbeddingQuantizer.PQ else len(self.step)
+
+    @staticmethod
+    def _kmeans(data, k, generator) -> np.ndarray:
+        """Euclidean k-means
+        returns (k, dim) centroids
+        """
+        centroids = data[generator.choice(len(data), k, replace=len(data) < k)].copy()
+        for _ in range(EmbeddingQuantizer.KMEANS_ITERATIONS):
+            # argmin |x - c|^2 == argmax x.c - |c|^2 / 2
+            assignments = np.argmax(data @ centroids.T - 0.5 * (centroids * centroids).sum(axis=1), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, data)
+            counts = np.bincount(assignments, minlength=k)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    def _reduce(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.components is None:
+            return vectors
+        return (vectors - self.mean) @ self.components
+
+    def fit(self, vectors) -> None:
+        """Train PCA and quantizer on sample of the vectors
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        generator = np.random.default_rng(0)
+        if len(vectors) > EmbeddingQuantizer.TRAIN_SAMPLE:
+            vectors = vectors[np.sort(generator.choice(len(vectors), EmbeddingQuantizer.TRAIN_SAMPLE, replace=False))]
+
+        if self.pca_dim and self.pca_dim < vectors.shape[1]:
+            self.mean = vectors.mean(axis=0)
+            _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+            self.components = np.ascontiguousarray(vt[:self.pca_dim].T, dtype=np.float32)
+        reduced = self._reduce(vectors)
+        dim = reduced.shape[1]
+
+        if self.kind == EmbeddingQuantizer.INT8:
+            self.low = reduced.min(axis=0)
+            self.step = np.maximum((reduced.max(axis=0) - self.low) / 255, np.float32(1e-12)).astype(np.float32)
+        else:
+            self.subspaces = self.subspaces or max(1, dim // EmbeddingQuantizer.DEFAULT_SUBSPACE_SIZE)
+            if dim % self.subspaces:
+                raise Exception(f"Invalid PQ subspaces {self.subspaces}, must divide dimension {dim}")
+
+            parts = reduced.reshape(len(reduced), self.subspaces, -1)
+            self.codebooks = np.stack([EmbeddingQuantizer._kmeans(parts[:, index], EmbeddingQuantizer.PQ_CENTROIDS,
+                                                                  generator)
+                                       for index in range(self.subspaces)]).astype(np.float32)
+
+        log.debug(f"Quantizer trained: {self.kind} / {len(vectors)} row(s) / {dim} dimension(s) / "
+                  f"{self.code_size} byte(s) per code")
+
+    def encode(self, vectors) -> np.ndarray:
+        """Compress vectors
+        returns (rows, code_size) uint8 codes
+        """
+        reduced = self._reduce(vectors)
+        if self.kind == EmbeddingQuantizer.INT8:
+            return np.clip(np.rint((reduced - self.low) / self.step), 0, 255).astype(np.uint8)
+
+        parts = reduced.reshape(len(reduced), self.subspaces, -1)
+        codes = np.empty((len(reduced), self.subspaces), dtype=np.uint8)
+        for index, codebook in enumerate(self.codebooks):
+            codes[:, index] = np.argmax(parts[:, index] @ codebook.T - 0.5 * (codebook * codebook).sum(axis=1), axis=1)
+        return codes
+
+    def scores(self, codes, query, rows=None) -> np.ndarray:
+        """Approximate dot products of encoded vectors with the query, codes are not decoded:
+        q.x ~ q.mean + (q W).x', x' is reconstructed from the codes. Codes are read by blocks
+        in place, or gathered by blocks if rows are given, so temporaries stay within BLOCK_BYTES
+        returns float32 scores of all codes or of the rows
+        """
+        query = np.asarray(query, dtype=np.float32)
+        base = np.float32(0)
+        if self.components is not None:
+            base = query @ self.mean
+            query = query @ self.components
+
+        if self.kind == EmbeddingQuantizer.INT8:
+            scaled = query * self.step
+            base += query @ self.low
+
+            def Score(block):
+                return block.astype(np.float32) @ scaled
+        else:
+            # asymmetric distance: lookup table of query subvector products with every centroid
+            table = np.einsum("sd,scd->sc", query.reshape(self.subspaces, -1), self.codebooks)
+            subspaces = np.arange(self.subspaces)
+
+            def Score(block):
+                return table[subspaces, block].sum(axis=1)
+
+        count = len(codes) if rows is None else len(rows)
+        block_rows = max(1, EmbeddingQuantizer.BLOCK_BYTES // (4 * self.code_size))
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block_rows):
+            end = min(start + block_rows, count)
+            scores[start:end] = Score(codes[start:end] if rows is None else codes[rows[start:end]])
+        scores += base
+        return scores
+
+    def save(self, path) -> None:
+        arrays = {"kind": np.array(self.kind)}
+        for name in ("mean", "components", "low", "step", "codebooks"):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @staticmethod
+    def load(path) -> "EmbeddingQuantizer":
+        with np.load(path) as arrays:
+            quantizer = EmbeddingQuantizer(str(arrays["kind"]))
+            for name in ("mean", "components", "low", "step", "codebooks"):
+                if name in arrays:
+                    setattr(quantizer, name, arrays[name])
+
+        if quantizer.components is not None:
+            quantizer.pca_dim = quantizer.components.shape[1]
+        if quantizer.codebooks is not None:
+            quantizer.subspaces = len(quantizer.codebooks)
+        return quantizer
@@ -4,18 +4,22 @@ Copyright   :   FoundAItion Inc.
 Description :   Image recognition
 Written by  :   Alex Fedosov
 Created     :   07/27/2023
-Updated     :   07/27/2023
+Updated     :   10/17/2026
 """
 
+from FaiCommon.Metrics import Metrics
+
 import logging
 import os
 import clip
 import PIL
 import sys
+import time
 import torch
 
 
 log = logging.getLogger(__name__)
+metrics = Metrics()
 
 
 class ImageCog():
@@ -24,6 +28,7 @@ class ImageCog():
 
     def __init__(self, model_name=DEFAULT_MODEL) -> None:
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model_name = model_name
         model_path = os.path.join("ImageCog\models", model_name)
         if getattr(sys, 'frozen', False):
             self.full_path_to_model = os.path.join(sys._MEIPASS, model_path)
@@ -43,6 +48,7 @@ class ImageCog():
         if not isinstance(image, PIL.Image.Image):
             raise Exception("Invalid argument type, image is not a PIL Image")
         
+        start_time = time.monotonic()
         try:
             if self.model is None or self.preprocess is None:
                 self.model, self.preprocess = clip.load(self.full_path_to_model, device=self.device)
@@ -72,7 +78,9 @@ class ImageCog():
                     recognized_probability = probability
 
             log.debug(f"Image recognition result: {result_verbose=}")
+            metrics.observe("image_recognition_seconds", time.monotonic() - start_time, model=self.model_name)
             return recognized_label, recognized_probability, result_verbose
         except Exception as err:
             log.error(f"Image recognition exception: {err}")
+            metrics.error("image_recognition", type(err).__name__, model=self.model_name)
             return "", 0, ""
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+Filename    :   IngestionManifest.py
+Copyright   :   FoundAItion Inc.
+Description :   Manifest of ingested files for incremental ingestion
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import typing
+
+log = logging.getLogger(__name__)
+
+
+class IngestionManifest():
+    DEFAULT_DB_NAME = "fai-manifest.db"
+    HASH_BLOCK_SIZE = 1024 * 1024  # bytes
+    MAX_QUERY_PARAMS = 500  # keep below SQLite host parameters limit
+
+    class Entry(typing.NamedTuple):
+        path: str
+        spec: str
+        size: int
+        mtime: float
+        hash: str
+        chunk_ids: list
+
+    def __init__(self, db_path=DEFAULT_DB_NAME) -> None:
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    @staticmethod
+    def file_hash(path) -> str:
+        """Content hash, file is read by blocks
+        returns sha256 hex digest
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(IngestionManifest.HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _open(self) -> sqlite3.Connection:
+        if self.connection is None:
+            folder = os.path.dirname(self.db_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, spec TEXT, size INTEGER, mtime REAL, hash TEXT, chunk_ids TEXT)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS files_spec ON files (spec)")
+            # chunks of path dropped as near-duplicates of chunks kept from source
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS depends (
+                path TEXT, source TEXT, PRIMARY KEY (path, source))""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS depends_source ON depends (source)")
+            # SimHash of stored chunks, near-duplicates are looked up against the whole partition
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS fingerprints (
+                id TEXT PRIMARY KEY, source TEXT, fingerprint INTEGER)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS fingerprints_source ON fingerprints (source)")
+            self.connection.commit()
+            log.debug(f"Ingestion manifest opened, {self.db_path=}")
+        return self.connection
+
+    def get(self, path) -> typing.Optional[Entry]:
+        with self.lock:
+            row = self._open().execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        return IngestionManifest.Entry(*row[:5], json.loads(row[5]))
+
+    def paths(self, spec) -> list[str]:
+        """Files ingested with this folder search pattern
+        returns list of paths
+        """
+        with self.lock:
+            rows = self._open().execute("SELECT path FROM files WHERE spec = ?", (spec,)).fetchall()
+        return [row[0] for row in rows]
+
+    def put(self, entry: Entry) -> None:
+        with self.lock:
+            connection = self._open()
+            connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                               (*entry[:5], json.dumps(entry.chunk_ids)))
+            connection.commit()
+
+    def set_depends(self, path, sources) -> None:
+        """Files whose chunks stand in for near-duplicate chunks of path, replaces previous ones
+        """
+        with self.lock:
+            connection = self._open()
+            connection.execute("DELETE FROM depends WHERE path = ?", (path,))
+            connection.executemany("INSERT INTO depends VALUES (?, ?)", [(path, source) for source in sources])
+            connection.commit()
+
+    def dependents(self, sources) -> set[str]:
+        """Files which lose chunks if any of sources is changed or removed
+        returns set of paths
+        """
+        sources = list(sources)
+        paths = set()
+        with self.lock:
+            connection = self._open()
+            for start in range(0, len(sources), IngestionManifest.MAX_QUERY_PARAMS):
+                chunk = sources[start:start + IngestionManifest.MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                paths.update(row[0] for row in connection.execute(
+                    f"SELECT path FROM depends WHERE source IN ({placeholders})", chunk))
+        return paths
+
+    def put_fingerprints(self, rows) -> None:
+        """Fingerprints of stored chunks, [(chunk id, source, 64 bit fingerprint)]
+        """
+        with self.lock:
+            connection = self._open()
+            # SQLite integers are signed
+            connection.executemany("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)",
+                                   [(id, source, fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint)
+                                    for id, source, fingerprint in rows])
+            connection.commit()
+
+    def remove_fingerprints(self, ids) -> None:
+        with self.lock:
+            connection = self._open()
+            for start in range(0, len(ids), IngestionManifest.MAX_QUERY_PARAMS):
+                chunk = ids[start:start + IngestionManifest.MAX_QUERY_PARAMS]
+                connection.execute(f"DELETE FROM fingerprints WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            connection.commit()
+
+    def fingerprints(self) -> list[tuple[str, int]]:
+        """Fingerprints of all stored chunks
+        returns list of (source, fingerprint)
+        """
+        with self.lock:
+            rows = self._open().execute("SELECT source, fingerprint FROM fingerprints").fetchall()
+        return [(source, fingerprint & ((1 << 64) - 1)) for source, fingerprint in rows]
+
+    def remove(self, path) -> None:
+        with self.lock:
+            connection = self._open()
+            connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            connection.execute("DELETE FROM depends WHERE path = ?", (path,))
+            connection.execute("DELETE FROM fingerprints WHERE source = ?", (path,))
+            connection.commit()
+
+    def clear(self) -> None:
+        with self.lock:
+            connection = self._open()
+            connection.execute("DELETE FROM files")
+            connection.execute("DELETE FROM depends")
+            connection.execute("DELETE FROM fingerprints")
+            connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
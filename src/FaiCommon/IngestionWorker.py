@@ -0,0 +1,228 @@
+"""
+Filename    :   IngestionWorker.py
+Copyright   :   FoundAItion Inc.
+Description :   Background ingestion job queue with progress, pause and cancel
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+import typing
+
+log = logging.getLogger(__name__)
+
+
+class IngestionCancelled(Exception):
+    pass
+
+
+class IngestionJob():
+    """Ingestion task and its progress, RAGManager reports progress and checks for pause/cancel
+    through checkpoint() while ingesting
+    """
+    FOLDER = "folder"
+    WEB = "web"
+    RESET = "reset"
+    COMPACT = "compact"
+
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    PAUSED = "Paused"
+    CANCELLED = "Cancelled"
+    DONE = "Done"
+    FAILED = "Failed"
+
+    PROGRESS_INTERVAL = 0.5  # sec between progress events
+    ids = itertools.count(1)
+
+    class Progress(typing.NamedTuple):
+        job_id: int
+        kind: str
+        target: str
+        state: str
+        files: int  # files or pages chunked so far
+        files_total: typing.Optional[int]  # unknown for web
+        chunks: int
+        tokens: int
+        duplicates: int
+        elapsed: float  # sec
+        eta: typing.Optional[float]  # sec, None if unknown
+        status: str  # result of ingestion
+
+    def __init__(self, kind, target="", max_depth=2, tag="") -> None:
+        self.id = next(IngestionJob.ids)
+        self.kind = kind
+        self.target = target
+        self.max_depth = max_depth
+        self.tag = tag  # partition to ingest into, tags to reset or compact (None for all)
+        self.state = IngestionJob.QUEUED
+        self.status = ""
+        self.notify = None  # progress callback, set by worker
+        self.lock = threading.Lock()
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.cancelled = False
+
+        self.started = None
+        self.last_notified = 0
+        self.sizes = {}  # bytes by file path, for ETA
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.sources = set()
+        self.files_total = None
+        self.chunks = 0
+        self.tokens = 0
+        self.duplicates = 0
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self.resumed.set()
+
+    def pause(self) -> None:
+        if self.state == IngestionJob.RUNNING:
+            self.resumed.clear()
+            self._set_state(IngestionJob.PAUSED)
+
+    def resume(self) -> None:
+        if self.state == IngestionJob.PAUSED:
+            self._set_state(IngestionJob.RUNNING)
+            self.resumed.set()
+
+    def _set_state(self, state) -> None:
+        self.state = state
+        self._notify(force=True)
+
+    def start(self, sizes=None) -> None:
+        """Files to ingest are known, sizes are {path: bytes}
+        """
+        with self.lock:
+            self.sizes = sizes or {}
+            self.files_total = len(self.sizes) if sizes is not None else None
+            self.bytes_total = sum(self.sizes.values())
+
+    def checkpoint(self) -> None:
+        """Blocks while paused
+        raises IngestionCancelled if cancelled
+        """
+        if not self.resumed.is_set():
+            self.resumed.wait()
+        if self.cancelled:
+            raise IngestionCancelled("Ingestion cancelled")
+
+    def add_chunk(self, source, tokens) -> None:
+        with self.lock:
+            if source not in self.sources:
+                self.sources.add(source)
+                self.bytes_done += self.sizes.get(source, 0)
+            self.chunks += 1
+            self.tokens += tokens
+        self._notify()
+
+    def progress(self) -> Progress:
+        with self.lock:
+            elapsed = time.time() - self.started if self.started else 0
+            eta = None
+            if self.bytes_total and self.bytes_done:
+                # file is counted when its first chunk arrives, so ETA is slightly optimistic
+                eta = elapsed * (self.bytes_total - self.bytes_done) / self.bytes_done
+            return IngestionJob.Progress(self.id, self.kind, self.target, self.state, len(self.sources),
+                                         self.files_total, self.chunks, self.tokens, self.duplicates,
+                                         elapsed, eta, self.status)
+
+    def _notify(self, force=False) -> None:
+        now = time.time()
+        if self.notify is not None and (force or now - self.last_notified >= IngestionJob.PROGRESS_INTERVAL):
+            self.last_notified = now
+            self.notify(self.progress())
+
+
+class IngestionWorker(threading.Thread):
+    """Runs ingestion jobs one by one in a background thread, so callers (UI) are not blocked.
+    Progress callback is called from the worker thread
+    """
+    def __init__(self, rag_manager, on_progress=None) -> None:
+        super().__init__(daemon=True)
+        self.rag_manager = rag_manager
+        self.on_progress = on_progress
+        self.jobs = queue.Queue()
+        self.pending = []
+        self.current = None
+        self.lock = threading.Lock()
+        self.start()
+
+    def submit_folder(self, folder_path, tag="") -> IngestionJob:
+        return self.submit(IngestionJob(IngestionJob.FOLDER, folder_path, tag=tag))
+
+    def submit_web(self, url, max_depth=2, tag="") -> IngestionJob:
+        return self.submit(IngestionJob(IngestionJob.WEB, url, max_depth, tag=tag))
+
+    def submit_reset(self, tags=None) -> IngestionJob:
+        return self.submit(IngestionJob(IngestionJob.RESET, tag=tags))
+
+    def submit_compact(self, tags=None) -> IngestionJob:
+        return self.submit(IngestionJob(IngestionJob.COMPACT, tag=tags))
+
+    def submit(self, job) -> IngestionJob:
+        job.notify = self.on_progress
+        with self.lock:
+            self.pending.append(job)
+        self.jobs.put(job)
+        job._notify(force=True)
+        log.debug(f"Ingestion job {job.id} queued: {job.kind} {job.target} {job.tag=}")
+        return job
+
+    def queued_count(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def cancel_all(self) -> None:
+        with self.lock:
+            jobs = self.pending + ([self.current] if self.current is not None else [])
+        for job in jobs:
+            job.cancel()
+
+    def run(self) -> None:
+        while True:
+            job = self.jobs.get()
+            with self.lock:
+                self.pending.remove(job)
+                self.current = job
+
+            try:
+                if job.cancelled:
+                    job.status = "Ingestion cancelled"
+                    job._set_state(IngestionJob.CANCELLED)
+                    continue
+                self._run(job)
+            finally:
+                with self.lock:
+                    self.current = None
+
+    def _run(self, job) -> None:
+        job.started = time.time()
+        job._set_state(IngestionJob.RUNNING)
+
+        try:
+            if job.kind == IngestionJob.FOLDER:
+                ok, status = self.rag_manager.ingest_from_folder(job.target, tag=job.tag, job=job)
+            elif job.kind == IngestionJob.WEB:
+                ok, status = self.rag_manager.ingest_from_web(job.target, max_depth=job.max_depth, tag=job.tag, job=job)
+            elif job.kind == IngestionJob.COMPACT:
+                ok, status = self.rag_manager.compact(job.tag)
+            else:
+                ok, status = True, f"{self.rag_manager.reset(job.tag)}"
+        except Exception as err:
+            ok, status = False, str(err)
+
+        job.duplicates = self.rag_manager.duplicates_skipped
+        job.status = status
+        if job.cancelled:
+            job._set_state(IngestionJob.CANCELLED)
+        else:
+            job._set_state(IngestionJob.DONE if ok else IngestionJob.FAILED)
+        log.debug(f"Ingestion job {job.id} complete: {job.state} / {status} / {time.time() - job.started:.2f} sec")
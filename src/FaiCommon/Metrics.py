@@ -0,0 +1,226 @@
+"""
+Filename    :   Metrics.py
+Copyright   :   FoundAItion Inc.
+Description :   Counters and latency histograms, Prometheus text and JSON export
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Metrics():
+    """Process wide registry of labeled counters and latency histograms. Singleton class.
+    Disabled unless enable() is called or FAI_METRICS environment variable is set,
+    a disabled update is a single attribute check
+    """
+    instance = None
+
+    PREFIX = "fai_"
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # sec
+
+    COUNTER = "counter"
+    HISTOGRAM = "histogram"
+
+    # name: (type, help), histograms are in seconds, counters get _total suffix on export
+    DEFINITIONS = {
+        "completion_seconds": (HISTOGRAM, "Chat completion latency"),
+        "completion_first_token_seconds": (HISTOGRAM, "Streamed chat completion time to first token"),
+        "completion_tokens": (COUNTER, "Tokens used by chat completions"),
+        "completion_cache_hits": (COUNTER, "Chat completions answered from the response cache"),
+        "completion_errors": (COUNTER, "Failed chat completions"),
+        "completion_retries": (COUNTER, "Retried chat completion requests"),
+        "embedding_seconds": (HISTOGRAM, "Embedding request latency"),
+        "embedding_texts": (COUNTER, "Texts embedded"),
+        "embedding_tokens": (COUNTER, "Tokens used by embeddings"),
+        "embedding_errors": (COUNTER, "Failed embedding requests"),
+        "embedding_retries": (COUNTER, "Retried embedding requests"),
+        "image_seconds": (HISTOGRAM, "Image generation latency"),
+        "image_errors": (COUNTER, "Failed image generations"),
+        "image_retries": (COUNTER, "Retried image generation requests"),
+        "rag_retrieval_seconds": (HISTOGRAM, "RAG retrieval latency, per batch of questions"),
+        "rag_retrieval_questions": (COUNTER, "Questions searched in the RAG database"),
+        "rag_retrieval_errors": (COUNTER, "Failed RAG retrievals"),
+        "rag_answer_seconds": (HISTOGRAM, "RAG answer latency, LLM chain call"),
+        "rag_answer_tokens": (COUNTER, "Tokens used by RAG answers"),
+        "rag_answer_cache_hits": (COUNTER, "RAG questions answered from the semantic cache"),
+        "rag_answer_errors": (COUNTER, "Failed RAG answers"),
+        "image_recognition_seconds": (HISTOGRAM, "Image recognition latency"),
+        "image_recognition_errors": (COUNTER, "Failed image recognitions"),
+        "voice_recognition_seconds": (HISTOGRAM, "Voice recognition latency, including listening"),
+        "voice_recognition_errors": (COUNTER, "Failed voice recognitions"),
+    }
+
+    class Timer():
+        """Observes latency of the block, counts an error if it raises
+        """
+        def __init__(self, metrics, name, labels) -> None:
+            self.metrics = metrics
+            self.name = name
+            self.labels = labels
+            self.start_time = None
+
+        def __enter__(self):
+            self.start_time = time.monotonic()
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            self.metrics.observe(self.name, time.monotonic() - self.start_time, **self.labels)
+            if exc_type is not None:
+                self.metrics.error(self.name, exc_type.__name__, **self.labels)
+            return False
+
+    class NullTimer():
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            return False
+
+    NULL_TIMER = NullTimer()
+
+    def __new__(cls, *args, **kwargs):
+        if not isinstance(cls.instance, cls):
+            cls.instance = super(Metrics, cls).__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> None:
+        if getattr(self, "lock", None) is not None:
+            return
+
+        self.lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts, sum, count, max]
+        self.enabled = bool(os.getenv("FAI_METRICS"))
+
+    def enable(self, enabled=True) -> None:
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def inc(self, name, value=1, **labels) -> None:
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels) -> None:
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(Metrics.LATENCY_BUCKETS) + 1), 0.0, 0, 0.0]
+            histogram[0][bisect.bisect_left(Metrics.LATENCY_BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            histogram[3] = max(histogram[3], seconds)
+
+    def error(self, name, error, **labels) -> None:
+        """Count an error of the operation, name of its latency histogram or the operation itself
+        """
+        if not self.enabled:
+            return
+        self.inc(name.removesuffix("_seconds") + "_errors", error=error, **labels)
+
+    def timer(self, name, **labels):
+        """Context manager observing latency histogram name
+        returns timer, no-op if disabled
+        """
+        if not self.enabled:
+            return Metrics.NULL_TIMER
+        return Metrics.Timer(self, name, labels)
+
+    def retry_counter(self, name, **labels):
+        """Tenacity before_sleep callback, counts retry attempts
+        returns callback
+        """
+        def CountRetry(retry_state):
+            self.inc(name, **labels)
+        return CountRetry
+
+    def snapshot(self) -> dict:
+        """All metrics with percentiles estimated from histogram buckets, the observed maximum
+        above the last bucket, so the snapshot is valid JSON
+        returns {"counters": [...], "histograms": [...]}
+        """
+        def Percentile(buckets, count, maximum, share):
+            rank = share * count
+            total = 0
+            for bound, bucket in zip(Metrics.LATENCY_BUCKETS, buckets):
+                total += bucket
+                if total >= rank:
+                    return min(bound, maximum)
+            return maximum
+
+        with self.lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), "count": count, "sum": total, "max": maximum,
+                           "buckets": dict(zip([str(bound) for bound in Metrics.LATENCY_BUCKETS] + ["+Inf"], buckets)),
+                           "p50": Percentile(buckets, count, maximum, 0.5),
+                           "p95": Percentile(buckets, count, maximum, 0.95),
+                           "p99": Percentile(buckets, count, maximum, 0.99)}
+                          for (name, labels), (buckets, total, count, maximum) in sorted(self.histograms.items())]
+        return {"enabled": self.enabled, "counters": counters, "histograms": histograms}
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format
+        returns text
+        """
+        def Labels(labels, extra=()):
+            labels = list(labels) + list(extra)
+            if not labels:
+                return ""
+            escaped = [(name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+                       for name, value in labels]
+            return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+        def Header(lines, name, metric_type, described):
+            if name not in described:
+                help = Metrics.DEFINITIONS.get(name, (None, name))[1]
+                lines.append(f"# HELP {Metrics.PREFIX}{name} {help}")
+                lines.append(f"# TYPE {Metrics.PREFIX}{name} {metric_type}")
+                described.add(name)
+
+        lines = []
+        described = set()
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                Header(lines, name, Metrics.COUNTER, described)
+                lines.append(f"{Metrics.PREFIX}{name}_total{Labels(labels)} {value}")
+
+            for (name, labels), (buckets, total, count, _) in sorted(self.histograms.items()):
+                Header(lines, name, Metrics.HISTOGRAM, described)
+                cumulative = 0
+                for bound, bucket in zip([str(bound) for bound in Metrics.LATENCY_BUCKETS] + ["+Inf"], buckets):
+                    cumulative += bucket
+                    lines.append(f"{Metrics.PREFIX}{name}_bucket{Labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{Metrics.PREFIX}{name}_sum{Labels(labels)} {total}")
+                lines.append(f"{Metrics.PREFIX}{name}_count{Labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path) -> None:
+        """Write metrics to file, JSON snapshot for .json, Prometheus text otherwise
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.prometheus())
+        log.debug(f"Metrics saved, {path=}")
@@ -0,0 +1,520 @@
+"""
+Filename    :   NumpyVectorStore.py
+Copyright   :   FoundAItion Inc.
+Description :   In-process vector store, memory-mapped float32 matrix
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.schema.vectorstore import VectorStore
+from langchain.vectorstores.utils import maximal_marginal_relevance
+
+from FaiCommon.EmbeddingQuantizer import EmbeddingQuantizer
+
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+import json
+import logging
+import numpy as np
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+
+log = logging.getLogger(__name__)
+
+
+class NumpyVectorStore(VectorStore):
+    """Normalized embeddings in a memory-mapped float32 matrix file, texts and metadata in SQLite.
+    Exact top-k search is one matrix-vector product, IVF coarse quantizer is optional for large stores.
+    With quantization the first pass runs on compressed codes kept in memory, candidates are re-ranked
+    with full vectors read from disk. Deleted rows stay in the matrix, masked, until compact()
+    """
+    VECTORS_FILE = "vectors.f32"
+    CHUNKS_FILE = "chunks.db"
+    IVF_FILE = "ivf.npz"
+    QUANTIZER_FILE = "quantizer.npz"
+    CODES_FILE = "codes.u8"
+    QUANTIZER_MIN_ROWS = 1024  # quantizer is trained once the store has that many vectors
+    RERANK_FACTOR = 8  # candidates re-ranked per requested result
+    MIN_RERANK = 64
+    DEFAULT_NPROBE = 8  # IVF lists searched per query
+    KMEANS_ITERATIONS = 20
+    KMEANS_SAMPLE = 256  # training rows per IVF list
+    BLOCK_ROWS = 65536  # rows processed at once when assigning IVF lists
+    BLOCK_QUERIES = 64  # queries searched with one matrix product
+    MAX_QUERY_PARAMS = 500  # keep below SQLite host parameters limit
+
+    def __init__(self, path, embedding_function: Embeddings, nprobe=DEFAULT_NPROBE,
+                 quantization=None, pca_dim=None) -> None:
+        self.path = path
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        self.quantization = quantization  # None, EmbeddingQuantizer.INT8 or EmbeddingQuantizer.PQ
+        self.pca_dim = pca_dim
+        self.lock = threading.RLock()
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self._connect()
+        row = self.connection.execute("SELECT value FROM info WHERE key = 'dim'").fetchone()
+        self.dim = int(row[0]) if row is not None else None
+        vectors_path = os.path.join(path, NumpyVectorStore.VECTORS_FILE)
+        self.rows = os.path.getsize(vectors_path) // (4 * self.dim) if self.dim and os.path.exists(vectors_path) else 0
+
+        self.matrix = None
+        self.live = None
+        self._load_ivf()
+        self._load_quantizer()
+        log.debug(f"Vector store opened, {self.path=} / {self.rows} row(s) / {self.dim=}")
+
+    def _connect(self) -> None:
+        self.connection = sqlite3.connect(os.path.join(self.path, NumpyVectorStore.CHUNKS_FILE),
+                                          check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS chunks (
+            row INTEGER PRIMARY KEY, id TEXT UNIQUE, text TEXT, metadata TEXT)""")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    def _matrix(self) -> np.ndarray:
+        """Memory-mapped vectors, remapped after append
+        returns (rows, dim) matrix
+        """
+        if self.matrix is None:
+            if not self.rows:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            self.matrix = np.memmap(os.path.join(self.path, NumpyVectorStore.VECTORS_FILE),
+                                    dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+        return self.matrix
+
+    def _live(self) -> np.ndarray:
+        """Mask of not deleted rows
+        returns bool array
+        """
+        if self.live is None:
+            self.live = np.zeros(self.rows, dtype=bool)
+            rows = self.connection.execute("SELECT row FROM chunks").fetchall()
+            if rows:
+                self.live[np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))] = True
+        return self.live
+
+    def count(self) -> int:
+        with self.lock:
+            return int(self._live().sum())
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def add_vectors(self, vectors, texts, metadatas, ids) -> List[str]:
+        """Add precomputed embeddings, same ids are replaced
+        returns ids
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.connection.execute("INSERT OR REPLACE INTO info VALUES ('dim', ?)", (str(self.dim),))
+            elif vectors.shape[1] != self.dim:
+                raise Exception(f"Invalid embedding dimension {vectors.shape[1]}, expected {self.dim}")
+
+            self.delete(ids)
+            with open(os.path.join(self.path, NumpyVectorStore.VECTORS_FILE), "ab") as f:
+                f.write(vectors.tobytes())
+
+            first_row = self.rows
+            self.connection.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                                        [(first_row + index, id, text, json.dumps(metadata))
+                                         for index, (id, text, metadata) in enumerate(zip(ids, texts, metadatas))])
+            self.connection.commit()
+
+            self.rows += len(vectors)
+            self.matrix = None
+            if self.live is not None:
+                self.live = np.concatenate([self.live, np.ones(len(vectors), dtype=bool)])
+
+            if self.ivf_centroids is not None:
+                self.ivf_assignments = np.concatenate([self.ivf_assignments, self._assign(vectors)])
+                self.ivf_lists = None
+                self._save_ivf()
+
+            if self.quantizer is not None:
+                codes = self.quantizer.encode(vectors)
+                with open(os.path.join(self.path, NumpyVectorStore.CODES_FILE), "ab") as f:
+                    f.write(codes.tobytes())
+                self.codes = np.concatenate([self.codes, codes])
+            elif self.quantization and self.count() >= NumpyVectorStore.QUANTIZER_MIN_ROWS:
+                self.build_quantizer()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+
+        with self.lock:
+            rows = []
+            for start in range(0, len(ids), NumpyVectorStore.MAX_QUERY_PARAMS):
+                chunk = ids[start:start + NumpyVectorStore.MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(row[0] for row in self.connection.execute(
+                    f"SELECT row FROM chunks WHERE id IN ({placeholders})", chunk))
+                self.connection.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", chunk)
+            self.connection.commit()
+
+            if rows and self.live is not None:
+                self.live[rows] = False
+        return True
+
+    def clear(self) -> int:
+        """Remove all records and files
+        returns # of removed records
+        """
+        with self.lock:
+            count = self.count()
+            self.connection.close()
+            self.matrix = None
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path)
+            self._connect()
+            self.dim = None
+            self.rows = 0
+            self.live = None
+            self.ivf_centroids = None
+            self.ivf_assignments = None
+            self.ivf_lists = None
+            self.quantizer = None
+            self.codes = None
+        return count
+
+    def compact(self) -> int:
+        """Rewrite vectors and codes without deleted rows, renumber chunks, retrain IVF and vacuum SQLite
+        returns # of removed rows
+        """
+        with self.lock:
+            live_rows = np.flatnonzero(self._live())
+            removed = self.rows - len(live_rows)
+            if removed:
+                vectors_path = os.path.join(self.path, NumpyVectorStore.VECTORS_FILE)
+                matrix = self._matrix()
+                with open(vectors_path + ".tmp", "wb") as f:
+                    for start in range(0, len(live_rows), NumpyVectorStore.BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(matrix[live_rows[start:start + NumpyVectorStore.BLOCK_ROWS]]).tobytes())
+                # memory map must be released before the file is replaced
+                del matrix
+                self.matrix = None
+                os.replace(vectors_path + ".tmp", vectors_path)
+
+                # rows only move down, so ascending updates never collide
+                self.connection.executemany("UPDATE chunks SET row = ? WHERE row = ?",
+                                            [(new_row, int(row)) for new_row, row in enumerate(live_rows)
+                                             if new_row != row])
+                self.connection.commit()
+                self.rows = len(live_rows)
+                self.live = None
+
+                if self.quantizer is not None:
+                    self.codes = np.ascontiguousarray(self.codes[live_rows])
+                    self.codes.tofile(os.path.join(self.path, NumpyVectorStore.CODES_FILE))
+
+                if self.ivf_centroids is not None:
+                    if self.rows >= len(self.ivf_centroids):
+                        self.build_ivf(len(self.ivf_centroids))
+                    else:
+                        self.ivf_centroids = None
+                        self._save_ivf()
+
+            self.connection.execute("VACUUM")
+            log.debug(f"Vector store compacted: {removed} row(s) removed / {self.rows} row(s) left")
+            return removed
+
+    def build_ivf(self, nlist=None) -> None:
+        """Train IVF coarse quantizer (spherical k-means) on stored vectors, searches then probe
+        nprobe nearest lists only
+        """
+        with self.lock:
+            matrix = self._matrix()
+            live_rows = np.flatnonzero(self._live())
+            nlist = nlist or max(1, int(np.sqrt(len(live_rows))))
+            if len(live_rows) < nlist:
+                raise Exception(f"Not enough vectors ({len(live_rows)}) for {nlist} IVF lists")
+
+            generator = np.random.default_rng(0)
+            sample_size = min(len(live_rows), nlist * NumpyVectorStore.KMEANS_SAMPLE)
+            sample = np.asarray(matrix[np.sort(generator.choice(live_rows, sample_size, replace=False))])
+            centroids = sample[generator.choice(sample_size, nlist, replace=False)].copy()
+
+            for _ in range(NumpyVectorStore.KMEANS_ITERATIONS):
+                assignments = np.argmax(sample @ centroids.T, axis=1)
+                for list_index in range(nlist):
+                    members = sample[assignments == list_index]
+                    if len(members):
+                        centroids[list_index] = members.sum(axis=0)
+                norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                centroids /= np.where(norms > 0, norms, 1)
+
+            self.ivf_centroids = centroids
+            self.ivf_assignments = np.concatenate(
+                [self._assign(matrix[start:start + NumpyVectorStore.BLOCK_ROWS])
+                 for start in range(0, self.rows, NumpyVectorStore.BLOCK_ROWS)])
+            self.ivf_lists = None
+            self._save_ivf()
+            log.debug(f"IVF built: {nlist} list(s) / {self.rows} row(s)")
+
+    def _assign(self, vectors) -> np.ndarray:
+        return np.argmax(np.asarray(vectors) @ self.ivf_centroids.T, axis=1).astype(np.int32)
+
+    def _load_ivf(self) -> None:
+        self.ivf_centroids = None
+        self.ivf_assignments = None
+        self.ivf_lists = None
+
+        ivf_path = os.path.join(self.path, NumpyVectorStore.IVF_FILE)
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                if len(ivf["assignments"]) == self.rows:
+                    self.ivf_centroids = ivf["centroids"]
+                    self.ivf_assignments = ivf["assignments"]
+
+    def _save_ivf(self) -> None:
+        ivf_path = os.path.join(self.path, NumpyVectorStore.IVF_FILE)
+        if self.ivf_centroids is None:
+            if os.path.exists(ivf_path):
+                os.remove(ivf_path)
+            return
+
+        with open(ivf_path, "wb") as f:
+            np.savez(f, centroids=self.ivf_centroids, assignments=self.ivf_assignments)
+
+    def build_quantizer(self, kind=None, pca_dim=None, subspaces=None) -> None:
+        """Train quantizer (and PCA if pca_dim is set) on stored vectors and encode all of them
+        """
+        with self.lock:
+            self.quantization = kind or self.quantization or EmbeddingQuantizer.INT8
+            self.pca_dim = pca_dim or self.pca_dim
+            matrix = self._matrix()
+            live_rows = np.flatnonzero(self._live())
+            if not len(live_rows):
+                raise Exception("No vectors to train quantizer")
+
+            generator = np.random.default_rng(0)
+            sample_size = min(len(live_rows), EmbeddingQuantizer.TRAIN_SAMPLE)
+            quantizer = EmbeddingQuantizer(self.quantization, self.pca_dim, subspaces)
+            quantizer.fit(matrix[np.sort(generator.choice(live_rows, sample_size, replace=False))])
+
+            codes = np.empty((self.rows, quantizer.code_size), dtype=np.uint8)
+            for start in range(0, self.rows, NumpyVectorStore.BLOCK_ROWS):
+                codes[start:start + NumpyVectorStore.BLOCK_ROWS] = \
+                    quantizer.encode(matrix[start:start + NumpyVectorStore.BLOCK_ROWS])
+
+            codes.tofile(os.path.join(self.path, NumpyVectorStore.CODES_FILE))
+            quantizer.save(os.path.join(self.path, NumpyVectorStore.QUANTIZER_FILE))
+            self.quantizer = quantizer
+            self.codes = codes
+            log.debug(f"Quantizer built: {self.rows} row(s) / {codes.nbytes} byte(s) of codes")
+
+    def _load_quantizer(self) -> None:
+        self.quantizer = None
+        self.codes = None
+
+        quantizer_path = os.path.join(self.path, NumpyVectorStore.QUANTIZER_FILE)
+        codes_path = os.path.join(self.path, NumpyVectorStore.CODES_FILE)
+        if os.path.exists(quantizer_path) and os.path.exists(codes_path):
+            quantizer = EmbeddingQuantizer.load(quantizer_path)
+            codes = np.fromfile(codes_path, dtype=np.uint8).reshape(-1, quantizer.code_size)
+            if len(codes) == self.rows:
+                self.quantizer = quantizer
+                self.codes = codes
+                self.quantization = quantizer.kind
+
+    def _candidates(self, query) -> Optional[np.ndarray]:
+        """Rows of nprobe IVF lists closest to the query
+        returns row numbers or None to search all rows
+        """
+        if self.ivf_centroids is None or self.nprobe >= len(self.ivf_centroids):
+            return None
+
+        if self.ivf_lists is None:
+            order = np.argsort(self.ivf_assignments, kind="stable")
+            bounds = np.searchsorted(self.ivf_assignments[order], np.arange(len(self.ivf_centroids) + 1))
+            self.ivf_lists = (order, bounds)
+
+        order, bounds = self.ivf_lists
+        probes = np.argpartition(-(self.ivf_centroids @ query), self.nprobe - 1)[:self.nprobe]
+        return np.sort(np.concatenate([order[bounds[probe]:bounds[probe + 1]] for probe in probes]))
+
+    @staticmethod
+    def _none() -> Tuple[np.ndarray, np.ndarray]:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    @staticmethod
+    def _top(rows, scores, k) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return NumpyVectorStore._none()
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def search_rows(self, query, k) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k by cosine similarity, one matrix-vector product over full vectors or over codes,
+        then exact re-rank of the best candidates
+        returns rows, scores in descending order
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        with self.lock:
+            if not self.rows or self.dim is None:
+                return NumpyVectorStore._none()
+
+            matrix = self._matrix()
+            live = self._live()
+            candidates = self._candidates(query)
+            if candidates is None:
+                rows = np.flatnonzero(live)
+            else:
+                rows = candidates[live[candidates]]
+
+            if self.quantizer is None:
+                scores = (matrix @ query)[rows] if candidates is None else matrix[rows] @ query
+                return NumpyVectorStore._top(rows, scores, k)
+
+            # codes are scored in place, deleted rows are masked in the scores
+            rerank = max(k * NumpyVectorStore.RERANK_FACTOR, NumpyVectorStore.MIN_RERANK)
+            if candidates is None:
+                scores = self.quantizer.scores(self.codes, query)
+                scores[~live] = -np.inf
+                rows, _ = NumpyVectorStore._top(np.arange(self.rows), scores, rerank)
+            else:
+                rows, _ = NumpyVectorStore._top(rows, self.quantizer.scores(self.codes, query, rows), rerank)
+            rows = np.sort(rows)
+            return NumpyVectorStore._top(rows, matrix[rows] @ query, k)
+
+    def search_rows_many(self, queries, k) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k for every query, exact search is one matrix product per block of queries
+        returns list of rows, scores in descending order
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1)
+
+        with self.lock:
+            if not self.rows or self.dim is None:
+                return [NumpyVectorStore._none() for _ in queries]
+
+            if self.quantizer is not None or self.ivf_centroids is not None:
+                return [self.search_rows(query, k) for query in queries]
+
+            matrix = self._matrix()
+            rows = np.flatnonzero(self._live())
+            results = []
+            for start in range(0, len(queries), NumpyVectorStore.BLOCK_QUERIES):
+                block = queries[start:start + NumpyVectorStore.BLOCK_QUERIES]
+                scores = (matrix @ block.T)[rows]
+                results.extend(NumpyVectorStore._top(rows, scores[:, index], k) for index in range(len(block)))
+            return results
+
+    def get_vectors(self, rows) -> np.ndarray:
+        with self.lock:
+            return np.asarray(self._matrix()[rows])
+
+    def _records(self, column, keys) -> dict:
+        """Stored chunks by row numbers or ids
+        returns {key: (row, id, document)}
+        """
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), NumpyVectorStore.MAX_QUERY_PARAMS):
+                chunk = keys[start:start + NumpyVectorStore.MAX_QUERY_PARAMS]
+                for key, row, id, text, metadata in self.connection.execute(
+                        f"SELECT {column}, row, id, text, metadata FROM chunks WHERE {column} IN ({','.join('?' * len(chunk))})",
+                        chunk):
+                    found[key] = (row, id, Document(page_content=text, metadata=json.loads(metadata)))
+        return found
+
+    def get_documents(self, rows) -> List[Document]:
+        """Stored chunks
+        returns documents in rows order
+        """
+        rows = [int(row) for row in rows]
+        found = self._records("row", rows)
+        return [found[row][2] for row in rows if row in found]
+
+    def get_by_ids(self, ids, vectors=False) -> dict:
+        """Stored chunks, with normalized embeddings if requested
+        returns {id: (document, vector or None)}, missing ids are skipped
+        """
+        found = list(self._records("id", list(ids)).values())
+        found_vectors = self.get_vectors([row for row, _, _ in found]) if vectors and found else [None] * len(found)
+        return {id: (document, vector) for (_, id, document), vector in zip(found, found_vectors)}
+
+    def similarity_search_by_vectors_with_ids(self, embeddings, k: int = 4) -> List[List[Tuple[str, Document, float]]]:
+        """Top-k chunks with their ids for every embedding, searched at once
+        returns list of lists of (id, document, cosine similarity)
+        """
+        results = self.search_rows_many(embeddings, k)
+        found = self._records("row", list({int(row) for rows, _ in results for row in rows}))
+        return [[(*found[row][1:], score) for row, score in zip(rows.tolist(), scores.tolist()) if row in found]
+                for rows, scores in results]
+
+    def similarity_search_by_vector_with_ids(self, embedding: List[float], k: int = 4) -> List[Tuple[str, Document, float]]:
+        """Top-k chunks with their ids
+        returns list of (id, document, cosine similarity)
+        """
+        return self.similarity_search_by_vectors_with_ids([embedding], k)[0]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(document, score) for _, document, score in self.similarity_search_by_vector_with_ids(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # scores are cosine similarities already
+        return lambda score: score
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        rows, _ = self.search_rows(embedding, max(k, fetch_k))
+        selected = maximal_marginal_relevance(np.asarray(embedding, dtype=np.float32), self.get_vectors(rows),
+                                              lambda_mult=lambda_mult, k=k)
+        return self.get_documents(rows[selected])
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self.embedding_function.embed_query(query),
+                                                            k, fetch_k, lambda_mult)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   path=None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
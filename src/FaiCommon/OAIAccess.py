@@ -4,25 +4,360 @@ Copyright   :   FoundAItion Inc.
 Description :   Access to OpenAI API
 Written by  :   Alex Fedosov
 Created     :   06/26/2023
-Updated     :   07/19/2023
+Updated     :   10/17/2026
 """
 
 from tenacity import retry, wait_random_exponential, stop_after_delay, \
     stop_after_attempt, retry_if_exception_type, retry_if_not_exception_type
 from openai.error import TryAgain
+from FaiCommon.Metrics import Metrics
+from FaiCommon.ResponseCache import ResponseCache
+from FaiCommon.Tracer import Tracer
 
+import aiohttp
+from collections import OrderedDict
+
+import asyncio
+import atexit
+import json
 import logging
+import numpy as np
 import openai
 import os
+import threading
+import tiktoken
 import time
 import typing
+import weakref
 
 log = logging.getLogger(__name__)
+metrics = Metrics()
+tracer = Tracer()
 
 
-class OpenAIAccess():
+def get_encoding(model) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def num_tokens_from_messages(messages, model) -> int:
+    """Local token count of the chat messages, approximate for function calls
+    returns # of tokens
+    """
+    encoding = get_encoding(model)
+
+    tokens_per_message = 3  # every message follows <|start|>{role/name}\n{content}<|end|>\n
+    num_tokens = 3  # every reply is primed with <|start|>assistant<|message|>
+    for message in messages:
+        num_tokens += tokens_per_message
+        for key, value in message.items():
+            if isinstance(value, dict):
+                value = " ".join(str(item) for item in value.values())
+            if value:
+                num_tokens += len(encoding.encode(str(value)))
+    return num_tokens
+
+
+class EventLoopThread(threading.Thread):
+    """Background event loop to run coroutines for synchronous callers. Singleton class.
+    """
+    instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not isinstance(cls.instance, cls):
+            cls.instance = super(EventLoopThread, cls).__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> None:
+        if getattr(self, "loop", None) is not None:
+            return
+
+        threading.Thread.__init__(self, daemon=True)
+        self.loop = asyncio.new_event_loop()
+        self.closers = weakref.WeakSet()  # objects with aclose(), closed on the loop at shutdown
+        self.start()
+        atexit.register(self.shutdown)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def add_closer(self, closer) -> None:
+        """Object with aclose() coroutine holding resources of the background loop, e.g. HTTP sessions
+        """
+        self.closers.add(closer)
+
+    def shutdown(self) -> None:
+        """Close registered objects and async generators on the background loop, then stop it,
+        called at interpreter exit
+        """
+        if self.loop.is_closed() or not self.is_alive():
+            return
+
+        async def Shutdown():
+            for closer in list(self.closers):
+                try:
+                    await closer.aclose()
+                except Exception as err:
+                    log.warning(f"Closing {type(closer).__name__} failed: {err}")
+            await self.loop.shutdown_asyncgens()
+
+        self.run_coroutine(Shutdown())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+        self.loop.close()
+
+    def run_coroutine(self, awaitable):
+        """Blocking call, waits for coroutine (or any awaitable) to complete on the background loop
+        returns coroutine result
+        """
+        # caller's current trace span is the parent of spans in the coroutine
+        span = tracer.current()
+
+        async def wrapper():
+            with tracer.attach(span):
+                return await awaitable
+
+        return asyncio.run_coroutine_threadsafe(wrapper(), self.loop).result()
+
+    def run_generator(self, async_generator) -> typing.Iterator:
+        """Blocking iteration over async generator running on the background loop (generator)
+        yields async generator items
+        """
+        try:
+            while True:
+                try:
+                    yield self.run_coroutine(async_generator.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # abandoned iteration, release async generator resources on its loop
+            self.close_generator(async_generator)
+
+    def close_generator(self, async_generator) -> None:
+        """Close async generator on the background loop, after shutdown it was closed with the loop
+        """
+        if not self.loop.is_closed():
+            self.run_coroutine(async_generator.aclose())
+
+
+class EmbeddingBatcher():
+    """Coalesces concurrent single text embeddings made within a short window into one request
+    """
+    WINDOW = 0.01  # sec
+
+    def __init__(self, access, window=WINDOW, max_batch_size=None) -> None:
+        self.access = access
+        self.window = window
+        self.max_batch_size = max_batch_size or AsyncOpenAIAccess.MAX_EMBEDDING_BATCH_SIZE
+        # texts are batched per event loop, futures can't be resolved from another one
+        self.pending = {}  # by event loop, [(text, future)]
+        self.timers = {}  # by event loop
+        self.lock = access.http_lock  # guards per loop state, as HTTP sessions of the access
+
+    async def embed(self, text):
+        """Text embedding, waits for the batch it was merged into
+        returns True/False, tokens, embedding, status
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        with self.lock:
+            for closed_loop in [item for item in self.pending if item.is_closed()]:
+                del self.pending[closed_loop]
+                self.timers.pop(closed_loop, None)
+
+            pending = self.pending.setdefault(loop, [])
+            pending.append((text, future))
+            full = len(pending) >= self.max_batch_size
+            if not full and loop not in self.timers:
+                self.timers[loop] = loop.call_later(self.window, self._flush, loop)
+
+        if full:
+            self._flush(loop)
+        return await future
+
+    def _flush(self, loop) -> None:
+        with self.lock:
+            timer = self.timers.pop(loop, None)
+            pending = self.pending.pop(loop, [])
+
+        if timer is not None:
+            timer.cancel()
+        if pending:
+            loop.create_task(self._embed_batch(pending))
+
+    async def _embed_batch(self, pending) -> None:
+        texts = [text for text, _ in pending]
+        try:
+            ok, _, embeddings, status = await self.access.get_embeddings(texts)
+        except Exception as err:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        encoding = get_encoding(self.access.embedding_model)
+        log.debug(f"Embedding batch complete: {len(pending)} text(s)")
+
+        for index, (text, future) in enumerate(pending):
+            if future.done():
+                continue  # cancelled by the caller
+            if ok:
+                future.set_result((True, len(encoding.encode(text)), embeddings[index], ""))
+            else:
+                future.set_result((False, 0, None, status))
+
+
+class ConversationHistory():
+    """Chat history kept within a token budget: system preamble once, recent turns verbatim,
+    older turns folded into a running summary. Tokens are counted locally, once per message
+    """
+    DEFAULT_BUDGET = 2000  # tokens of preamble, summary and turns sent with a request
+    LOW_WATERMARK = 0.5  # share of the budget left after compaction, so it's not done every turn
+    SUMMARY_TOKENS = 256  # summary length limit
+    SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+    def __init__(self, model, budget=DEFAULT_BUDGET) -> None:
+        self.model = model
+        self.budget = budget
+        self.preamble = []  # [(message, tokens)]
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns = []  # [[(message, tokens)]], each turn starts with user message
+
+    def _count(self, message) -> int:
+        # less reply priming counted once per request
+        return num_tokens_from_messages([message], self.model) - 3
+
+    def _summary_message(self) -> dict:
+        return {"role": "system", "content": ConversationHistory.SUMMARY_PREFIX + self.summary}
+
+    def set_preamble(self, messages) -> None:
+        """System messages at the start of the conversation, replaced not repeated
+        """
+        if [message for message, _ in self.preamble] != list(messages):
+            self.preamble = [(message, self._count(message)) for message in messages]
+
+    def start_turn(self, prompt) -> None:
+        message = {"role": "user", "content": prompt}
+        self.turns.append([(message, self._count(message))])
+
+    def append(self, message) -> None:
+        """Assistant reply or function call result of the current turn
+        """
+        self.turns[-1].append((message, self._count(message)))
+
+    def clear(self) -> None:
+        self.preamble = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns = []
+
+    def messages(self) -> list:
+        """Messages for the request: preamble, summary and turns
+        returns new list
+        """
+        messages = [message for message, _ in self.preamble]
+        if self.summary:
+            messages.append(self._summary_message())
+        messages.extend(message for turn in self.turns for message, _ in turn)
+        return messages
+
+    def tokens(self) -> int:
+        return (3 + sum(tokens for _, tokens in self.preamble) + self.summary_tokens +
+                sum(tokens for turn in self.turns for _, tokens in turn))
+
+    async def compact(self, summarizer=None) -> int:
+        """Fold the oldest turns into the summary when over budget, down to the low watermark,
+        summarizer is async (summary, messages) -> new summary, local transcript clipping if None or failed
+        returns # of folded turns
+        """
+        if self.tokens() <= self.budget or not self.turns:
+            return 0
+
+        target = self.budget * ConversationHistory.LOW_WATERMARK
+        total = self.tokens()
+        folded = []
+        while self.turns and total > target:
+            turn = self.turns.pop(0)
+            total -= sum(tokens for _, tokens in turn)
+            folded.extend(message for message, _ in turn)
+
+        summary = ""
+        if summarizer is not None:
+            try:
+                summary = await summarizer(self.summary, folded)
+            except Exception as err:
+                log.error(f"History summary exception: {err}")
+
+        encoding = get_encoding(self.model)
+        if not summary:
+            # most recent part of the transcript survives
+            summary = (self.summary + "\n" + ConversationHistory.transcript(folded)).strip()
+            tokens = encoding.encode(summary)
+            summary = encoding.decode(tokens[-ConversationHistory.SUMMARY_TOKENS:])
+
+        self.summary = summary
+        self.summary_tokens = self._count(self._summary_message())
+        log.debug(f"History compacted: {len(folded)} message(s) folded / {self.tokens()} of {self.budget} tokens")
+        return len(folded)
+
+    @staticmethod
+    def transcript(messages) -> str:
+        lines = []
+        for message in messages:
+            content = message.get("content")
+            if message.get("function_call"):
+                content = f"call {message['function_call']['name']}({message['function_call']['arguments']})"
+            elif message["role"] == "function":
+                content = f"{message.get('name')} returned {content}"
+            lines.append(f"{message['role']}: {content}")
+        return "\n".join(lines)
+
+
+class ChatSession():
+    """Conversation of one user: model, temperature and history. Sessions of an access object
+    share its pooled HTTP client, a session serves one conversation at a time
+    """
+    def __init__(self, session_id, completion_model, temperature, history_budget=ConversationHistory.DEFAULT_BUDGET) -> None:
+        self.id = session_id
+        self.completion_model = completion_model
+        self.temperature = 0
+        self.history = ConversationHistory(completion_model, history_budget)
+        self.messages = []  # messages of the last request
+        self.last_used = time.monotonic()
+        self.set_temperature(temperature)
+
+    def set_temperature(self, temperature):
+        if temperature >= 0 and temperature <= 1:
+            self.temperature = temperature
+            return True
+        log.debug(f"Temperature is out of range: {temperature}")
+        return False
+
+    def set_model(self, completion_model):
+        self.completion_model = completion_model
+        self.history.model = completion_model
+
+
+class AsyncOpenAIAccess():
     DEFAULT_TIMEOUT = 60  # sec
     MAX_FN_CALLS = 10
+    MAX_CONNECTIONS = 100  # pooled HTTP connections shared by all calls
+    KEEPALIVE_TIMEOUT = 30  # sec
+    MAX_EMBEDDING_BATCH_SIZE = 512  # texts per request
+    MAX_EMBEDDING_BATCH_TOKENS = 100000  # tokens per request
+    MAX_EMBEDDING_TOKENS = 8191  # tokens per text, longer texts are truncated
+    MAX_EMBEDDING_CONCURRENCY = 8  # requests in flight
+    SESSION_TTL = 30 * 60  # sec, idle sessions expire
+    MAX_SESSIONS = 1000  # least recently used sessions are dropped above
+    MAX_ATTEMPTS = 3  # of completion and image calls failed by transient errors
+    # transient API failures, rate limits included, retried with exponential backoff
+    RETRIED_ERRORS = (TryAgain, openai.error.RateLimitError, openai.error.APIError, openai.error.Timeout,
+                      openai.error.APIConnectionError, openai.error.ServiceUnavailableError)
 
     INITIAL_FN_MESSAGES=[
         # to avoid hallucinated outputs in function calls
@@ -34,6 +369,9 @@ class OpenAIAccess():
         # {"role": "system", "content": "Don't make assumptions about what values to plug into functions. Ask for clarification if a user request is ambiguous or no arguments provided."},
     ]
 
+    SUMMARY_PROMPT = ("Summarize the conversation for its continuation: facts, user's requests and preferences, "
+                      "function call results that may matter later. Be brief.")
+
     # if no function calling needed
     FN_DECLARATION_STUB = [
         {
@@ -57,99 +395,328 @@ class OpenAIAccess():
         response: str = ""
         status: str = ""
 
-    def __init__(self, completion_model, temperature, embedding_model) -> None:
-        self.completion_model = completion_model
+    def __init__(self, completion_model, temperature, embedding_model,
+                 max_connections=MAX_CONNECTIONS, cache=None, history_budget=ConversationHistory.DEFAULT_BUDGET,
+                 api_key=None, organization=None, api_base=None) -> None:
         self.embedding_model = embedding_model
-        self.messages = []
-        openai.organization = os.getenv("OPENAI_API_ORG")  # do we really need it? Seems ok without it.
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        self.set_temperature(temperature)
+        self.max_connections = max_connections
+        self.history_budget = history_budget
+        # passed with every call, openai module globals are left alone
+        self.credentials = {"api_key": api_key or os.getenv("OPENAI_API_KEY"),
+                            "organization": organization or os.getenv("OPENAI_API_ORG"),
+                            "api_base": api_base}
+        self.default_session = ChatSession(None, completion_model, temperature, history_budget)
+        self.sessions = OrderedDict()  # by id, least recently used first
+        self.sessions_lock = threading.Lock()
+        self.http_sessions = {}  # by event loop, closed by aclose() on that loop
+        self.http_lock = threading.Lock()
+        self.embedding_batcher = EmbeddingBatcher(self)
+        self.set_cache(cache)
 
-    def set_temperature(self, temperature):
-        if temperature >= 0 and temperature <= 1:
-            self.temperature = temperature
-            return True
-        log.debug(f"Temperature is out of range: {temperature}")
-        return False
+    # default session, used when calls are made without one
+    @property
+    def completion_model(self):
+        return self.default_session.completion_model
 
-    def get_models(self):
-        return openai.Model.list()
+    @property
+    def temperature(self):
+        return self.default_session.temperature
+
+    @property
+    def messages(self):
+        return self.default_session.messages
+
+    @property
+    def history(self):
+        return self.default_session.history
+
+    def set_temperature(self, temperature):
+        return self.default_session.set_temperature(temperature)
 
     def set_model(self, completion_model):
-        self.completion_model = completion_model
+        self.default_session.set_model(completion_model)
 
-    @retry(wait=wait_random_exponential(min=1, max=20), 
-           stop=stop_after_attempt(3), 
-           retry=retry_if_not_exception_type(openai.InvalidRequestError))
-    def get_embedding(self, text):
-        """Text embedding
+    def get_session(self, session_id, completion_model=None, temperature=None) -> ChatSession:
+        """Session of the id, created with default model and temperature if missing or expired,
+        idle sessions are expired here
+        returns session
+        """
+        with self.sessions_lock:
+            self._expire_sessions()
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id,
+                                      completion_model or self.default_session.completion_model,
+                                      self.default_session.temperature if temperature is None else temperature,
+                                      self.history_budget)
+                self.sessions[session_id] = session
+                log.debug(f"Session created: {session_id} / {len(self.sessions)} session(s)")
+            else:
+                if completion_model is not None:
+                    session.set_model(completion_model)
+                if temperature is not None:
+                    session.set_temperature(temperature)
+            self._touch(session)
+        return session
+
+    def close_session(self, session_id) -> None:
+        with self.sessions_lock:
+            self.sessions.pop(session_id, None)
+
+    def _expire_sessions(self) -> None:
+        # under sessions_lock, oldest first
+        expiry_time = time.monotonic() - AsyncOpenAIAccess.SESSION_TTL
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.last_used > expiry_time and len(self.sessions) <= AsyncOpenAIAccess.MAX_SESSIONS:
+                break
+            self.sessions.popitem(last=False)
+            log.debug(f"Session expired: {session.id}")
+
+    def _touch(self, session) -> None:
+        # under sessions_lock
+        session.last_used = time.monotonic()
+        if session.id in self.sessions:
+            self.sessions.move_to_end(session.id)
+
+    def _session(self, session) -> ChatSession:
+        """Session of the call, default if None
+        returns session
+        """
+        if session is None:
+            return self.default_session
+
+        with self.sessions_lock:
+            self._touch(session)
+        return session
+
+    def set_cache(self, cache, always=False):
+        """Response cache (ResponseCache or None), used with zero temperature only,
+        unless always is set
+        """
+        self.cache = cache
+        self.cache_always = always
+
+    def _cache_key(self, session, messages, functions):
+        if self.cache is None or (session.temperature != 0 and not self.cache_always):
+            return None
+        return ResponseCache.make_key(session.completion_model, session.temperature, messages, functions)
+
+    # SQLite runs in the default executor, not to block the loop shared by all sessions
+    async def _cache_get(self, session, key):
+        if key is None:
+            return None
+
+        value = await asyncio.get_running_loop().run_in_executor(None, self.cache.get, key)
+        if value is not None:
+            self.cache.add_saved_tokens(value["total_tokens"])
+            metrics.inc("completion_cache_hits", model=session.completion_model)
+            log.debug(f"Cached response: {session.completion_model} / {self.cache.stats()}")
+        return value
+
+    async def _cache_put(self, key, value):
+        if key is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.cache.put, key, value)
+
+    def _open(self) -> aiohttp.ClientSession:
+        """Pooled keep-alive HTTP session, shared by all calls and chat sessions on the running loop
+        returns session
+        """
+        loop = asyncio.get_running_loop()
+
+        # aiohttp session is bound to the loop it was created in, one per loop
+        with self.http_lock:
+            http_session = self.http_sessions.get(loop)
+            if http_session is None or http_session.closed:
+                for closed_loop in [item for item in self.http_sessions if item.is_closed()]:
+                    if not self.http_sessions.pop(closed_loop).closed:
+                        log.warning("HTTP session left open, its event loop was closed without aclose()")
+
+                connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                                 keepalive_timeout=AsyncOpenAIAccess.KEEPALIVE_TIMEOUT)
+                http_session = aiohttp.ClientSession(connector=connector)
+                self.http_sessions[loop] = http_session
+                log.debug(f"HTTP session opened, {self.max_connections=}")
+
+        # openai picks the session from the context of the current task
+        openai.aiosession.set(http_session)
+        return http_session
+
+    async def aclose(self) -> None:
+        """Close HTTP session of the running loop, to be awaited before a caller's own loop ends,
+        e.g. at the end of the coroutine given to asyncio.run(). EventLoopThread closes the one
+        of the background loop at shutdown
+        """
+        with self.http_lock:
+            http_session = self.http_sessions.pop(asyncio.get_running_loop(), None)
+        if http_session is not None and not http_session.closed:
+            await http_session.close()
+            log.debug("HTTP session closed")
+
+    async def get_models(self):
+        self._open()
+        return await openai.Model.alist(**self.credentials)
+
+    async def get_embedding(self, text):
+        """Text embedding, concurrent calls are merged into one request
         returns True/False, tokens, embedding, status
         """
         if not text:
             return False, 0, None, "Empty text"
 
-        response = openai.Embedding.create(input=text, 
-                                           model=self.embedding_model)
-        embedding = ["data"][0]["embedding"]
-        total_tokens = response["usage"]["total_tokens"]
-        return True, total_tokens, embedding, ""
+        return await self.embedding_batcher.embed(text)
 
-    def complete_with_fun(self, prompt, functions) -> CompletionResult:
-        """Prompt completion with single function calling
-        returns False, tokens, content, status for completetion or 
+    async def get_embeddings(self, texts) -> tuple((bool, int, np.ndarray, str)):
+        """Batched text embeddings, batches are limited by size and tokens and sent concurrently
+        returns True/False, tokens, embeddings (float32 array, rows in texts order), status
+        """
+        if not texts:
+            return False, 0, None, "Empty text"
+
+        semaphore = asyncio.Semaphore(AsyncOpenAIAccess.MAX_EMBEDDING_CONCURRENCY)
+
+        async def EmbedBatch(batch):
+            async with semaphore:
+                return batch, await self.__create_embeddings([text for _, text in batch])
+
+        start_time = time.monotonic()
+        batches = self._embedding_batches(texts)
+        results = await asyncio.gather(*[EmbedBatch(batch) for batch in batches])
+
+        total_tokens = 0
+        embeddings = None
+
+        for batch, (tokens, vectors) in results:
+            total_tokens += tokens
+            if embeddings is None:
+                embeddings = np.empty((len(texts), len(vectors[0])), dtype=np.float32)
+            embeddings[[index for index, _ in batch]] = vectors
+
+        completion_time = time.monotonic() - start_time
+        log.debug(f"Embeddings complete: {self.embedding_model} / {len(texts)} text(s) / "
+                  f"{len(batches)} batch(es) / {total_tokens} tokens / {completion_time:.2f} sec")
+        return True, total_tokens, embeddings, ""
+
+    def _embedding_batches(self, texts) -> list[list[tuple((int, str))]]:
+        """Split texts into batches by count and token budget, too long texts are truncated
+        returns list of batches of (index, text)
+        """
+        encoding = get_encoding(self.embedding_model)
+        batches = []
+        batch = []
+        batch_tokens = 0
+
+        for index, text in enumerate(texts):
+            text = text or " "  # API rejects empty input
+            tokens = encoding.encode(text)
+            if len(tokens) > AsyncOpenAIAccess.MAX_EMBEDDING_TOKENS:
+                tokens = tokens[:AsyncOpenAIAccess.MAX_EMBEDDING_TOKENS]
+                text = encoding.decode(tokens)
+
+            if batch and (len(batch) >= AsyncOpenAIAccess.MAX_EMBEDDING_BATCH_SIZE or
+                          batch_tokens + len(tokens) > AsyncOpenAIAccess.MAX_EMBEDDING_BATCH_TOKENS):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+
+            batch.append((index, text))
+            batch_tokens += len(tokens)
+
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @retry(wait=wait_random_exponential(min=1, max=20),
+           stop=stop_after_attempt(3),
+           retry=retry_if_not_exception_type(openai.InvalidRequestError),
+           before_sleep=lambda state: metrics.inc("embedding_retries", model=state.args[0].embedding_model))
+    async def __create_embeddings(self, texts) -> tuple((int, list)):
+        self._open()
+        with metrics.timer("embedding_seconds", model=self.embedding_model), \
+             tracer.span("embedding", model=self.embedding_model, texts=len(texts)):
+            response = await openai.Embedding.acreate(input=texts,
+                                                      model=self.embedding_model,
+                                                      **self.credentials)
+        data = sorted(response["data"], key=lambda item: item["index"])
+        metrics.inc("embedding_texts", len(texts), model=self.embedding_model)
+        metrics.inc("embedding_tokens", response["usage"]["total_tokens"], model=self.embedding_model)
+        return response["usage"]["total_tokens"], [item["embedding"] for item in data]
+
+    async def complete_with_fun(self, prompt, functions, session=None) -> CompletionResult:
+        """Prompt completion with single function calling, in the session (ChatSession) or the default one
+        returns False, tokens, content, status for completetion or
         returns True, tokens, func_name, func_args for function call
 
         Functions descriptions as JSON
         https://json-schema.org/understanding-json-schema/reference/array.html
         """
-        self.messages.clear()
-        self.messages.extend(OpenAIAccess.INITIAL_FN_MESSAGES)
-        self.messages.append({"role": "user", "content": prompt})
-
-        return OpenAIAccess.CompletionResult(self.__complete_with_fun(prompt, functions))
+        session = self._session(session)
+        # own message list, so concurrent calls don't mix their conversations
+        messages = list(AsyncOpenAIAccess.INITIAL_FN_MESSAGES)
+        messages.append({"role": "user", "content": prompt})
+        session.messages = messages
 
+        return AsyncOpenAIAccess.CompletionResult(*await self.__complete_with_fun(session, messages, prompt, functions))
 
-    def complete_with_multi_fun_array(self, prompt, functions) -> list[CompletionResult]:
-        """Prompt completion with multiple function calling (generator)
-        returns same as complete_with_fun()
+    async def complete_with_multi_fun_array(self, prompt, functions, session=None) -> list[CompletionResult]:
+        """Prompt completion with multiple function calling
+        returns list of the same as complete_with_fun()
         """
-        self.messages.clear()
-        self.messages.extend(OpenAIAccess.INITIAL_FN_MESSAGES)
-        self.messages.append({"role": "user", "content": prompt})
+        session = self._session(session)
+        messages = list(AsyncOpenAIAccess.INITIAL_FN_MESSAGES)
+        messages.append({"role": "user", "content": prompt})
+        session.messages = messages
         results = []
 
-        for _ in range(OpenAIAccess.MAX_FN_CALLS):
-            result = OpenAIAccess.CompletionResult(*self.__complete_with_fun(prompt, functions))
+        for _ in range(AsyncOpenAIAccess.MAX_FN_CALLS):
+            result = AsyncOpenAIAccess.CompletionResult(*await self.__complete_with_fun(session, messages, prompt, functions))
             results.append(result)
 
             if not result.fn_called:
                 break
 
-            # Don't do actual chaining - calling that function and adding 
+            # Don't do actual chaining - calling that function and adding
             # call's result here, use complete_with_multi_fun generator for that
-            self.messages.append({
-                "role": "function", 
+            messages.append({
+                "role": "function",
                 "name": result.response,
                 "content": "ok"
                 })
         return results
 
-    def complete_with_multi_fun(self, prompt, functions, keep_history) -> CompletionResult:
+    async def complete_with_multi_fun(self, prompt, functions, keep_history, stream=False, session=None) -> typing.AsyncGenerator[typing.Union[str, CompletionResult], str]:
         """
-        Prompt completion with multiple function calling (generator) or without any if functions is None.
-        Can be provided with function call result for chaining, via send()
+        Prompt completion with multiple function calling (async generator) or without any if functions is None.
+        Can be provided with function call result for chaining, via asend()
+        With stream=True also yields content deltas (str) as they arrive, before each CompletionResult
+        History is kept in the session (ChatSession) or the default one
         """
+        session = self._session(session)
         if not keep_history:
-            self.messages.clear()
-        
+            session.history.clear()
+
         # NB: Use this restrictive prompt with function calling ONLY, otherwise
         # this may limit response to "I don't know"!
-        if functions:
-            self.messages.extend(OpenAIAccess.INITIAL_FN_MESSAGES)
-        self.messages.append({"role": "user", "content": prompt})
+        # Preamble is set once, not repeated with every turn
+        session.history.set_preamble(AsyncOpenAIAccess.INITIAL_FN_MESSAGES if functions else [])
+
+        # older turns are summarized, so the request size stays flat with conversation length
+        await session.history.compact(lambda summary, messages: self._summarize(session, summary, messages))
+        session.history.start_turn(prompt)
 
-        for _ in range(OpenAIAccess.MAX_FN_CALLS):
-            result = OpenAIAccess.CompletionResult(*self.__complete_with_fun(prompt, functions))
+        for _ in range(AsyncOpenAIAccess.MAX_FN_CALLS):
+            messages = session.messages = session.history.messages()
+            sent = len(messages)
+            if stream:
+                async for result in self.__complete_with_fun_stream(session, messages, prompt, functions):
+                    if isinstance(result, str):
+                        yield result
+            else:
+                result = AsyncOpenAIAccess.CompletionResult(*await self.__complete_with_fun(session, messages, prompt, functions))
+
+            # reply is appended to the request messages when parsed
+            if len(messages) > sent:
+                session.history.append(messages[-1])
             fn_call_result = yield result
 
             if not result.fn_called:
@@ -157,49 +724,176 @@ class OpenAIAccess():
 
             # chain results to the next call
             if fn_call_result is not None and isinstance(fn_call_result, str):
-                self.messages.append({
-                    "role": "function", 
+                session.history.append({
+                    "role": "function",
                     "name": result.response,
                     "content": fn_call_result
                     })
-    
+
+    @staticmethod
+    def _retry(counter, **labels):
+        """Backoff for transient API failures, retries are counted
+        returns tenacity decorator
+        """
+        return retry(retry=retry_if_exception_type(AsyncOpenAIAccess.RETRIED_ERRORS),
+                     wait=wait_random_exponential(multiplier=1, max=40),
+                     stop=stop_after_attempt(AsyncOpenAIAccess.MAX_ATTEMPTS),
+                     before_sleep=metrics.retry_counter(counter, **labels))
+
+    async def _summarize(self, session, summary, messages) -> str:
+        """Fold messages into the running conversation summary
+        returns new summary
+        """
+        @AsyncOpenAIAccess._retry("completion_retries", model=session.completion_model)
+        async def CallChatCompletion():
+            return await openai.ChatCompletion.acreate(
+                model=session.completion_model,
+                messages=[
+                    {"role": "system", "content": AsyncOpenAIAccess.SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Summary so far: {summary}\n\nConversation:\n"
+                                                f"{ConversationHistory.transcript(messages)}"}
+                ],
+                temperature=0,
+                max_tokens=ConversationHistory.SUMMARY_TOKENS,
+                request_timeout=AsyncOpenAIAccess.DEFAULT_TIMEOUT,
+                **self.credentials
+                )
+
+        self._open()
+        with tracer.span("history_summary", model=session.completion_model, messages=len(messages)):
+            response = await CallChatCompletion()
+        metrics.inc("completion_tokens", response["usage"]["total_tokens"], model=session.completion_model)
+        return response["choices"][0]["message"]["content"]
+
     # prompt with function calling private implementation
-    def __complete_with_fun(self, prompt, functions) -> tuple((bool, int, str, str)):
-        #@retry(retry=retry_if_exception_type(TryAgain),
-        #       wait=wait_random_exponential(multiplier=1, max=40), 
-        #       stop=stop_after_attempt(3))
-        def CallChatCompletion():
-            return openai.ChatCompletion.create(
-                model=self.completion_model, 
-                messages=self.messages,
-                functions=functions if functions else OpenAIAccess.FN_DECLARATION_STUB,
+    async def __complete_with_fun(self, session, messages, prompt, functions) -> tuple((bool, int, str, str)):
+        @AsyncOpenAIAccess._retry("completion_retries", model=session.completion_model)
+        async def CallChatCompletion():
+            return await openai.ChatCompletion.acreate(
+                model=session.completion_model,
+                messages=messages,
+                functions=functions if functions else AsyncOpenAIAccess.FN_DECLARATION_STUB,
                 function_call="auto" if functions else "none",
-                temperature=self.temperature,
-                request_timeout=OpenAIAccess.DEFAULT_TIMEOUT  # undocumented
-                # timeout= OpenAIAccess.DEFAULT_TIMEOUT doesn't really help
+                temperature=session.temperature,
+                request_timeout=AsyncOpenAIAccess.DEFAULT_TIMEOUT,  # undocumented
+                # timeout= AsyncOpenAIAccess.DEFAULT_TIMEOUT doesn't really help
+                **self.credentials
                 )
-            
+
+        # cached response costs no tokens
+        key = self._cache_key(session, messages, functions or AsyncOpenAIAccess.FN_DECLARATION_STUB)
+        cached = await self._cache_get(session, key)
+        if cached is not None:
+            return self.__parse_message(messages, cached["message"], 0, functions)
+
+        self._open()
         start_time = time.monotonic()
-        response = CallChatCompletion()
+        with metrics.timer("completion_seconds", model=session.completion_model), \
+             tracer.span("completion", model=session.completion_model, messages=len(messages)) as span:
+            response = await CallChatCompletion()
+            span.set(tokens=response.get("usage", {}).get("total_tokens"))
         completion_time = time.monotonic() - start_time
-        log.debug(f"Call complete: {self.completion_model} / {self.temperature:.2f}T / {completion_time:.2f} sec / {prompt}")
+        log.debug(f"Call complete: {session.completion_model} / {session.temperature:.2f}T / {completion_time:.2f} sec / {prompt}")
 
         if "choices" not in response:
+            metrics.error("completion", "InvalidResponse", model=session.completion_model)
             return False, 0, "", "Invalid response"
 
         if "message" not in response["choices"][0]:
+            metrics.error("completion", "InvalidMessage", model=session.completion_model)
             return False, 0, "", "Invalid message"
-        
+
         message = response["choices"][0]["message"]
         total_tokens = response["usage"]["total_tokens"]
+        metrics.inc("completion_tokens", total_tokens, model=session.completion_model)
+        await self._cache_put(key, {"message": message, "total_tokens": total_tokens})
+        return self.__parse_message(messages, message, total_tokens, functions)
+
+    # prompt with function calling, streamed, private implementation
+    async def __complete_with_fun_stream(self, session, messages, prompt, functions) -> typing.AsyncGenerator[typing.Union[str, CompletionResult], None]:
+        key = self._cache_key(session, messages, functions or AsyncOpenAIAccess.FN_DECLARATION_STUB)
+        cached = await self._cache_get(session, key)
+        if cached is not None:
+            message = cached["message"]
+            if message.get("content"):
+                yield message["content"]
+            yield AsyncOpenAIAccess.CompletionResult(*self.__parse_message(messages, message, 0, functions))
+            return
+
+        # only the request is retried, a stream broken after the first delta is not
+        @AsyncOpenAIAccess._retry("completion_retries", model=session.completion_model)
+        async def CallChatCompletion():
+            return await openai.ChatCompletion.acreate(
+                model=session.completion_model,
+                messages=messages,
+                functions=functions if functions else AsyncOpenAIAccess.FN_DECLARATION_STUB,
+                function_call="auto" if functions else "none",
+                temperature=session.temperature,
+                request_timeout=AsyncOpenAIAccess.DEFAULT_TIMEOUT,
+                stream=True,
+                **self.credentials
+                )
+
+        # generator steps run in different tasks, the span is not made current
+        span = tracer.start("completion", model=session.completion_model, messages=len(messages), stream=True)
+        self._open()
+        start_time = time.monotonic()
+        try:
+            response = await CallChatCompletion()
+        except Exception as err:
+            metrics.error("completion", type(err).__name__, model=session.completion_model)
+            span.end(error=f"{type(err).__name__}: {err}")
+            raise
+
+        content = []
+        function_name = []
+        arguments = []
+        first_token_time = None
+
+        # function call name and arguments come in fragments, put them together
+        async for chunk in response:
+            if not chunk.get("choices"):
+                continue
+
+            delta = chunk["choices"][0].get("delta", {})
+            if first_token_time is None:
+                first_token_time = time.monotonic() - start_time
 
+            if delta.get("content"):
+                content.append(delta["content"])
+                yield delta["content"]
+
+            function_call = delta.get("function_call")
+            if function_call:
+                function_name.append(function_call.get("name") or "")
+                arguments.append(function_call.get("arguments") or "")
+
+        completion_time = time.monotonic() - start_time
+        log.debug(f"Call complete (streamed): {session.completion_model} / {session.temperature:.2f}T / "
+                  f"{first_token_time or completion_time:.2f} / {completion_time:.2f} sec / {prompt}")
+        metrics.observe("completion_seconds", completion_time, model=session.completion_model)
+        metrics.observe("completion_first_token_seconds", first_token_time or completion_time, model=session.completion_model)
+
+        message = {"role": "assistant", "content": "".join(content) if content else None}
+        if function_name:
+            message["function_call"] = {"name": "".join(function_name), "arguments": "".join(arguments)}
+
+        # streamed responses have no usage, count it locally
+        total_tokens = num_tokens_from_messages(messages + [message], session.completion_model)
+        metrics.inc("completion_tokens", total_tokens, model=session.completion_model)
+        span.end(tokens=total_tokens, first_token_ms=(first_token_time or completion_time) * 1000,
+                 function=message.get("function_call", {}).get("name"))
+        await self._cache_put(key, {"message": message, "total_tokens": total_tokens})
+        yield AsyncOpenAIAccess.CompletionResult(*self.__parse_message(messages, message, total_tokens, functions))
+
+    def __parse_message(self, messages, message, total_tokens, functions) -> tuple((bool, int, str, str)):
         # important - extend conversation with assistant's reply
         # otherwise it won't analyze prompt for additional function calls
-        self.messages.append(message)
+        messages.append(message)
 
         # we can also check response['choices'][0]['finish_reason'] == 'function_call'
         if "function_call" not in message:
-            return False, total_tokens, str(message.content), ""
+            return False, total_tokens, str(message["content"]), ""
 
         function_name = message["function_call"]["name"]
         arguments = message["function_call"]["arguments"]
@@ -218,72 +912,279 @@ class OpenAIAccess():
                 #   "function_call": {
                 #     "name": "functions.ShowMeGraph",
                 #     "arguments": "{\n  \"data\": [100, 200, 350, 50, 20],\n  \"style\": \"bar\"\n}"
-                #   }                
+                #   }
                 #
                 message["function_call"]["name"] = function["name"]
                 return True, total_tokens, function["name"], arguments
 
         return True, total_tokens, function_name, f"Unknown function called ({function_name})"
 
-    def complete(self, prompt) -> tuple((int, str, str)):
-        """Prompt completion
+    async def complete(self, prompt, session=None) -> tuple((int, str, str)):
+        """Prompt completion with the model and temperature of the session or the default one
         """
-        @retry(retry=retry_if_exception_type(TryAgain),
-               wait=wait_random_exponential(multiplier=1, max=40), 
-               stop=stop_after_attempt(3))
-        def CallChatCompletion():
-            return openai.ChatCompletion.create(
-                model=self.completion_model,
+        session = self._session(session)
+
+        @AsyncOpenAIAccess._retry("completion_retries", model=session.completion_model)
+        async def CallChatCompletion():
+            return await openai.ChatCompletion.acreate(
+                model=session.completion_model,
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
-                temperature=self.temperature,
-                timeout= OpenAIAccess.DEFAULT_TIMEOUT
+                temperature=session.temperature,
+                timeout= AsyncOpenAIAccess.DEFAULT_TIMEOUT,
+                **self.credentials
             )
 
-        # Do not clear self.messages to keep context in the dialog
+        # Do not clear session history to keep context in the dialog
+        key = self._cache_key(session, [{"role": "user", "content": prompt}], None)
+        cached = await self._cache_get(session, key)
+        if cached is not None:
+            return 0, cached["message"]["content"], ""
+
+        self._open()
         start_time = time.monotonic()
-        response = CallChatCompletion()
+        with metrics.timer("completion_seconds", model=session.completion_model), \
+             tracer.span("completion", model=session.completion_model):
+            response = await CallChatCompletion()
         completion_time = time.monotonic() - start_time
 
-        log.debug(f"Call complete: {self.completion_model} / {completion_time:.2f} sec / {prompt}")
+        log.debug(f"Call complete: {session.completion_model} / {completion_time:.2f} sec / {prompt}")
 
         if "choices" not in response or "usage" not in response:
+            metrics.error("completion", "InvalidResponse", model=session.completion_model)
             return 0, "", "Invalid response"
 
         if "message" not in response["choices"][0]:
+            metrics.error("completion", "InvalidMessage", model=session.completion_model)
             return 0, "", "Invalid message"
 
-        return response["usage"]["total_tokens"], response.choices[0].message.content, ""
+        total_tokens = response["usage"]["total_tokens"]
+        metrics.inc("completion_tokens", total_tokens, model=session.completion_model)
+        await self._cache_put(key, {"message": response.choices[0].message, "total_tokens": total_tokens})
+        return total_tokens, response.choices[0].message.content, ""
 
+    async def complete_stream(self, prompt, session=None) -> typing.AsyncGenerator[typing.Union[str, tuple[int, str, str]], None]:
+        """Prompt completion, streamed (async generator)
+        yields content deltas (str) as they arrive, then the same as complete()
+        """
+        session = self._session(session)
+        messages = [{"role": "user", "content": prompt}]
+        key = self._cache_key(session, messages, None)
+        cached = await self._cache_get(session, key)
+        if cached is not None:
+            yield cached["message"]["content"]
+            yield 0, cached["message"]["content"], ""
+            return
 
-    def create_image(self, prompt, size="512x512", encoded=True) -> str:
+        # only the request is retried, a stream broken after the first delta is not
+        @AsyncOpenAIAccess._retry("completion_retries", model=session.completion_model)
+        async def CallChatCompletion():
+            return await openai.ChatCompletion.acreate(
+                model=session.completion_model,
+                messages=messages,
+                temperature=session.temperature,
+                timeout= AsyncOpenAIAccess.DEFAULT_TIMEOUT,
+                stream=True,
+                **self.credentials
+            )
+
+        self._open()
+        start_time = time.monotonic()
+        try:
+            response = await CallChatCompletion()
+        except Exception as err:
+            metrics.error("completion", type(err).__name__, model=session.completion_model)
+            raise
+
+        content = []
+        first_token_time = None
+        async for chunk in response:
+            if not chunk.get("choices"):
+                continue
+            if first_token_time is None:
+                first_token_time = time.monotonic() - start_time
+            delta = chunk["choices"][0].get("delta", {})
+            if delta.get("content"):
+                content.append(delta["content"])
+                yield delta["content"]
+
+        completion_time = time.monotonic() - start_time
+        log.debug(f"Call complete (streamed): {session.completion_model} / {completion_time:.2f} sec / {prompt}")
+        metrics.observe("completion_seconds", completion_time, model=session.completion_model)
+        metrics.observe("completion_first_token_seconds", first_token_time or completion_time, model=session.completion_model)
+
+        message = {"role": "assistant", "content": "".join(content)}
+        total_tokens = num_tokens_from_messages(messages + [message], session.completion_model)
+        metrics.inc("completion_tokens", total_tokens, model=session.completion_model)
+        await self._cache_put(key, {"message": message, "total_tokens": total_tokens})
+        yield total_tokens, message["content"], ""
+
+    async def complete_many(self, prompts, session=None) -> list[tuple((int, str, str))]:
+        """Concurrent prompt completions on the shared HTTP session
+        returns list of the same as complete(), in prompts order
+        """
+        return await asyncio.gather(*[self.complete(prompt, session) for prompt in prompts])
+
+    async def create_image(self, prompt, size="512x512", encoded=True) -> str:
         """
         Image creation, charged per API call, not tokens
         """
-        @retry(retry=retry_if_exception_type(TryAgain),
-               wait=wait_random_exponential(multiplier=1, max=40), 
-               stop=stop_after_attempt(3))
-        def CallImageCreate():
-            return openai.Image.create(
+        @AsyncOpenAIAccess._retry("image_retries", size=size)
+        async def CallImageCreate():
+            return await openai.Image.acreate(
                 prompt=prompt,
                 n=1,
                 size=size,
-                response_format="b64_json" if encoded else "url" 
+                response_format="b64_json" if encoded else "url",
+                **self.credentials
                 )
-        
-        response = CallImageCreate()
+
+        # image API has no model choice here, labeled by size
+        self._open()
+        with metrics.timer("image_seconds", size=size), tracer.span("image", size=size):
+            response = await CallImageCreate()
         log.debug(f"Call complete: {prompt}")
 
         if "data" not in response:
+            metrics.error("image", "InvalidResponse", size=size)
             return ""
 
         data = response["data"][0]
 
         if encoded and "b64_json" in data:
             return data["b64_json"]
-        
+
         if "url" in data:
             return data["url"]
 
         return ""
+
+
+class OpenAIAccess():
+    """Synchronous access, thin wrapper running AsyncOpenAIAccess on the background loop,
+    safe to share between threads, one ChatSession per concurrent conversation
+    """
+    DEFAULT_TIMEOUT = AsyncOpenAIAccess.DEFAULT_TIMEOUT
+    MAX_FN_CALLS = AsyncOpenAIAccess.MAX_FN_CALLS
+    INITIAL_FN_MESSAGES = AsyncOpenAIAccess.INITIAL_FN_MESSAGES
+    FN_DECLARATION_STUB = AsyncOpenAIAccess.FN_DECLARATION_STUB
+    CompletionResult = AsyncOpenAIAccess.CompletionResult
+
+    def __init__(self, completion_model, temperature, embedding_model, cache=None,
+                 history_budget=ConversationHistory.DEFAULT_BUDGET, api_key=None, organization=None,
+                 api_base=None) -> None:
+        self.async_access = AsyncOpenAIAccess(completion_model, temperature, embedding_model, cache=cache,
+                                              history_budget=history_budget, api_key=api_key,
+                                              organization=organization, api_base=api_base)
+        self.loop_thread = EventLoopThread()
+        self.loop_thread.add_closer(self.async_access)
+
+    @property
+    def completion_model(self):
+        return self.async_access.completion_model
+
+    @property
+    def embedding_model(self):
+        return self.async_access.embedding_model
+
+    @property
+    def temperature(self):
+        return self.async_access.temperature
+
+    @property
+    def messages(self):
+        return self.async_access.messages
+
+    @property
+    def history(self):
+        return self.async_access.history
+
+    def set_temperature(self, temperature):
+        return self.async_access.set_temperature(temperature)
+
+    def set_model(self, completion_model):
+        self.async_access.set_model(completion_model)
+
+    def set_cache(self, cache, always=False):
+        self.async_access.set_cache(cache, always)
+
+    def get_session(self, session_id, completion_model=None, temperature=None) -> ChatSession:
+        """Conversation session of the id, see AsyncOpenAIAccess.get_session()
+        returns session
+        """
+        return self.async_access.get_session(session_id, completion_model, temperature)
+
+    def close_session(self, session_id) -> None:
+        self.async_access.close_session(session_id)
+
+    def cache_stats(self) -> dict:
+        """Response cache counters
+        returns same as ResponseCache.stats() or empty dict if no cache used
+        """
+        cache = self.async_access.cache
+        return cache.stats() if cache is not None else {}
+
+    def get_models(self):
+        return self.loop_thread.run_coroutine(self.async_access.get_models())
+
+    def get_embedding(self, text):
+        """Text embedding
+        returns True/False, tokens, embedding, status
+        """
+        return self.loop_thread.run_coroutine(self.async_access.get_embedding(text))
+
+    def get_embeddings(self, texts) -> tuple((bool, int, np.ndarray, str)):
+        """Batched text embeddings
+        returns True/False, tokens, embeddings (float32 array, rows in texts order), status
+        """
+        return self.loop_thread.run_coroutine(self.async_access.get_embeddings(texts))
+
+    def complete_with_fun(self, prompt, functions, session=None) -> CompletionResult:
+        """Prompt completion with single function calling
+        returns same as AsyncOpenAIAccess.complete_with_fun()
+        """
+        return self.loop_thread.run_coroutine(self.async_access.complete_with_fun(prompt, functions, session))
+
+    def complete_with_multi_fun_array(self, prompt, functions, session=None) -> list[CompletionResult]:
+        """Prompt completion with multiple function calling
+        returns list of the same as complete_with_fun()
+        """
+        return self.loop_thread.run_coroutine(self.async_access.complete_with_multi_fun_array(prompt, functions, session))
+
+    def complete_with_multi_fun(self, prompt, functions, keep_history, stream=False, session=None) -> typing.Generator[typing.Union[str, CompletionResult], str, None]:
+        """
+        Prompt completion with multiple function calling (generator) or without any if functions is None.
+        Can be provided with function call result for chaining, via send()
+        With stream=True also yields content deltas (str) as they arrive, before each CompletionResult
+        """
+        fn_generator = self.async_access.complete_with_multi_fun(prompt, functions, keep_history, stream, session)
+        try:
+            result = self.loop_thread.run_coroutine(fn_generator.__anext__())
+
+            while True:
+                fn_call_result = yield result
+                try:
+                    result = self.loop_thread.run_coroutine(fn_generator.asend(fn_call_result))
+                except StopAsyncIteration:
+                    return
+        finally:
+            # abandoned or closed generator, release async generator resources on its loop
+            self.loop_thread.close_generator(fn_generator)
+
+    def complete(self, prompt, session=None) -> tuple((int, str, str)):
+        """Prompt completion
+        """
+        return self.loop_thread.run_coroutine(self.async_access.complete(prompt, session))
+
+    def complete_stream(self, prompt, session=None) -> typing.Generator[typing.Union[str, tuple[int, str, str]], None, None]:
+        """Prompt completion, streamed (generator)
+        yields content deltas (str) as they arrive, then the same as complete()
+        """
+        return self.loop_thread.run_generator(self.async_access.complete_stream(prompt, session))
+
+    def create_image(self, prompt, size="512x512", encoded=True) -> str:
+        """
+        Image creation, charged per API call, not tokens
+        """
+        return self.loop_thread.run_coroutine(self.async_access.create_image(prompt, size, encoded))
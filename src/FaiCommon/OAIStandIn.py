@@ -0,0 +1,518 @@
+"""
+Filename    :   OAIStandIn.py
+Copyright   :   FoundAItion Inc.
+Description :   Local OpenAI compatible stand-in server and load generator for OAIAccess
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from aiohttp import web
+
+from FaiCommon.OAIAccess import AsyncOpenAIAccess, EventLoopThread, get_encoding, num_tokens_from_messages
+
+import argparse
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import logging
+import numpy as np
+import openai
+import os
+import random
+import sys
+import threading
+import time
+import typing
+import uuid
+
+log = logging.getLogger(__name__)
+
+
+class OAIStandIn(threading.Thread):
+    """Mimics OpenAI chat completion (with streaming and function calling), embedding, image and model
+    endpoints on a local port, no tokens are spent. Latency, completion size, failures and 429 rate
+    are configurable, function calls follow a script. Runs its own event loop in a background thread
+    """
+    DEFAULT_HOST = "127.0.0.1"
+    DEFAULT_COMPLETION_TOKENS = 32
+    DEFAULT_EMBEDDING_DIM = 1536
+    RETRY_AFTER = 1  # sec, suggested to rate limited clients
+    STREAM_CHUNK_SIZE = 8  # characters of function call arguments per streamed chunk
+    WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa"]
+    # 1x1 transparent PNG
+    IMAGE = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+
+    CHAT = "chat"
+    EMBEDDINGS = "embeddings"
+    IMAGES = "images"
+    MODELS = "models"
+
+    class Latency(typing.NamedTuple):
+        distribution: str = "fixed"  # fixed, uniform, normal or lognormal
+        mean: float = 0.0  # sec
+        spread: float = 0.0  # half-width for uniform, deviation for normal, sigma for lognormal
+
+        def sample(self, generator) -> float:
+            if self.distribution == "uniform":
+                value = generator.uniform(self.mean - self.spread, self.mean + self.spread)
+            elif self.distribution == "normal":
+                value = generator.gauss(self.mean, self.spread)
+            elif self.distribution == "lognormal":
+                # mean of the distribution is kept at self.mean
+                value = generator.lognormvariate(np.log(self.mean or 1e-9) - self.spread ** 2 / 2, self.spread)
+            else:
+                value = self.mean
+            return max(0.0, value)
+
+    def __init__(self, host=DEFAULT_HOST, port=0, latency=None, stream_interval=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, completion_tokens=DEFAULT_COMPLETION_TOKENS,
+                 embedding_dim=DEFAULT_EMBEDDING_DIM, script=None, models=None, seed=0) -> None:
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port  # any free port if 0
+        self.latency = latency or {}  # Latency by endpoint, Latency() if missing
+        self.stream_interval = stream_interval  # sec between streamed chunks
+        self.error_rate = error_rate  # share of requests failed with 500
+        self.rate_limit_rate = rate_limit_rate  # share of requests rejected with 429
+        self.completion_tokens = completion_tokens
+        self.embedding_dim = embedding_dim
+        self.script = script or []  # chat replies by function call round: {"content": ...} or {"function_call": ...}
+        self.models = models or ["gpt-3.5-turbo", "gpt-4", "text-embedding-ada-002"]
+        self.generator = random.Random(seed)
+        self.url = None
+        self.loop = None
+        self.runner = None
+        self.ready = threading.Event()
+        self.stats = collections.defaultdict(collections.Counter)  # by endpoint
+        self.seen = set()  # request body hashes, repeated ones are retries
+
+    def start(self) -> str:
+        """Start serving
+        returns base url, api_base for OpenAI access
+        """
+        super().start()
+        self.ready.wait()
+        return self.url
+
+    def stop(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.join()
+
+    def run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        app.router.add_post("/v1/embeddings", self._embeddings)
+        app.router.add_post("/v1/images/generations", self._images)
+        app.router.add_get("/v1/models", self._models)
+
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, self.host, self.port)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{self.host}:{self.port}/v1"
+        log.debug(f"Stand-in server started, {self.url=}")
+        self.ready.set()
+
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    def snapshot(self) -> dict:
+        """Served requests, injected failures, retries and tokens
+        returns {endpoint: {counter: value}}
+        """
+        return {endpoint: dict(counters) for endpoint, counters in list(self.stats.items())}
+
+    @staticmethod
+    def _error(status, message, error_type, code=None, headers=None) -> web.Response:
+        return web.json_response({"error": {"message": message, "type": error_type, "param": None, "code": code}},
+                                 status=status, headers=headers)
+
+    async def _prelude(self, endpoint, body) -> typing.Optional[web.Response]:
+        """Count request, inject rate limit or failure, wait for sampled latency
+        returns error response or None
+        """
+        stats = self.stats[endpoint]
+        stats["requests"] += 1
+        digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        if digest in self.seen:
+            stats["retries"] += 1
+        self.seen.add(digest)
+
+        if self.generator.random() < self.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return OAIStandIn._error(429, "Rate limit reached (stand-in)", "requests", "rate_limit_exceeded",
+                                     {"Retry-After": str(OAIStandIn.RETRY_AFTER)})
+
+        await asyncio.sleep(self.latency.get(endpoint, OAIStandIn.Latency()).sample(self.generator))
+        if self.generator.random() < self.error_rate:
+            stats["errors"] += 1
+            return OAIStandIn._error(500, "The server had an error (stand-in)", "server_error")
+        return None
+
+    def _text(self, tokens) -> str:
+        return " ".join(self.generator.choice(OAIStandIn.WORDS) for _ in range(tokens))
+
+    def _reply(self, body) -> dict:
+        """Scripted reply for the function call round: rounds are counted by function results
+        after the last user message
+        returns assistant message
+        """
+        messages = body.get("messages", [])
+        round = 0
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                break
+            round += message.get("role") == "function"
+
+        step = self.script[round] if round < len(self.script) else {}
+        function_call = step.get("function_call")
+        if function_call is not None and body.get("function_call") != "none" and body.get("functions"):
+            arguments = function_call.get("arguments", "{}")
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments)
+            return {"role": "assistant", "content": None,
+                    "function_call": {"name": function_call["name"], "arguments": arguments}}
+
+        return {"role": "assistant", "content": step.get("content") or self._text(self.completion_tokens)}
+
+    async def _chat(self, request) -> web.StreamResponse:
+        body = await request.json()
+        error = await self._prelude(OAIStandIn.CHAT, body)
+        if error is not None:
+            return error
+
+        model = body.get("model", "")
+        message = self._reply(body)
+        encoding = get_encoding(model)
+        prompt_tokens = num_tokens_from_messages(body.get("messages", []), model)
+        completion = message["content"] or message["function_call"]["name"] + message["function_call"]["arguments"]
+        completion_tokens = len(encoding.encode(completion))
+        finish_reason = "function_call" if "function_call" in message else "stop"
+
+        stats = self.stats[OAIStandIn.CHAT]
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["function_calls"] += "function_call" in message
+
+        response_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        if not body.get("stream"):
+            return web.json_response({
+                "id": response_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}})
+
+        # server-sent events, content by words, function call name then arguments by pieces
+        deltas = [{"role": "assistant", "content": "" if message["content"] else None}]
+        if message["content"]:
+            words = message["content"].split(" ")
+            deltas.extend({"content": word if index == 0 else " " + word} for index, word in enumerate(words))
+        else:
+            arguments = message["function_call"]["arguments"]
+            deltas.append({"function_call": {"name": message["function_call"]["name"], "arguments": ""}})
+            deltas.extend({"function_call": {"arguments": arguments[start:start + OAIStandIn.STREAM_CHUNK_SIZE]}}
+                          for start in range(0, len(arguments), OAIStandIn.STREAM_CHUNK_SIZE))
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for delta in deltas + [None]:
+            chunk = {"id": response_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta or {},
+                                  "finish_reason": None if delta is not None else finish_reason}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if self.stream_interval:
+                await asyncio.sleep(self.stream_interval)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def _embedding(self, text) -> np.ndarray:
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(self.embedding_dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    async def _embeddings(self, request) -> web.Response:
+        body = await request.json()
+        error = await self._prelude(OAIStandIn.EMBEDDINGS, body)
+        if error is not None:
+            return error
+
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts or not all(isinstance(text, str) and text for text in texts):
+            return OAIStandIn._error(400, "Invalid input (stand-in)", "invalid_request_error")
+
+        encoding = get_encoding(body.get("model", ""))
+        tokens = sum(len(encoding.encode(text)) for text in texts)
+        self.stats[OAIStandIn.EMBEDDINGS]["tokens"] += tokens
+        self.stats[OAIStandIn.EMBEDDINGS]["texts"] += len(texts)
+
+        encoded = body.get("encoding_format") == "base64"
+        data = []
+        for index, text in enumerate(texts):
+            vector = self._embedding(text)
+            embedding = base64.b64encode(vector.tobytes()).decode() if encoded else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        return web.json_response({"object": "list", "data": data, "model": body.get("model", ""),
+                                  "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    async def _images(self, request) -> web.Response:
+        body = await request.json()
+        error = await self._prelude(OAIStandIn.IMAGES, body)
+        if error is not None:
+            return error
+
+        self.stats[OAIStandIn.IMAGES]["images"] += body.get("n", 1)
+        if body.get("response_format") == "b64_json":
+            data = [{"b64_json": OAIStandIn.IMAGE} for _ in range(body.get("n", 1))]
+        else:
+            data = [{"url": f"data:image/png;base64,{OAIStandIn.IMAGE}"} for _ in range(body.get("n", 1))]
+        return web.json_response({"created": int(time.time()), "data": data})
+
+    async def _models(self, request) -> web.Response:
+        self.stats[OAIStandIn.MODELS]["requests"] += 1
+        return web.json_response({"object": "list", "data": [
+            {"id": model, "object": "model", "created": 0, "owned_by": "stand-in"} for model in self.models]})
+
+
+class OAILoadGenerator():
+    """Drives AsyncOpenAIAccess at a target concurrency with a mix of operations and reports
+    throughput, latency percentiles, errors and retries (seen by the stand-in server, if given)
+    """
+    CHAT = "chat"
+    FUNCTION = "function"
+    MULTI_FUNCTION = "multi_function"
+    EMBEDDING = "embedding"
+    IMAGE = "image"
+    OPERATIONS = (CHAT, FUNCTION, MULTI_FUNCTION, EMBEDDING, IMAGE)
+    DEFAULT_MIX = {CHAT: 1}
+    DEFAULT_REQUESTS = 200  # operations per concurrency level
+    DEFAULT_EMBEDDING_BATCH = 16  # texts per embedding operation
+
+    FUNCTIONS = [
+        {"name": "GetWeather", "description": "Weather in the city",
+         "parameters": {"type": "object", "properties": {"city": {"type": "string"}}, "required": ["city"]}},
+        {"name": "ShowMeGraph", "description": "Plot the data",
+         "parameters": {"type": "object", "properties": {"data": {"type": "array", "items": {"type": "number"}}}}},
+    ]
+    # script for the stand-in matching FUNCTIONS: two calls, then the answer
+    SCRIPT = [
+        {"function_call": {"name": "GetWeather", "arguments": {"city": "Seattle"}}},
+        {"function_call": {"name": "ShowMeGraph", "arguments": {"data": [1, 2, 3]}}},
+        {"content": "Here is the weather graph."},
+    ]
+
+    class Result(typing.NamedTuple):
+        operation: str
+        ok: bool
+        latency: float  # sec
+        tokens: int
+        error: str  # exception type, if failed
+
+    def __init__(self, completion_model="gpt-3.5-turbo", embedding_model="text-embedding-ada-002",
+                 mix=None, requests=DEFAULT_REQUESTS, embedding_batch=DEFAULT_EMBEDDING_BATCH,
+                 stand_in=None, api_base=None, api_key=None, seed=0) -> None:
+        self.completion_model = completion_model
+        self.embedding_model = embedding_model
+        self.mix = mix or OAILoadGenerator.DEFAULT_MIX  # weight by operation
+        self.requests = requests
+        self.embedding_batch = embedding_batch
+        self.stand_in = stand_in  # OAIStandIn for server side counters
+        self.api_base = api_base or (stand_in.url if stand_in is not None else None)  # openai.api_base if None
+        self.api_key = api_key  # OPENAI_API_KEY if None
+        self.seed = seed
+
+        for operation in self.mix:
+            if operation not in OAILoadGenerator.OPERATIONS:
+                raise Exception(f"Invalid operation {operation}")
+
+    @staticmethod
+    def percentiles(values) -> dict:
+        """Latency summary
+        returns {p50, p95, p99, mean, max} in milliseconds
+        """
+        if not values:
+            return {}
+        values = np.asarray(values) * 1000
+        return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)), "mean": float(values.mean()), "max": float(values.max())}
+
+    async def _operation(self, access, session, operation, index) -> Result:
+        # every operation is unique, so the stand-in tells retries from new requests
+        prompt = f"Request {index}: what is the weather in Seattle?"
+        start_time = time.monotonic()
+        tokens = 0
+        try:
+            if operation == OAILoadGenerator.CHAT:
+                tokens, _, status = await access.complete(prompt)
+            elif operation == OAILoadGenerator.FUNCTION:
+                result = await access.complete_with_fun(prompt, OAILoadGenerator.FUNCTIONS)
+                # status carries function arguments on function call
+                tokens, status = result.usage_tokens, "" if result.fn_called else result.status
+            elif operation == OAILoadGenerator.MULTI_FUNCTION:
+                status = ""
+                fn_generator = access.complete_with_multi_fun(prompt, OAILoadGenerator.FUNCTIONS, keep_history=False,
+                                                              session=session)
+                try:
+                    result = await fn_generator.__anext__()
+                    while True:
+                        tokens += result.usage_tokens
+                        status = status or ("" if result.fn_called else result.status)
+                        result = await fn_generator.asend("ok")
+                except StopAsyncIteration:
+                    pass
+            elif operation == OAILoadGenerator.EMBEDDING:
+                ok, tokens, _, status = await access.get_embeddings(
+                    [f"Request {index} text {item}" for item in range(self.embedding_batch)])
+            else:
+                status = "" if await access.create_image(prompt) else "No image"
+
+            return OAILoadGenerator.Result(operation, not status, time.monotonic() - start_time, tokens, status)
+        except Exception as err:
+            return OAILoadGenerator.Result(operation, False, time.monotonic() - start_time, tokens,
+                                           type(err).__name__)
+
+    async def run_async(self, concurrency) -> dict:
+        """Run self.requests operations with at most concurrency in flight
+        returns results of the level
+        """
+        generator = random.Random(self.seed)
+        operations = generator.choices(list(self.mix), weights=list(self.mix.values()), k=self.requests)
+        access = AsyncOpenAIAccess(self.completion_model, 0, self.embedding_model,
+                                   max_connections=max(concurrency, AsyncOpenAIAccess.MAX_CONNECTIONS),
+                                   api_key=self.api_key, api_base=self.api_base)
+        queue = asyncio.Queue()
+        for index, operation in enumerate(operations):
+            queue.put_nowait((index, operation))
+        results = []
+
+        async def Worker(worker):
+            # function calling loop keeps the conversation in a session, one per worker
+            session = access.get_session(f"worker-{worker}")
+            while not queue.empty():
+                index, operation = queue.get_nowait()
+                results.append(await self._operation(access, session, operation, f"{concurrency}-{index}"))
+
+        before = self.stand_in.snapshot() if self.stand_in is not None else {}
+        start_time = time.monotonic()
+        try:
+            await asyncio.gather(*(Worker(worker) for worker in range(concurrency)))
+        finally:
+            await access.aclose()
+        elapsed = time.monotonic() - start_time
+
+        operations = {}
+        for operation in self.mix:
+            done = [result for result in results if result.operation == operation]
+            operations[operation] = {
+                "count": len(done), "ok": sum(result.ok for result in done),
+                "errors": dict(collections.Counter(result.error for result in done if not result.ok)),
+                "tokens": sum(result.tokens for result in done),
+                "latency_ms": OAILoadGenerator.percentiles([result.latency for result in done])}
+
+        level = {"concurrency": concurrency, "seconds": elapsed, "operations_per_sec": len(results) / elapsed,
+                 "ok": sum(result.ok for result in results),
+                 "latency_ms": OAILoadGenerator.percentiles([result.latency for result in results]),
+                 "operations": operations}
+
+        if self.stand_in is not None:
+            after = self.stand_in.snapshot()
+            server = {}
+            for endpoint, counters in after.items():
+                previous = before.get(endpoint, {})
+                server[endpoint] = {name: value - previous.get(name, 0) for name, value in counters.items()}
+            level["server"] = server
+            level["requests_per_sec"] = sum(counters.get("requests", 0) for counters in server.values()) / elapsed
+            level["retries"] = sum(counters.get("retries", 0) for counters in server.values())
+
+        log.debug(f"Load level complete: {concurrency=} / {len(results)} operation(s) / {elapsed:.2f} sec")
+        return level
+
+    def run(self, concurrency_levels) -> dict:
+        """Run every concurrency level in turn on the background loop
+        returns configuration and results by level
+        """
+        levels = [EventLoopThread().run_coroutine(self.run_async(concurrency)) for concurrency in concurrency_levels]
+        return {"config": {"completion_model": self.completion_model, "embedding_model": self.embedding_model,
+                           "mix": self.mix, "requests": self.requests, "embedding_batch": self.embedding_batch,
+                           "api_base": self.api_base or openai.api_base},
+                "levels": levels}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="OpenAI stand-in server and OAIAccess load generator")
+    parser.add_argument("mode", choices=["serve", "load"], help="serve only, or load the stand-in (or --api-base)")
+    parser.add_argument("--host", default=OAIStandIn.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", default="fixed:0.2:0",
+                        help="distribution:mean:spread of chat latency (sec), fixed, uniform, normal or lognormal")
+    parser.add_argument("--embedding-latency", default="fixed:0.05:0")
+    parser.add_argument("--image-latency", default="fixed:1:0")
+    parser.add_argument("--stream-interval", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=OAIStandIn.DEFAULT_COMPLETION_TOKENS)
+    parser.add_argument("--script", help="JSON file with function call script, load generator one if not set")
+    parser.add_argument("--api-base", help="load an already running server instead of the in-process stand-in")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=OAILoadGenerator.DEFAULT_REQUESTS)
+    parser.add_argument("--mix", default="chat=1", help="operation weights, e.g. chat=3,function=1,embedding=1")
+    parser.add_argument("--output", help="JSON results file, stdout if not set")
+    args = parser.parse_args(argv)
+
+    def ParseLatency(value):
+        distribution, mean, spread = (value.split(":") + ["0", "0"])[:3]
+        return OAIStandIn.Latency(distribution, float(mean), float(spread))
+
+    script = OAILoadGenerator.SCRIPT
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+
+    stand_in = None
+    if args.mode == "serve" or not args.api_base:
+        stand_in = OAIStandIn(args.host, args.port,
+                              {OAIStandIn.CHAT: ParseLatency(args.latency),
+                               OAIStandIn.EMBEDDINGS: ParseLatency(args.embedding_latency),
+                               OAIStandIn.IMAGES: ParseLatency(args.image_latency)},
+                              args.stream_interval, args.error_rate, args.rate_limit_rate, args.completion_tokens,
+                              script=script)
+        url = stand_in.start()
+        print(f"Stand-in server at {url}", file=sys.stderr)
+        if args.mode == "serve":
+            try:
+                stand_in.join()
+            except KeyboardInterrupt:
+                stand_in.stop()
+            return 0
+
+    mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    # the stand-in accepts any key, the real API needs OPENAI_API_KEY
+    load_generator = OAILoadGenerator(mix=mix, requests=args.requests, stand_in=stand_in, api_base=args.api_base,
+                                      api_key=None if args.api_base else os.getenv("OPENAI_API_KEY", "sk-stand-in"))
+    results = load_generator.run(args.concurrency)
+
+    if stand_in is not None:
+        stand_in.stop()
+    results = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(results)
+    else:
+        print(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
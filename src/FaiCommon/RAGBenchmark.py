@@ -0,0 +1,347 @@
+"""
+Filename    :   RAGBenchmark.py
+Copyright   :   FoundAItion Inc.
+Description :   Offline RAG benchmark, synthetic corpus with stub embedding and LLM
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.embeddings.base import Embeddings
+from langchain.llms.base import LLM
+
+from FaiCommon.IngestionWorker import IngestionJob
+from FaiCommon.RAGManager import RAGManager
+
+from typing import Any, List, Optional
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+log = logging.getLogger(__name__)
+
+
+class StubEmbeddings(Embeddings):
+    """Deterministic local embedding: sum of fixed random vectors of the words, normalized.
+    Texts sharing words are similar, like with a real model, no API calls
+    """
+    DEFAULT_DIM = 256
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, dim=DEFAULT_DIM, latency=0.0) -> None:
+        self.dim = dim
+        self.latency = latency  # sec per call, to mimic remote model
+        self.vectors = {}  # by word
+
+    def _word_vector(self, word) -> np.ndarray:
+        vector = self.vectors.get(word)
+        if vector is None:
+            seed = int(hashlib.md5(word.encode()).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self.vectors[word] = vector
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+
+        embeddings = []
+        for text in texts:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for word in StubEmbeddings.WORD.findall(text.lower()):
+                vector += self._word_vector(word)
+            embeddings.append((vector / (np.linalg.norm(vector) or 1)).tolist())
+        return embeddings
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class StubLLM(LLM):
+    """Deterministic LLM for chains: fixed answer citing the first source of the prompt
+    """
+    latency: float = 0.0  # sec per call, no max_tokens as with chat models
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    @staticmethod
+    def _answer(prompt) -> str:
+        # summaries follow the few-shot examples, the last block is the one of the question
+        sources = re.findall(r"^Source: (.*)$", prompt.split("=========")[-2] if "=========" in prompt else prompt,
+                             re.MULTILINE)
+        return f"Stub answer.\nSOURCES: {sources[0] if sources else ''}"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return StubLLM._answer(prompt)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return StubLLM._answer(prompt)
+
+
+class RAGBenchmark():
+    """Ingests a synthetic corpus into RAGManager and measures ingestion throughput, index size,
+    open time, query latency and recall@k against brute-force search. Models are local stubs,
+    so results reflect storage and retrieval cost only, plus configured stub latency
+    """
+    DEFAULT_DOCS = 200
+    DEFAULT_WORDS = 400  # per document
+    DEFAULT_VOCABULARY = 5000  # distinct words, Zipf distributed
+    DEFAULT_QUERIES = 100
+    DEFAULT_LLM_QUERIES = 20  # queries answered through the chain
+    DEFAULT_K = 4
+    ZIPF_EXPONENT = 1.1
+    QUERY_WORDS = 12  # taken from a random place of a random document
+    OPEN_REPEATS = 5
+    GROUND_TRUTH_BATCH = 1000  # chunks fetched at once
+    SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "po", "da", "fi", "gu", "he", "ja", "bo"]
+    SPEC = "*.txt"
+
+    def __init__(self, docs=DEFAULT_DOCS, words=DEFAULT_WORDS, vocabulary=DEFAULT_VOCABULARY,
+                 queries=DEFAULT_QUERIES, llm_queries=DEFAULT_LLM_QUERIES, k=DEFAULT_K,
+                 dim=StubEmbeddings.DEFAULT_DIM, embedding_latency=0.0, llm_latency=0.0, seed=0,
+                 ai_model="gpt-4", embedding_model="text-embedding-ada-002", work_path=None) -> None:
+        self.docs = docs
+        self.words = words
+        self.vocabulary = vocabulary
+        self.queries = queries
+        self.llm_queries = llm_queries
+        self.k = k
+        self.dim = dim
+        self.embedding_latency = embedding_latency
+        self.llm_latency = llm_latency
+        self.seed = seed
+        self.ai_model = ai_model
+        self.embedding_model = embedding_model
+        self.work_path = work_path  # temporary folder if None
+
+    @staticmethod
+    def percentiles(values) -> dict:
+        """Latency summary
+        returns {p50, p95, p99, mean, max} in milliseconds
+        """
+        if not values:
+            return {}
+        values = np.asarray(values) * 1000
+        return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)), "mean": float(values.mean()), "max": float(values.max())}
+
+    def generate_corpus(self, folder) -> list[str]:
+        """Write synthetic documents, words are made of syllables and drawn by Zipf law like natural text
+        returns texts of the documents
+        """
+        generator = np.random.default_rng(self.seed)
+        words = set()
+        while len(words) < self.vocabulary:
+            length = generator.integers(1, 5)
+            words.add("".join(generator.choice(RAGBenchmark.SYLLABLES, length)))
+        words = sorted(words)
+        generator.shuffle(words)
+
+        weights = 1 / np.arange(1, len(words) + 1) ** RAGBenchmark.ZIPF_EXPONENT
+        weights /= weights.sum()
+
+        os.makedirs(folder, exist_ok=True)
+        texts = []
+        for index in range(self.docs):
+            picked = generator.choice(len(words), self.words, p=weights)
+            sentences = [" ".join(words[word] for word in picked[start:start + 10]).capitalize() + "."
+                         for start in range(0, len(picked), 10)]
+            text = " ".join(sentences)
+            with open(os.path.join(folder, f"doc{index:06}.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+            texts.append(text)
+        return texts
+
+    def _queries(self, texts) -> list[str]:
+        generator = np.random.default_rng(self.seed + 1)
+        queries = []
+        for _ in range(self.queries):
+            words = texts[generator.integers(len(texts))].split()
+            start = generator.integers(max(1, len(words) - RAGBenchmark.QUERY_WORDS))
+            queries.append(" ".join(words[start:start + RAGBenchmark.QUERY_WORDS]))
+        return queries
+
+    def _rag_manager(self, db_path, backend) -> RAGManager:
+        rag_manager = RAGManager(self.ai_model, self.embedding_model, db_path, backend=backend, answer_threshold=None)
+        rag_manager.embedding_function = StubEmbeddings(self.dim, self.embedding_latency)
+        rag_manager.llm = StubLLM(latency=self.llm_latency)
+        return rag_manager
+
+    def _ground_truth(self, rag_manager, folder, queries) -> list[list[str]]:
+        """Exact top-k by cosine similarity over all stored chunks
+        returns ids of the best chunks for every query
+        """
+        partitions = rag_manager._partitions(None)
+        manifest = partitions[0].manifest
+        ids = [id for path in manifest.paths(os.path.join(folder, RAGBenchmark.SPEC))
+               for id in manifest.get(path).chunk_ids]
+
+        vectors = []
+        for start in range(0, len(ids), RAGBenchmark.GROUND_TRUTH_BATCH):
+            batch = ids[start:start + RAGBenchmark.GROUND_TRUTH_BATCH]
+            documents = rag_manager._get_documents(partitions, batch, vectors=True)
+            vectors.extend(documents[id][1] for id in batch)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        scores = np.asarray(rag_manager.embedding_function.embed_queries(queries), dtype=np.float32) @ matrix.T
+        return [[ids[index] for index in np.argsort(-row)[:self.k]] for row in scores]
+
+    def run(self, backend) -> dict:
+        """Benchmark one vector store backend
+        returns results
+        """
+        work_path = self.work_path or tempfile.mkdtemp(prefix="fai-rag-benchmark-")
+        folder = os.path.join(work_path, "corpus")
+        db_path = os.path.join(work_path, f"db-{backend}")
+        shutil.rmtree(db_path, ignore_errors=True)
+
+        try:
+            texts = self.generate_corpus(folder)
+            queries = self._queries(texts)
+
+            # ingestion, progress of the job counts chunks and tokens
+            rag_manager = self._rag_manager(db_path, backend)
+            job = IngestionJob(IngestionJob.FOLDER, folder)
+            job.started = time.time()
+            ok, status = rag_manager.ingest_from_folder(os.path.join(folder, RAGBenchmark.SPEC), job=job)
+            ingest_time = time.time() - job.started
+            if not ok:
+                raise Exception(f"Ingestion failed: {status}")
+
+            progress = job.progress()
+            ingest = {"seconds": ingest_time, "docs": self.docs, "chunks": progress.chunks, "tokens": progress.tokens,
+                      "duplicates": rag_manager.duplicates_skipped,
+                      "docs_per_sec": self.docs / ingest_time, "chunks_per_sec": progress.chunks / ingest_time,
+                      "tokens_per_sec": progress.tokens / ingest_time}
+            truth = self._ground_truth(rag_manager, folder, queries)
+            del rag_manager
+
+            # cold open of the stored database, RAM held by the opened index
+            open_times = []
+            for _ in range(RAGBenchmark.OPEN_REPEATS):
+                rag_manager = self._rag_manager(db_path, backend)
+                started = time.perf_counter()
+                count = rag_manager.open()
+                open_times.append(time.perf_counter() - started)
+                del rag_manager
+
+            tracemalloc.start()
+            rag_manager = self._rag_manager(db_path, backend)
+            rag_manager.open()
+            rag_manager.retrieve(queries[0], self.k)
+            ram_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            # retrieval latency and recall, dense only and hybrid
+            retrieve_times = []
+            vector_hits = 0
+            hybrid_hits = 0
+            partitions = rag_manager._partitions(None)
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                ok, chunks = rag_manager.retrieve(query, self.k)
+                retrieve_times.append(time.perf_counter() - started)
+                if not ok:
+                    raise Exception(f"Retrieval failed: {chunks}")
+
+                hybrid_hits += len(set(expected) & {chunk.id for chunk in chunks})
+                found = rag_manager._vector_search(partitions, [rag_manager.embedding_function.embed_query(query)],
+                                                   self.k)[0]
+                vector_hits += len(set(expected) & {id for id, _, _ in found})
+
+            # answers through the chain with stub LLM, retrieval cache is cold for these
+            rag_manager.retrieval_cache.clear()
+            query_times = []
+            for query in queries[:self.llm_queries]:
+                started = time.perf_counter()
+                ok, answer = rag_manager.query(query)
+                query_times.append(time.perf_counter() - started)
+                if not ok:
+                    raise Exception(f"Query failed: {answer}")
+
+            expected_total = sum(len(expected) for expected in truth) or 1
+            return {
+                "backend": backend,
+                "ingest": ingest,
+                "index": {"records": count, "disk_bytes": RAGManager._disk_size(db_path), "ram_bytes": ram_bytes},
+                "open_ms": RAGBenchmark.percentiles(open_times),
+                "retrieve_ms": RAGBenchmark.percentiles(retrieve_times),
+                "query_ms": RAGBenchmark.percentiles(query_times),
+                "recall": {"k": self.k, "vector": vector_hits / expected_total, "hybrid": hybrid_hits / expected_total},
+            }
+        finally:
+            if self.work_path is None:
+                shutil.rmtree(work_path, ignore_errors=True)
+
+    def run_all(self, backends) -> dict:
+        """Benchmark backends on the same corpus
+        returns configuration, environment and results by backend
+        """
+        results = {backend: self.run(backend) for backend in backends}
+        return {
+            "config": {"docs": self.docs, "words": self.words, "vocabulary": self.vocabulary,
+                       "queries": self.queries, "llm_queries": self.llm_queries, "k": self.k, "dim": self.dim,
+                       "embedding_latency": self.embedding_latency, "llm_latency": self.llm_latency,
+                       "seed": self.seed, "chunk_size": RAGManager.CHUNK_SIZE, "fetch_k": RAGManager.FETCH_K},
+            "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "numpy": np.__version__, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results,
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline RAGManager benchmark")
+    parser.add_argument("--backend", nargs="+", default=[RAGManager.BACKEND_NUMPY, RAGManager.BACKEND_CHROMA],
+                        choices=[RAGManager.BACKEND_NUMPY, RAGManager.BACKEND_CHROMA])
+    parser.add_argument("--docs", type=int, default=RAGBenchmark.DEFAULT_DOCS)
+    parser.add_argument("--words", type=int, default=RAGBenchmark.DEFAULT_WORDS, help="words per document")
+    parser.add_argument("--vocabulary", type=int, default=RAGBenchmark.DEFAULT_VOCABULARY)
+    parser.add_argument("--queries", type=int, default=RAGBenchmark.DEFAULT_QUERIES)
+    parser.add_argument("--llm-queries", type=int, default=RAGBenchmark.DEFAULT_LLM_QUERIES)
+    parser.add_argument("--k", type=int, default=RAGBenchmark.DEFAULT_K)
+    parser.add_argument("--dim", type=int, default=StubEmbeddings.DEFAULT_DIM)
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="sec per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="sec per LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-path", help="keep corpus and databases there, temporary folder if not set")
+    parser.add_argument("--output", help="JSON results file, stdout if not set")
+    args = parser.parse_args(argv)
+
+    benchmark = RAGBenchmark(args.docs, args.words, args.vocabulary, args.queries, args.llm_queries, args.k,
+                             args.dim, args.embedding_latency, args.llm_latency, args.seed, work_path=args.work_path)
+    results = json.dumps(benchmark.run_all(args.backend), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(results)
+    else:
+        print(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
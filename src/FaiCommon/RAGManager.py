@@ -4,7 +4,7 @@ Copyright   :   FoundAItion Inc.
 Description :   Image recognition
 Written by  :   Alex Fedosov
 Created     :   08/03/2023
-Updated     :   08/03/2023
+Updated     :   10/17/2026
 """
 
 from langchain.chains.qa_with_sources.retrieval import RetrievalQAWithSourcesChain
@@ -12,30 +12,59 @@ from langchain.chains.retrieval_qa.base import RetrievalQA
 from langchain.callbacks import get_openai_callback
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.document_loaders import ConcurrentLoader
-from langchain.document_loaders import RecursiveUrlLoader
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.indexes import VectorstoreIndexCreator
+from langchain.document_loaders.blob_loaders import Blob, BlobLoader
+from langchain.document_loaders.parsers.registry import get_parser
+from langchain.embeddings.base import Embeddings
 from langchain.llms.openai import OpenAI
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.vectorstores.base import VectorStore
 from langchain.vectorstores.chroma import Chroma
 
-from bs4 import BeautifulSoup
+from FaiCommon.BM25Index import BM25Index
+from FaiCommon.ContextPacker import ContextPacker
+from FaiCommon.DuplicateFilter import DuplicateFilter
+from FaiCommon.EmbeddingCache import EmbeddingCache
+from FaiCommon.IngestionManifest import IngestionManifest
+from FaiCommon.Metrics import Metrics
+from FaiCommon.NumpyVectorStore import NumpyVectorStore
+from FaiCommon.OAIAccess import EventLoopThread, OpenAIAccess
+from FaiCommon.SemanticCache import SemanticCache
+from FaiCommon.TextChunker import TextChunker
+from FaiCommon.Tracer import Tracer
+from FaiCommon.WebCrawler import WebCrawler
+
 from urllib.parse import urlparse, urlunparse
 
-from typing import Dict, Union, Any, List
+from collections import OrderedDict
+from typing import Dict, Union, Any, Iterable, Iterator, List, NamedTuple
 
-import chromadb
+import asyncio
+import hashlib
 import logging
+import mimetypes
+import numpy as np
 import os
-import requests
+import pathlib
+import re
+import shutil
+import sqlite3
 import sys
+import threading
+import uuid
  
 log = logging.getLogger(__name__)
+metrics = Metrics()
+tracer = Tracer()
 
 
 DEFAULT_SCHEME = "http"
 DEFAULT_SCHEME_SECURE = "https"
 
 def validate_url(url):
+    """Complete URL with schema, reachability is checked by crawling
+    returns True/False, corrected url or error
+    """
     if not url:
         return False, "Empty URL"
     
@@ -53,14 +82,7 @@ def validate_url(url):
         return False, f"Invalid URL: missing net location in {url}"
     corrected_url = urlunparse((scheme, netloc, parsed_url.path, parsed_url.params, 
                                 parsed_url.query, parsed_url.fragment))
-
-    try:
-        response = requests.get(corrected_url)
-        if response.status_code < 400:
-            return True, corrected_url
-        return False, f"Can not reach web page {url}"
-    except requests.RequestException as e:
-        return False, f"Invalid web page {url}"
+    return True, corrected_url
 
 
 class CustomHandler(BaseCallbackHandler):
@@ -76,63 +98,425 @@ class CustomHandler(BaseCallbackHandler):
         log.debug(str(error))
 
 
+class FileListBlobLoader(BlobLoader):
+    def __init__(self, paths) -> None:
+        self.paths = paths
+
+    def yield_blobs(self) -> Iterable[Blob]:
+        for path in self.paths:
+            yield Blob.from_path(path)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embedding function, the same for storage and query,
+    cached texts are not sent to OpenAI again. Questions are not stored in the
+    persistent cache, recent ones are kept in memory
+    """
+    QUERY_CACHE_SIZE = 1024  # question vectors kept in memory
+
+    def __init__(self, oai_access, cache) -> None:
+        self.oai_access = oai_access
+        self.cache = cache
+        self.queries = OrderedDict()  # model, question -> vector, least recently used first
+        self.queries_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        model = self.oai_access.embedding_model
+        vectors = self.cache.get_many(model, texts)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            # identical chunks are embedded once
+            unique_texts = list(dict.fromkeys(texts[index] for index in missing))
+            ok, tokens, embeddings, status = self.oai_access.get_embeddings(unique_texts)
+            if not ok:
+                raise Exception(f"Embedding failed: {status}")
+
+            self.cache.put_many(model, unique_texts, embeddings)
+            embedded = dict(zip(unique_texts, embeddings))
+            for index in missing:
+                vectors[index] = embedded[texts[index]]
+            log.debug(f"Embedded {len(unique_texts)} of {len(texts)} text(s), {tokens=}")
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings of questions, looked up in the persistent cache and recent questions,
+        new ones are embedded at once and remembered in memory only
+        """
+        model = self.oai_access.embedding_model
+        vectors = self.cache.get_many(model, texts)
+        with self.queries_lock:
+            for index, text in enumerate(texts):
+                if vectors[index] is None and (model, text) in self.queries:
+                    self.queries.move_to_end((model, text))
+                    vectors[index] = self.queries[(model, text)]
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[index] for index in missing))
+            ok, tokens, embeddings, status = self.oai_access.get_embeddings(unique_texts)
+            if not ok:
+                raise Exception(f"Embedding failed: {status}")
+
+            embedded = dict(zip(unique_texts, embeddings))
+            with self.queries_lock:
+                for text, vector in embedded.items():
+                    self.queries[(model, text)] = vector
+                while len(self.queries) > CachedEmbeddings.QUERY_CACHE_SIZE:
+                    self.queries.popitem(last=False)
+            for index in missing:
+                vectors[index] = embedded[texts[index]]
+            log.debug(f"Embedded {len(unique_texts)} of {len(texts)} question(s), {tokens=}")
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever for langchain chains, lexical and vector results fused and packed
+    into the prompt token budget by RAGManager
+    """
+    rag_manager: Any
+    k: int
+    tags: tuple = ("",)  # partitions searched
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [Document(page_content=chunk.text, metadata=chunk.metadata)
+                for chunk in self.rag_manager._retrieve_context(query, self.k, self.tags)]
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._get_relevant_documents(query, run_manager=None))
+
+
 class RAGManager():
     DEFAULT_DB_PATH = r".\fai-rag-db"
-    DEFAULT_COLLECTION = "langchain"
+    DEFAULT_COLLECTION = "langchain"  # untagged documents
+    PARTITIONS_FOLDER = "partitions"  # tagged documents, a folder and a collection per tag
+    TAG_FILE = "tag.txt"
+    MAX_TAG_SLUG = 40  # characters of the tag kept in collection name
     MAX_DOCS = 4  # documents loaded from vector store
+    CHUNK_SIZE = 256  # tokens
+    CHUNK_OVERLAP = 32  # tokens
+    ADD_BATCH_SIZE = 1000  # chunks embedded and stored at once
+    BACKEND_CHROMA = "chroma"
+    BACKEND_NUMPY = "numpy"  # in-process, no chromadb required
+    NUMPY_FOLDER = "numpy-store"
+    CHROMA_DB_FILE = "chroma.sqlite3"
+    COMPACT_SUFFIX = "-compact"  # of the collection being rebuilt
+    FETCH_K = 16  # candidates taken from each of lexical and vector search
+    MAX_CONTEXT_DOCS = 8  # chunks packed into the prompt
+    MAX_CONTEXT_TOKENS = 1024  # chunk tokens packed into the prompt, less if the model context is short
+    DEFAULT_CONTEXT_SIZE = 4096  # tokens, for models unknown to langchain
+    ANSWER_TOKENS = 256  # reserved for the answer if the LLM has no max_tokens, chat models
+    RRF_K = 60  # reciprocal rank fusion constant
+    RETRIEVAL_CACHE_SIZE = 256  # questions
+    DEFAULT_CONCURRENCY = 8  # LLM calls in flight for query_many
+
+    class Chunk(NamedTuple):
+        id: str
+        text: str
+        source: str
+        score: float  # cosine similarity to the question
+        metadata: dict
+
+    class QueryResult(NamedTuple):
+        ok: bool
+        answer: dict  # question, answer, sources
+        usage_tokens: int
+        status: str  # error, if failed
+
+    class Partition(NamedTuple):
+        tag: str
+        name: str  # collection name
+        vector_store: VectorStore
+        lexical_index: BM25Index
+        manifest: IngestionManifest
+        duplicate_filter: DuplicateFilter  # fingerprints of stored chunks
+
+    def __init__(self, ai_model, embedding_model, db_path=DEFAULT_DB_PATH, backend=BACKEND_CHROMA,
+                 quantization=None, pca_dim=None, answer_threshold=None) -> None:
+        if backend not in (RAGManager.BACKEND_CHROMA, RAGManager.BACKEND_NUMPY):
+            raise Exception(f"Invalid vector store backend {backend}")
+        if (quantization or pca_dim) and backend != RAGManager.BACKEND_NUMPY:
+            raise Exception(f"Quantization is supported by {RAGManager.BACKEND_NUMPY} backend only")
 
-    def __init__(self, ai_model, embedding_model, db_path=DEFAULT_DB_PATH) -> None:
         self.ai_model = ai_model
         self.embedding_model = embedding_model
+        self.backend = backend
+        self.quantization = quantization  # "int8" or "pq", compressed codes are searched in memory
+        self.pca_dim = pca_dim
         self.client = None
-        self.chain = None
+        self.chains = {}  # by tags
         self.llm = None
-        self.vector_store = None
+        self.partitions = {}  # by tag, opened on first use
+        self.partitions_lock = threading.Lock()
+        self.counts = {}  # documents by tag, kept current by ingestion
         self.handler = CustomHandler()
         self.db_path = db_path
+        self.embedding_function = CachedEmbeddings(
+            OpenAIAccess(ai_model, 0, embedding_model),
+            EmbeddingCache(os.path.join(db_path, EmbeddingCache.DEFAULT_DB_NAME)))
+        self.chunker = TextChunker(embedding_model, RAGManager.CHUNK_SIZE, RAGManager.CHUNK_OVERLAP)
+        self.packer = ContextPacker(ai_model)
+        self.prompt_tokens = None  # of the chain prompt without chunks and question
+        self.duplicates_skipped = 0  # by the last ingestion
+        self.version = 0  # changed with every collection update
+        self.retrieval_cache = OrderedDict()  # question embedding, tags -> result ids, scores
+        self.retrieval_lock = threading.Lock()
+        self.answer_cache = None  # answers of similar questions, e.g. SemanticCache.DEFAULT_THRESHOLD, off if None
+        if answer_threshold is not None:
+            self.answer_cache = SemanticCache(os.path.join(db_path, SemanticCache.DEFAULT_DB_NAME), answer_threshold)
 
     def _open(self) -> None:
+        if self.backend == RAGManager.BACKEND_NUMPY:
+            return
+
         if self.client is None:
+            import chromadb
             self.client = chromadb.PersistentClient(self.db_path)
             log.debug(f"Database opened, {self.db_path=} ")
 
-    def reset(self) -> int:
-        """Clears existing database
+    @staticmethod
+    def _tags(tags) -> tuple:
+        """Tag or list of tags, None or empty tag is the default partition
+        returns sorted tuple of unique tags
+        """
+        if tags is None or isinstance(tags, str):
+            tags = [tags or ""]
+        return tuple(sorted({tag.strip() for tag in tags})) or ("",)
+
+    @staticmethod
+    def _partition_name(tag) -> str:
+        """Collection name valid for chroma (3-63 characters, alphanumeric at both ends), unique for the tag
+        returns name
+        """
+        if not tag:
+            return RAGManager.DEFAULT_COLLECTION
+        slug = re.sub(r"[^a-z0-9]+", "-", tag.lower()).strip("-")[:RAGManager.MAX_TAG_SLUG].strip("-")
+        return "-".join(filter(None, ["tag", slug, hashlib.sha1(tag.encode()).hexdigest()[:8]]))
+
+    def _partition(self, tag, create=False) -> Partition:
+        """Vector store, lexical index and manifest of the tag, untagged ones are in the database folder,
+        partition of a new tag is created by ingestion only
+        returns partition or None if there is none for the tag and create is False
+        """
+        with self.partitions_lock:
+            partition = self.partitions.get(tag)
+            if partition is not None:
+                return partition
+
+            name = RAGManager._partition_name(tag)
+            path = self.db_path
+            if tag:
+                path = os.path.join(self.db_path, RAGManager.PARTITIONS_FOLDER, name)
+                if not create and not os.path.isfile(os.path.join(path, RAGManager.TAG_FILE)):
+                    return None
+                if create:
+                    os.makedirs(path, exist_ok=True)
+                    with open(os.path.join(path, RAGManager.TAG_FILE), "w", encoding="utf-8") as f:
+                        f.write(tag)
+
+            self._open()
+
+            if self.backend == RAGManager.BACKEND_NUMPY:
+                vector_store = NumpyVectorStore(os.path.join(path, RAGManager.NUMPY_FOLDER), self.embedding_function,
+                                                quantization=self.quantization, pca_dim=self.pca_dim)
+            else:
+                vector_store = Chroma(client=self.client, collection_name=name,
+                                      embedding_function=self.embedding_function)
+
+            partition = RAGManager.Partition(tag, name, vector_store,
+                                             BM25Index(os.path.join(path, BM25Index.DEFAULT_DB_NAME)),
+                                             IngestionManifest(os.path.join(path, IngestionManifest.DEFAULT_DB_NAME)),
+                                             DuplicateFilter())
+            RAGManager._seed_filter(partition)
+            self.partitions[tag] = partition
+            log.debug(f"Partition opened, {tag=} / {name=}")
+            return partition
+
+    @staticmethod
+    def _seed_filter(partition) -> None:
+        """Near-duplicate filter of the partition with fingerprints of all stored chunks
+        """
+        partition.duplicate_filter.clear()
+        for source, fingerprint in partition.manifest.fingerprints():
+            partition.duplicate_filter.add(fingerprint, source)
+
+    def _partitions(self, tags) -> list[Partition]:
+        """Existing partitions of the tags, unknown tags are skipped
+        returns list of partitions
+        """
+        return [partition for partition in map(self._partition, RAGManager._tags(tags)) if partition is not None]
+
+    def tags(self) -> list[str]:
+        """Tags of documents in the database, "" is untagged ones
+        returns list of tags
+        """
+        tags = [""]
+        folder = os.path.join(self.db_path, RAGManager.PARTITIONS_FOLDER)
+        if os.path.isdir(folder):
+            for name in sorted(os.listdir(folder)):
+                path = os.path.join(folder, name, RAGManager.TAG_FILE)
+                if os.path.isfile(path):
+                    with open(path, encoding="utf-8") as f:
+                        tags.append(f.read())
+        return tags
+
+    def _chroma_store(self, name) -> Chroma:
+        return Chroma(client=self.client, collection_name=name, embedding_function=self.embedding_function)
+
+    def _segment_folders(self, collection) -> list[str]:
+        """HNSW index folders of the collection, chroma 0.4 leaves them on disk when the collection is deleted,
+        also after restart. There is no public API for segments, so internals of the chromadb version
+        pinned in requirements.txt are used, any other layout fails
+        returns list of paths
+        """
+        get_segments = getattr(getattr(self.client, "_sysdb", None), "get_segments", None)
+        if get_segments is None:
+            import chromadb
+            raise Exception(f"Unsupported chromadb {chromadb.__version__}: index files of collections can't be found")
+        return [os.path.join(self.db_path, str(segment["id"])) for segment in get_segments(collection=collection.id)]
+
+    def _drop_collection(self, name) -> None:
+        """Delete chroma collection by public API, then its index files,
+        fails before deleting if they can't be found
+        """
+        folders = self._segment_folders(self.client.get_collection(name))
+        self.client.delete_collection(name)
+        for folder in folders:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def _replace_partition(self, partition) -> None:
+        with self.partitions_lock:
+            self.partitions[partition.tag] = partition
+
+    def reset(self, tags=None) -> int:
+        """Truncates partitions of the tags, all of them if None: vector store files
+        or chroma collection and lexical index are dropped and created empty,
+        raises if index files of chroma collections can't be found
         returns # of removed records
         """
-        count = self.open()
-        # NOTE: this would work for Chroma db only!
-        collection = self.client.get_collection(RAGManager.DEFAULT_COLLECTION)
-        collection.delete()
+        tags = self.tags() if tags is None else tags
+        count = self.open(tags)
+        for partition in self._partitions(tags):
+            if self.backend == RAGManager.BACKEND_NUMPY:
+                partition.vector_store.clear()
+            else:
+                self._drop_collection(partition.name)
+                self._replace_partition(partition._replace(vector_store=self._chroma_store(partition.name)))
+            partition.lexical_index.clear()
+            partition.manifest.clear()
+            partition.duplicate_filter.clear()
+            self._count_changed(partition, reset=True)
+        self._collection_changed([partition.tag for partition in self._partitions(tags)])
         log.debug(f"Database reset, {count} records removed")
         return count
-    
-    def _documents_count(self) -> int:
-        """Count documents in database
-        returns # of records in the database
+
+    def compact(self, tags=None) -> tuple((bool, str)):
+        """Reclaim disk space of deleted chunks in partitions of the tags, all of them if None:
+        vector stores are rewritten (chroma collections rebuilt), indexes rebuilt, SQLite files vacuumed
+        returns True/False, status
         """
-        if self.client is None:
-            return 0
+        try:
+            tags = self.tags() if tags is None else tags
+            size = RAGManager._disk_size(self.db_path)
+            for partition in self._partitions(tags):
+                if self.backend == RAGManager.BACKEND_NUMPY:
+                    partition.vector_store.compact()
+                else:
+                    self._rebuild_collection(partition)
+                partition.lexical_index.compact()
+                self._count_changed(partition)
+
+            if self.backend == RAGManager.BACKEND_CHROMA:
+                with sqlite3.connect(os.path.join(self.db_path, RAGManager.CHROMA_DB_FILE)) as connection:
+                    connection.execute("VACUUM")
+
+            self._collection_changed([partition.tag for partition in self._partitions(tags)])
+            reclaimed = size - RAGManager._disk_size(self.db_path)
+            log.debug(f"Database compacted, {reclaimed} bytes reclaimed")
+            return True, f"{reclaimed}"
+        except Exception as err:
+            log.error(f"Database compaction exception: {err}")
+            return False, str(err)
+
+    def _rebuild_collection(self, partition) -> None:
+        """Copy records into a new collection and replace the old one, so HNSW index
+        and queue of the collection are built again without deleted entries
+        """
+        collection = self.client.get_collection(partition.name)
+        self._segment_folders(collection)  # fails before copying if disk space can't be reclaimed
+        temp_name = partition.name + RAGManager.COMPACT_SUFFIX
+        if any(existing.name == temp_name for existing in self.client.list_collections()):
+            self._drop_collection(temp_name)  # left by interrupted compaction
+
+        rebuilt = self.client.create_collection(temp_name, metadata=collection.metadata)
+        for offset in range(0, collection.count(), RAGManager.ADD_BATCH_SIZE):
+            records = collection.get(limit=RAGManager.ADD_BATCH_SIZE, offset=offset,
+                                     include=["embeddings", "documents", "metadatas"])
+            rebuilt.add(ids=records["ids"], embeddings=records["embeddings"], documents=records["documents"],
+                        metadatas=records["metadatas"] if all(records["metadatas"]) else None)
+
+        self._drop_collection(partition.name)
+        rebuilt.modify(name=partition.name)
+        self._replace_partition(partition._replace(vector_store=self._chroma_store(partition.name)))
 
-        # NOTE: this would work for Chroma db only!
-        for collection in self.client.list_collections():
-            if collection.name == RAGManager.DEFAULT_COLLECTION:
-                return collection.count()
-        return 0
+    @staticmethod
+    def _disk_size(path) -> int:
+        return sum(os.path.getsize(os.path.join(folder, name))
+                   for folder, _, names in os.walk(path) for name in names)
 
-    def open(self) -> int:
-        """Just open existing database
-        returns # of records in the database
+    def _collection_changed(self, tags=None) -> None:
+        """Records of partitions of the tags (all if None) changed, cached retrievals and answers are stale
         """
-        if self.vector_store is None:
-            self._open()
-            embedding_function = OpenAIEmbeddings(model=self.embedding_model, request_timeout=20.0)
-            self.vector_store = Chroma(client=self.client, embedding_function=embedding_function)
+        with self.retrieval_lock:
+            self.version += 1
+            self.retrieval_cache.clear()
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(tags)
 
-        return self._documents_count()
+    def _count_changed(self, partition, added=None, reset=False) -> None:
+        """Keep cached count current, unknown changes (deletes) are counted again on next use
+        """
+        with self.partitions_lock:
+            if reset:
+                self.counts[partition.tag] = 0
+            elif added is not None and partition.tag in self.counts:
+                self.counts[partition.tag] += added
+            else:
+                self.counts.pop(partition.tag, None)
 
-    def ingest_from_folder(self, data_folder_path) -> tuple((bool, str)):
-        """Open or create database and load documents from folder
+    def _documents_count(self, partitions) -> int:
+        """Count documents in partitions, counted once and then tracked by ingestion
+        returns # of records
+        """
+        total = 0
+        for partition in partitions:
+            with self.partitions_lock:
+                count = self.counts.get(partition.tag)
+                if count is None:
+                    if self.backend == RAGManager.BACKEND_NUMPY:
+                        count = partition.vector_store.count()
+                    else:
+                        count = self.client.get_collection(partition.name).count()
+                    self.counts[partition.tag] = count
+            total += count
+        return total
+
+    def open(self, tags=None) -> int:
+        """Just open existing database, partitions of the tags
+        returns # of records in the partitions
+        """
+        return self._documents_count(self._partitions(tags))
+
+    def ingest_from_folder(self, data_folder_path, tag="", job=None) -> tuple((bool, str)):
+        """Open or create database and load documents from folder into the partition of the tag,
+        job (IngestionJob) gets progress and may pause or cancel ingestion
         returns True/False, ingestion status
         """
         base_name = os.path.basename(data_folder_path)
@@ -145,99 +529,502 @@ class RAGManager():
         elif not ("*" in base_name or "?" in base_name):
             return False, f"Invalid search pattern {base_name}"
         
+        partition = None
         try:
-            # TODO(afedosov):
-            # define embeddings function so it's consistent for storage and query!
-            self._open()
+            partition = self._partition((tag or "").strip(), create=True)
+            spec = os.path.join(dir_name, base_name)
+            files = []
+            found = set()
+
+            # unchanged files are detected by size and time, then by content hash
+            for path in pathlib.Path(dir_name).glob(base_name):
+                if not path.is_file():
+                    continue
+                if job is not None:
+                    job.checkpoint()
+
+                path = str(path)
+                stat = os.stat(path)
+                entry = partition.manifest.get(path)
+                found.add(path)
+
+                if entry is not None and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+                    continue
 
-            documents_count = self._documents_count()
-            loader = ConcurrentLoader.from_filesystem(dir_name, glob=base_name)
-            index = VectorstoreIndexCreator(vectorstore_kwargs={"client": self.client}).from_loaders([loader])
-            count = self._documents_count() - documents_count
+                content_hash = IngestionManifest.file_hash(path)
+                if entry is not None and entry.hash == content_hash:
+                    partition.manifest.put(entry._replace(spec=spec, size=stat.st_size, mtime=stat.st_mtime))
+                    continue
 
-            if count <= 0:
+                files.append(IngestionManifest.Entry(path, spec, stat.st_size, stat.st_mtime, content_hash, []))
+
+            removed = [path for path in partition.manifest.paths(spec) if path not in found]
+
+            # files whose near-duplicate chunks were dropped in favor of changed or removed ones
+            # are ingested again, otherwise their content is lost
+            changed = {entry.path for entry in files}
+            sources = changed.union(removed)
+            while sources:
+                dependents = partition.manifest.dependents(sources) - changed - set(removed)
+                sources = set()
+                for path in dependents:
+                    entry = partition.manifest.get(path)
+                    if entry is not None and os.path.isfile(path):
+                        files.append(entry)
+                        changed.add(path)
+                        sources.add(path)
+
+            self.duplicates_skipped = 0
+            if not files and not removed:
                 return False, f"No documents found at {dir_name} or ingested before"
 
-            self.vector_store = index.vectorstore
-            log.debug(f"File documents ingested: {count=}")
+            count = 0
+            chunk_ids = {}
+            depends = {}
+            if job is not None:
+                job.start({entry.path: entry.size for entry in files})
+            # chunks of files ingested again are not duplicates of their previous version
+            for path in changed.union(removed):
+                partition.duplicate_filter.remove(path)
+
+            if files:
+                count, chunk_ids, depends = self._add_chunks(partition,
+                                                             self._load_chunks([entry.path for entry in files]), job)
+
+            # replace chunks of changed files, drop chunks of removed ones
+            stale_ids = []
+            for entry in files:
+                previous = partition.manifest.get(entry.path)
+                if previous is not None:
+                    stale_ids.extend(previous.chunk_ids)
+                partition.manifest.put(entry._replace(chunk_ids=chunk_ids.get(entry.path, [])))
+                partition.manifest.set_depends(entry.path, depends.get(entry.path, ()))
+
+            for path in removed:
+                stale_ids.extend(partition.manifest.get(path).chunk_ids)
+                partition.manifest.remove(path)
+
+            if stale_ids:
+                partition.vector_store.delete(ids=stale_ids)
+                partition.lexical_index.delete(stale_ids)
+                partition.manifest.remove_fingerprints(stale_ids)
+                self._count_changed(partition)
+                self._collection_changed([partition.tag])
+
+            log.debug(f"File documents ingested: {count=} / {len(files)} file(s) added or changed / "
+                      f"{len(removed)} file(s) removed / {len(stale_ids)} chunk(s) removed / {partition.tag=}")
             return True, f"{count}"
         except Exception as err:
             log.error(f"File documents ingestion exception: {err}")
+            if partition is not None:
+                RAGManager._seed_filter(partition)  # forgotten fingerprints of files not ingested again
             return False, str(err)
-        
-    def ingest_from_web(self, url_path, max_depth=2) -> tuple((bool, str)):
-        """Open or create database and load documents from url
+
+    def _load_chunks(self, paths) -> Iterator[Document]:
+        """Chunks of the files (generator), text files are read incrementally,
+        others (pdf) are parsed whole
+        yields chunk documents
+        """
+        text_paths = []
+        other_paths = []
+        for path in paths:
+            mimetype, _ = mimetypes.guess_type(path)
+            if mimetype is None or mimetype.startswith("text/"):
+                text_paths.append(path)
+            else:
+                other_paths.append(path)
+
+        for path in text_paths:
+            yield from self.chunker.split_file(path)
+
+        if other_paths:
+            loader = ConcurrentLoader(FileListBlobLoader(other_paths), get_parser("default"))
+            yield from self.chunker.split_documents(loader.lazy_load())
+
+    def _add_chunks(self, partition, chunks, job=None) -> tuple((int, dict, dict)):
+        """Store chunks in the partition, embedded by batches as they come, near-duplicates of stored
+        or new chunks are skipped. If ingestion fails or is cancelled, chunks stored so far are removed
+        returns # of chunks, chunk ids by document source,
+        sources of chunks kept instead of skipped ones by document source
+        """
+        chunk_ids = {}
+        depends = {}
+        batch = []
+        fingerprints = []
+        count = 0
+        skipped = 0
+
+        def AddBatch():
+            ids = [str(uuid.uuid4()) for _ in batch]
+            partition.vector_store.add_documents(batch, ids=ids)
+            partition.lexical_index.add(ids, [chunk.page_content for chunk in batch])
+            partition.manifest.put_fingerprints([(id, chunk.metadata.get("source", ""), fingerprint)
+                                                 for id, chunk, fingerprint in zip(ids, batch, fingerprints)])
+            self._count_changed(partition, added=len(ids))
+            self._collection_changed([partition.tag])
+            for chunk, id in zip(batch, ids):
+                chunk_ids.setdefault(chunk.metadata.get("source", ""), []).append(id)
+            batch.clear()
+            fingerprints.clear()
+
+        try:
+            for chunk in chunks:
+                source = chunk.metadata.get("source", "")
+                fingerprint = DuplicateFilter.fingerprint(chunk.page_content)
+                duplicate, kept_source = partition.duplicate_filter.match(fingerprint, source)
+                if duplicate:
+                    skipped += 1
+                    if kept_source != source:
+                        depends.setdefault(source, set()).add(kept_source)
+                    continue
+
+                if job is not None:
+                    job.checkpoint()
+                    job.add_chunk(source, len(self.chunker.encoding.encode(chunk.page_content)))
+
+                batch.append(chunk)
+                fingerprints.append(fingerprint)
+                count += 1
+                if len(batch) >= RAGManager.ADD_BATCH_SIZE:
+                    AddBatch()
+
+            if batch:
+                AddBatch()
+        except BaseException:
+            added_ids = [id for ids in chunk_ids.values() for id in ids]
+            if added_ids:
+                partition.vector_store.delete(ids=added_ids)
+                partition.lexical_index.delete(added_ids)
+                partition.manifest.remove_fingerprints(added_ids)
+                self._count_changed(partition)
+                self._collection_changed([partition.tag])
+            RAGManager._seed_filter(partition)
+            raise
+
+        self.duplicates_skipped = skipped
+        log.debug(f"Chunks stored: {count} / {skipped} near-duplicate(s) skipped")
+        return count, chunk_ids, depends
+
+    def ingest_from_web(self, url_path, max_depth=2, tag="", job=None) -> tuple((bool, str)):
+        """Open or create database and load documents from url into the partition of the tag,
+        job (IngestionJob) gets progress and may pause or cancel ingestion
         returns True/False, ingestion status
         """
 
-        # RecursiveUrlLoader requires fully formed url with schema
+        # Crawler requires fully formed url with schema
         ok, message = validate_url(url_path)
         if not ok:
             return False, message
         url_path = message
 
-        def extractor(x):
-            soup = BeautifulSoup(x)  # default "html.parser"
-            if soup.is_xml:
-                return ""
-            return soup.text.strip()
-
         try:
-            self._open()
+            partition = self._partition((tag or "").strip(), create=True)
+
+            # pages are chunked and embedded while crawling goes on
+            crawler = WebCrawler(max_depth=max_depth)
+            pages = EventLoopThread().run_generator(crawler.crawl(url_path))
+            try:
+                if job is not None:
+                    job.start()
+                self._add_chunks(partition, self.chunker.split_documents(pages), job)
+            finally:
+                # stops crawling if ingestion is cancelled
+                pages.close()
 
-            loader = RecursiveUrlLoader(url=url_path, max_depth=max_depth, extractor=extractor)
-            docs = loader.load()
-            docs_filtered = list(filter(lambda x:
-                                        "css" not in x.metadata["source"] and
-                                        "wp-json" not in x.metadata["source"], docs))
-            if not docs_filtered:
-                raise Exception("No pages found")
-            
-            count = len(docs_filtered)
-            log.debug(f"Web documents extracted: {count}")
-
-            index = VectorstoreIndexCreator(vectorstore_kwargs={"client": self.client}).from_documents(docs_filtered)
-            self.vector_store = index.vectorstore
-
-            log.debug(f"Web documents ingested: {count=}")
+            count = crawler.pages_count
+            if not count:
+                raise Exception(f"No pages found at {url_path}")
+
+            log.debug(f"Web documents ingested: {count=} / {partition.tag=}")
             return True, f"{count}"
         except Exception as err:
             log.error(f"Web documents ingestion exception: {err}")
             return False, str(err)
         
-    def query(self, question) -> tuple((bool, str)):
-        """ Query vector database
-        returns closest record based on similarity
+    def _vector_search(self, partitions, embeddings, k) -> list[list[tuple[str, Document, float]]]:
+        """Dense similarity search for a batch of embeddings at once, results of partitions are merged
+        returns list of lists of (id, document, cosine similarity)
+        """
+        def SearchPartition(partition):
+            if self.backend == RAGManager.BACKEND_NUMPY:
+                return partition.vector_store.similarity_search_by_vectors_with_ids(embeddings, k)
+
+            result = partition.vector_store._collection.query(query_embeddings=list(embeddings), n_results=k,
+                                                              include=["documents", "metadatas", "distances"])
+            # squared L2 distance of normalized embeddings
+            return [[(id, Document(page_content=text, metadata=metadata or {}), 1 - distance / 2)
+                     for id, text, metadata, distance in zip(*results)]
+                    for results in zip(result["ids"], result["documents"], result["metadatas"], result["distances"])]
+
+        if len(partitions) == 1:
+            return SearchPartition(partitions[0])
+
+        merged = [[] for _ in embeddings]
+        for partition in partitions:
+            for found, results in zip(merged, SearchPartition(partition)):
+                found.extend(results)
+        return [sorted(found, key=lambda result: result[2], reverse=True)[:k] for found in merged]
+
+    def _get_documents(self, partitions, ids, vectors=False) -> dict:
+        """Stored chunks, with embeddings if requested, looked up in the partitions
+        returns {id: (document, vector or None)}
+        """
+        documents = {}
+        for partition in partitions:
+            missing = [id for id in ids if id not in documents]
+            if not missing:
+                break
+
+            if self.backend == RAGManager.BACKEND_NUMPY:
+                documents.update(partition.vector_store.get_by_ids(missing, vectors))
+                continue
+
+            result = partition.vector_store.get(ids=missing,
+                                                include=["documents", "metadatas"] + (["embeddings"] if vectors else []))
+            found_vectors = result["embeddings"] if vectors else [None] * len(result["ids"])
+            documents.update({id: (Document(page_content=text, metadata=metadata or {}), vector)
+                              for id, text, metadata, vector in zip(result["ids"], result["documents"],
+                                                                    result["metadatas"], found_vectors)})
+        return documents
+
+    def _search(self, partitions, question, k, embedding, vector_results) -> list[tuple[str, Document, float]]:
+        """Hybrid search, lexical (BM25) and vector results fused by reciprocal rank
+        returns list of (id, document, cosine similarity) in fused order
+        """
+        fetch_k = max(k, RAGManager.FETCH_K)
+        lexical_results = [result for partition in partitions
+                           for result in partition.lexical_index.search(question, fetch_k)]
+        if len(partitions) > 1:
+            lexical_results = sorted(lexical_results, key=lambda result: result[1], reverse=True)[:fetch_k]
+
+        scores = {}
+        for results in ([id for id, _, _ in vector_results], [id for id, _ in lexical_results]):
+            for rank, id in enumerate(results):
+                scores[id] = scores.get(id, 0) + 1 / (RAGManager.RRF_K + rank + 1)
+        top = sorted(scores, key=scores.get, reverse=True)[:k]
+
+        # lexical only matches are scored against the question too
+        found = {id: (document, similarity) for id, document, similarity in vector_results}
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        for id, (document, vector) in self._get_documents(partitions, [id for id in top if id not in found],
+                                                          vectors=True).items():
+            vector = np.asarray(vector, dtype=np.float32)
+            found[id] = document, float(query @ vector / (np.linalg.norm(vector) or 1))
+        return [(id, *found[id]) for id in top if id in found]
+
+    def _retrieve_many(self, questions, k, embeddings=None, tags=None) -> list[list[Chunk]]:
+        """Cached or hybrid search results in partitions of the tags,
+        vector search of not cached questions is batched
+        returns list of chunk lists in questions order
+        """
+        metrics.inc("rag_retrieval_questions", len(questions), model=self.embedding_model)
+        with metrics.timer("rag_retrieval_seconds", model=self.embedding_model), \
+             tracer.span("rag_retrieval", questions=len(questions), k=k):
+            tags = RAGManager._tags(tags)
+            partitions = self._partitions(tags)
+            if not partitions:
+                return [[] for _ in questions]
+
+            if embeddings is None:
+                embeddings = self.embedding_function.embed_queries(list(questions))
+            keys = [(hashlib.sha256(np.asarray(embedding, dtype=np.float32).tobytes()).hexdigest(), k, tags)
+                    for embedding in embeddings]
+
+            with self.retrieval_lock:
+                version = self.version
+                cached = [self.retrieval_cache.get(key) for key in keys]
+                for key, ids in zip(keys, cached):
+                    if ids is not None:
+                        self.retrieval_cache.move_to_end(key)
+
+            chunks = [None] * len(questions)
+            documents = self._get_documents(partitions, list({id for ids in cached if ids is not None for id, _ in ids}))
+            for index, ids in enumerate(cached):
+                if ids is not None and all(id in documents for id, _ in ids):
+                    chunks[index] = [RAGManager.Chunk(id, documents[id][0].page_content,
+                                                      documents[id][0].metadata.get("source", ""), score,
+                                                      documents[id][0].metadata) for id, score in ids]
+
+            missing = [index for index, found in enumerate(chunks) if found is None]
+            if not missing:
+                return chunks
+
+            vector_results = self._vector_search(partitions, [embeddings[index] for index in missing],
+                                                 max(k, RAGManager.FETCH_K))
+            for index, results in zip(missing, vector_results):
+                results = self._search(partitions, questions[index], k, embeddings[index], results)
+                chunks[index] = [RAGManager.Chunk(id, document.page_content, document.metadata.get("source", ""), score,
+                                                  document.metadata) for id, document, score in results]
+
+            with self.retrieval_lock:
+                # results of a search overlapped by ingestion are not cached
+                if version == self.version:
+                    for index in missing:
+                        self.retrieval_cache[keys[index]] = [(chunk.id, chunk.score) for chunk in chunks[index]]
+                    while len(self.retrieval_cache) > RAGManager.RETRIEVAL_CACHE_SIZE:
+                        self.retrieval_cache.popitem(last=False)
+
+            return chunks
+
+    def _retrieve(self, question, k, tags=None) -> list[Chunk]:
+        return self._retrieve_many([question], k, tags=tags)[0]
+
+    def _context_budget(self, question, tags) -> int:
+        """Tokens left for chunks: model context less the answer, the chain prompt and the question
+        returns # of tokens
         """
-        if self.vector_store is None:
-            raise Exception("Assertion: ingestion failed, can't query")
+        prompt = self._get_chain(tags).combine_documents_chain.llm_chain.prompt
+        if self.prompt_tokens is None:
+            self.prompt_tokens = self.packer.count_tokens(prompt.format(summaries="", question=""))
 
         try:
-            self.llm = self.llm or OpenAI(model_name=self.ai_model, 
-                                          temperature=0, 
-                                          max_retries=1,
-                                          callbacks=[self.handler])
-
-            # Curiously enough the result of RetrievalQAWithSourcesChain call may differ
-            # from RetrievalQA with return_source_documents=True           
-            retriever = self.vector_store.as_retriever()
-            retriever.search_kwargs['k'] = RAGManager.MAX_DOCS
-            retriever.search_kwargs['fetch_k'] = RAGManager.MAX_DOCS
-
-            self.chain = self.chain or RetrievalQAWithSourcesChain.from_chain_type(
+            context_size = OpenAI.modelname_to_contextsize(self.ai_model)
+        except ValueError:
+            context_size = RAGManager.DEFAULT_CONTEXT_SIZE
+
+        # completion models reserve max_tokens, chat models (OpenAIChat) have no such limit
+        answer_tokens = getattr(self.llm, "max_tokens", None)
+        if not answer_tokens or answer_tokens < 0:
+            answer_tokens = RAGManager.ANSWER_TOKENS
+
+        free = context_size - answer_tokens - self.prompt_tokens - self.packer.count_tokens(question)
+        return min(RAGManager.MAX_CONTEXT_TOKENS, free)
+
+    def _retrieve_context(self, question, max_chunks, tags=None) -> list[Chunk]:
+        """Over-fetch candidates, then pick diverse ones by MMR within the token budget
+        returns chunks for the prompt
+        """
+        tags = RAGManager._tags(tags)
+        candidates = self._retrieve(question, RAGManager.FETCH_K, tags)
+        vectors = self._get_documents(self._partitions(tags), [chunk.id for chunk in candidates], vectors=True)
+        candidates = [chunk for chunk in candidates if chunk.id in vectors]
+
+        combine_chain = self._get_chain(tags).combine_documents_chain
+        separator_tokens = self.packer.count_tokens(combine_chain.document_separator)
+        overheads = [self.packer.count_tokens(combine_chain.document_prompt.format(page_content="", source=chunk.source))
+                     + separator_tokens for chunk in candidates]
+
+        # relevance follows the fused rank
+        relevance = [1 - rank / len(candidates) for rank in range(len(candidates))]
+        return self.packer.pack(candidates, relevance, [vectors[chunk.id][1] for chunk in candidates],
+                                self._context_budget(question, tags), max_chunks, overheads)
+
+    def retrieve(self, question, k=MAX_DOCS, tags=None) -> tuple((bool, Union[list, str])):
+        """Search vector database without LLM, hybrid lexical and vector ranking,
+        only partitions of the tag or list of tags are searched, untagged documents if None
+        returns True/False, list of Chunk (text, source, similarity score) or error
+        """
+        try:
+            chunks = self._retrieve(question, k, tags)
+            log.debug(f"RAG retrieval complete: {len(chunks)} chunk(s)")
+            return True, chunks
+        except Exception as err:
+            log.error(f"RAG retrieval exception: {err}")
+            return False, str(err)
+
+    def _get_chain(self, tags=None) -> RetrievalQAWithSourcesChain:
+        tags = RAGManager._tags(tags)
+        self.llm = self.llm or OpenAI(model_name=self.ai_model, 
+                                      temperature=0, 
+                                      max_retries=1,
+                                      callbacks=[self.handler])
+
+        # Curiously enough the result of RetrievalQAWithSourcesChain call may differ
+        # from RetrievalQA with return_source_documents=True           
+        if tags not in self.chains:
+            self.chains[tags] = RetrievalQAWithSourcesChain.from_chain_type(
                 self.llm,  
-                retriever=retriever,
+                retriever=HybridRetriever(rag_manager=self, k=RAGManager.MAX_CONTEXT_DOCS, tags=tags),
                 verbose=False
                 )
+        return self.chains[tags]
+
+    def query(self, question, tags=None) -> tuple((bool, str)):
+        """ Query vector database, partitions of the tag or list of tags, untagged documents if None
+        returns closest record based on similarity
+        """
+        tags = RAGManager._tags(tags)
+        scope = "\n".join(tags)
+
+        try:
+            if self.answer_cache is not None:
+                embedding = self.embedding_function.embed_query(question)
+                version = self.answer_cache.get_version()
+                entry = self.answer_cache.get(embedding, scope)
+                if entry is not None:
+                    log.debug(f"RAG query answered from cache: {entry.similarity:.3f} similar to {entry.question}")
+                    metrics.inc("rag_answer_cache_hits", model=self.ai_model)
+                    tracer.event("rag_answer_cache_hit", similarity=entry.similarity)
+                    return True, {"question": question, "answer": entry.answer, "sources": entry.sources}
 
             # Langchain actually combines vector db search result with prompt question and 
             # sends it to LLM for final answer compostion
-            with get_openai_callback() as cb:
-                answer = self.chain(question)
+            with get_openai_callback() as cb, metrics.timer("rag_answer_seconds", model=self.ai_model), \
+                 tracer.span("rag_answer", model=self.ai_model) as span:
+                answer = self._get_chain(tags)(question)
                 log.debug(f"RAG query, tokens used: {cb.total_tokens}")
+                span.set(tokens=cb.total_tokens)
+            metrics.inc("rag_answer_tokens", cb.total_tokens, model=self.ai_model)
                 
+            if self.answer_cache is not None:
+                self.answer_cache.put(question, embedding, answer["answer"], answer["sources"], version, scope)
+
             log.debug(f"RAG query complete: {answer}")
             return True, answer
         except Exception as err:
             log.error(f"RAG query exception: {err}")
             return False, str(err)
+
+    def query_many(self, questions, concurrency=DEFAULT_CONCURRENCY, tags=None) -> list[QueryResult]:
+        """Answer many questions: one embedding call, batched retrieval, LLM calls run concurrently,
+        partitions of the tag or list of tags are searched
+        returns list of QueryResult in questions order, failed questions have ok=False and error status
+        """
+        tags = RAGManager._tags(tags)
+        scope = "\n".join(tags)
+
+        results = [None] * len(questions)
+        try:
+            embeddings = self.embedding_function.embed_queries(list(questions))
+            version = self.answer_cache.get_version() if self.answer_cache is not None else None
+            pending = []
+            for index, (question, embedding) in enumerate(zip(questions, embeddings)):
+                entry = self.answer_cache.get(embedding, scope) if self.answer_cache is not None else None
+                if entry is not None:
+                    metrics.inc("rag_answer_cache_hits", model=self.ai_model)
+                    answer = {"question": question, "answer": entry.answer, "sources": entry.sources}
+                    results[index] = RAGManager.QueryResult(True, answer, 0, "")
+                else:
+                    pending.append(index)
+
+            # chains below find their chunks in the retrieval cache
+            self._retrieve_many([questions[index] for index in pending], RAGManager.FETCH_K,
+                                [embeddings[index] for index in pending], tags)
+            chain = self._get_chain(tags)
+        except Exception as err:
+            log.error(f"RAG query exception: {err}")
+            return [RAGManager.QueryResult(False, None, 0, str(err)) for _ in questions]
+
+        async def Query(semaphore, index):
+            async with semaphore:
+                try:
+                    with get_openai_callback() as cb, metrics.timer("rag_answer_seconds", model=self.ai_model):
+                        answer = await chain.acall(questions[index])
+                    metrics.inc("rag_answer_tokens", cb.total_tokens, model=self.ai_model)
+                    if self.answer_cache is not None:
+                        self.answer_cache.put(questions[index], embeddings[index], answer["answer"], answer["sources"],
+                                              version, scope)
+                    results[index] = RAGManager.QueryResult(True, answer, cb.total_tokens, "")
+                except Exception as err:
+                    log.error(f"RAG query exception: {err}")
+                    results[index] = RAGManager.QueryResult(False, None, 0, str(err))
+
+        async def QueryAll():
+            semaphore = asyncio.Semaphore(concurrency)
+            await asyncio.gather(*(Query(semaphore, index) for index in pending))
+
+        EventLoopThread().run_coroutine(QueryAll())
+        log.debug(f"RAG queries complete: {len(questions)} question(s) / {len(pending)} LLM call(s) / "
+                  f"{sum(result.usage_tokens for result in results)} token(s)")
+        return results
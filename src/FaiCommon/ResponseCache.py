@@ -0,0 +1,154 @@
+"""
+Filename    :   ResponseCache.py
+Copyright   :   FoundAItion Inc.
+Description :   Persistent cache of OpenAI API responses
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class ResponseCache():
+    DEFAULT_DB_PATH = r".\fai-cache.db"
+    MAX_SIZE = 64 * 1024 * 1024  # bytes
+    TTL = 7 * 24 * 3600  # sec
+    ACCESS_BATCH = 64  # access times of hits kept in memory before written
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_size=MAX_SIZE, ttl=TTL) -> None:
+        self.db_path = db_path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        self.size = 0
+        self.accessed = {}  # access times of hits not written yet, by key
+
+    @staticmethod
+    def make_key(*args) -> str:
+        """Canonical hash of the request, i.e. model, temperature, messages and functions
+        returns key
+        """
+        canonical = json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _open(self) -> sqlite3.Connection:
+        if self.connection is None:
+            folder = os.path.dirname(self.db_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+            # shared by the caller's threads and the background event loop, guarded by the lock
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, value TEXT, size INTEGER, created REAL, accessed REAL)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self.connection.commit()
+            self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            log.debug(f"Response cache opened, {self.db_path=} / {self.size} bytes")
+        return self.connection
+
+    def get(self, key):
+        """Cached response, expired ones are removed
+        returns value or None if not found
+        """
+        with self.lock:
+            connection = self._open()
+            row = connection.execute("SELECT value, size, created FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+
+            if row is not None and row[2] + self.ttl < now:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                self.size -= row[1]
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            # LRU order only matters for eviction, hits don't commit every time
+            self.accessed[key] = now
+            if len(self.accessed) >= ResponseCache.ACCESS_BATCH:
+                self._write_accessed(connection)
+                connection.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def _write_accessed(self, connection) -> None:
+        if self.accessed:
+            connection.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self.accessed.items()])
+            self.accessed.clear()
+
+    def put(self, key, value) -> None:
+        """Store response, least recently used ones are evicted above max size
+        """
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        size = len(data.encode("utf-8"))
+        if size > self.max_size:
+            return
+
+        with self.lock:
+            connection = self._open()
+            now = time.time()
+            row = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.size -= row[0]
+
+            self.accessed.pop(key, None)
+            self._write_accessed(connection)
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                               (key, data, size, now, now))
+            self.size += size
+
+            while self.size > self.max_size:
+                rows = connection.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 16").fetchall()
+                if not rows:
+                    break
+                connection.executemany("DELETE FROM responses WHERE key = ?", [(row[0],) for row in rows])
+                self.size -= sum(row[1] for row in rows)
+
+            connection.commit()
+
+    def add_saved_tokens(self, tokens) -> None:
+        self.saved_tokens += tokens
+
+    def clear(self) -> None:
+        with self.lock:
+            connection = self._open()
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+            self.size = 0
+            self.accessed.clear()
+
+    def stats(self) -> dict:
+        """Cache counters
+        returns hits, misses, saved tokens and size in bytes
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_tokens": self.saved_tokens,
+            "size": self.size,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self._write_accessed(self.connection)
+                self.connection.commit()
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,154 @@
+"""
+Filename    :   SemanticCache.py
+Copyright   :   FoundAItion Inc.
+Description :   Answer cache matched by question similarity
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import logging
+import numpy as np
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+log = logging.getLogger(__name__)
+
+
+class SemanticCache():
+    """Answers of previous questions, a new question gets the answer of the most similar cached one
+    if their embeddings are close enough. Entries belong to a collection version, a collection change
+    invalidates entries of its partitions. Scope (tags joined by new line) keeps answers of different partitions apart
+    """
+    DEFAULT_DB_NAME = "fai-answer-cache.db"
+    DEFAULT_THRESHOLD = 0.95  # cosine similarity, paraphrases of a question are usually above
+    MAX_ENTRIES = 1024
+
+    class Entry(typing.NamedTuple):
+        question: str
+        answer: str
+        sources: str
+        similarity: float
+
+    def __init__(self, db_path=DEFAULT_DB_NAME, threshold=DEFAULT_THRESHOLD, max_entries=MAX_ENTRIES) -> None:
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = None
+        self.version = 0
+        self.keys = None  # rowids of entries loaded into matrix
+        self.scopes = None  # scope of every loaded entry
+        self.matrix = None  # normalized question embeddings of current version
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self) -> sqlite3.Connection:
+        if self.connection is None:
+            folder = os.path.dirname(self.db_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS answers (
+                question TEXT, embedding BLOB, answer TEXT, sources TEXT, version INTEGER, accessed REAL,
+                scope TEXT DEFAULT '')""")
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(answers)")]
+            if "scope" not in columns:
+                self.connection.execute("ALTER TABLE answers ADD COLUMN scope TEXT DEFAULT ''")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value INTEGER)")
+            row = self.connection.execute("SELECT value FROM info WHERE key = 'version'").fetchone()
+            self.version = row[0] if row is not None else 0
+            self.connection.commit()
+            log.debug(f"Answer cache opened, {self.db_path=} / {self.version=}")
+        return self.connection
+
+    def _load(self) -> None:
+        if self.matrix is None:
+            rows = self._open().execute("SELECT rowid, embedding, scope FROM answers WHERE version = ?",
+                                        (self.version,)).fetchall()
+            self.keys = [row[0] for row in rows]
+            self.scopes = np.array([row[2] for row in rows], dtype=object)
+            self.matrix = np.array([np.frombuffer(row[1], dtype=np.float32) for row in rows], dtype=np.float32)
+
+    def get_version(self) -> int:
+        with self.lock:
+            self._open()
+            return self.version
+
+    def get(self, embedding, scope="") -> typing.Optional[Entry]:
+        """Answer of the most similar cached question of the same scope
+        returns entry or None if none is above threshold
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        with self.lock:
+            self._load()
+            if len(self.keys):
+                similarities = self.matrix @ query
+                similarities[self.scopes != scope] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    connection = self._open()
+                    connection.execute("UPDATE answers SET accessed = ? WHERE rowid = ?", (time.time(), self.keys[best]))
+                    connection.commit()
+                    row = connection.execute("SELECT question, answer, sources FROM answers WHERE rowid = ?",
+                                             (self.keys[best],)).fetchone()
+                    self.hits += 1
+                    return SemanticCache.Entry(*row, float(similarities[best]))
+
+            self.misses += 1
+            return None
+
+    def put(self, question, embedding, answer, sources, version, scope="") -> None:
+        """Cache answer, answers computed for a previous collection version are dropped
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1)
+
+        with self.lock:
+            connection = self._open()
+            if version != self.version:
+                return
+
+            connection.execute("INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (question, vector.tobytes(), answer, sources, version, time.time(), scope))
+            connection.execute("""DELETE FROM answers WHERE rowid IN (
+                SELECT rowid FROM answers ORDER BY accessed DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+            connection.commit()
+            self.matrix = None
+
+    def invalidate(self, tags=None) -> None:
+        """Partitions of the tags changed, their cached answers are stale, all answers if None.
+        Answers being computed are not cached, others are moved to the new version
+        """
+        with self.lock:
+            connection = self._open()
+            self.version += 1
+            connection.execute("INSERT OR REPLACE INTO info VALUES ('version', ?)", (self.version,))
+            if tags is None:
+                connection.execute("DELETE FROM answers")
+            else:
+                tags = set(tags)
+                stale = [(rowid,) for rowid, scope in connection.execute("SELECT rowid, scope FROM answers")
+                         if tags.intersection(scope.split("\n"))]
+                connection.executemany("DELETE FROM answers WHERE rowid = ?", stale)
+                connection.execute("UPDATE answers SET version = ?", (self.version,))
+            connection.commit()
+            self.matrix = None
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._load()
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.keys)}
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+                self.matrix = None
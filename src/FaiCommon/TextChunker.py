@@ -0,0 +1,103 @@
+"""
+Filename    :   TextChunker.py
+Copyright   :   FoundAItion Inc.
+Description :   Token-aware streaming text chunker
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from langchain.schema import Document
+
+from FaiCommon.OAIAccess import get_encoding
+
+from typing import Iterable, Iterator
+
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+
+class TextChunker():
+    DEFAULT_CHUNK_SIZE = 256  # tokens
+    DEFAULT_CHUNK_OVERLAP = 32  # tokens
+    READ_BLOCK_SIZE = 64 * 1024  # characters
+    WORD_BOUNDARY = re.compile(r"\s")
+    CHARS_PER_TOKEN = 4  # typical, text without whitespace is cut after about a chunk of it
+
+    def __init__(self, model, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP) -> None:
+        if chunk_overlap >= chunk_size:
+            raise Exception(f"Invalid chunk overlap {chunk_overlap}, must be less than chunk size {chunk_size}")
+
+        self.encoding = get_encoding(model)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_carry = chunk_size * TextChunker.CHARS_PER_TOKEN  # characters
+
+    def split_stream(self, blocks: Iterable[str]) -> Iterator[str]:
+        """Split text coming by blocks into chunks of chunk_size tokens (generator),
+        only one chunk and one block are kept in memory
+        yields chunk text
+        """
+        tokens = []
+        new_tokens = 0  # not emitted yet, the rest is overlap with the previous chunk
+        carry = ""
+
+        def Encode(text):
+            nonlocal new_tokens
+            encoded = self.encoding.encode(text)
+            tokens.extend(encoded)
+            new_tokens += len(encoded)
+
+        for block in blocks:
+            text = carry + block
+
+            # tokenize up to the last whitespace, so words are not cut between blocks
+            boundary = max((match.start() for match in TextChunker.WORD_BOUNDARY.finditer(text, len(carry))), default=-1)
+            if boundary < 0:
+                if len(text) < self.max_carry:
+                    carry = text
+                    continue
+                # no word boundary, e.g. minified JSON or base64, not to buffer all of it
+                boundary = len(text)
+            carry = text[boundary:]
+            Encode(text[:boundary])
+
+            while len(tokens) >= self.chunk_size:
+                yield self.encoding.decode(tokens[:self.chunk_size])
+                del tokens[:self.chunk_size - self.chunk_overlap]
+                new_tokens = len(tokens) - self.chunk_overlap
+
+        if carry:
+            Encode(carry)
+
+        while new_tokens > 0:
+            chunk = self.encoding.decode(tokens[:self.chunk_size])
+            if chunk.strip():
+                yield chunk
+            del tokens[:self.chunk_size - self.chunk_overlap]
+            new_tokens = len(tokens) - self.chunk_overlap
+
+    def split_text(self, text: str) -> Iterator[str]:
+        return self.split_stream([text])
+
+    def split_file(self, path, encoding="utf-8") -> Iterator[Document]:
+        """Split text file, read incrementally (generator)
+        yields chunk documents with file path as a source
+        """
+        def ReadBlocks():
+            with open(path, encoding=encoding, errors="replace") as f:
+                for block in iter(lambda: f.read(TextChunker.READ_BLOCK_SIZE), ""):
+                    yield block
+
+        for chunk in self.split_stream(ReadBlocks()):
+            yield Document(page_content=chunk, metadata={"source": path})
+
+    def split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Split loaded documents (generator)
+        yields chunk documents with the metadata of the original document
+        """
+        for document in documents:
+            for chunk in self.split_text(document.page_content):
+                yield Document(page_content=chunk, metadata=dict(document.metadata))
@@ -0,0 +1,209 @@
+"""
+Filename    :   Tracer.py
+Copyright   :   FoundAItion Inc.
+Description :   Nested trace spans, Chrome trace event JSON export
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+import collections
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Tracer():
+    """In-process recorder of nested timed spans with attributes. Singleton class.
+    Disabled unless enable() is called or FAI_TRACE environment variable is set,
+    then spans are no-op objects. Open in chrome://tracing or ui.perfetto.dev
+    """
+    instance = None
+
+    MAX_SPANS = 100000  # finished spans kept, oldest dropped
+    CATEGORY = "fai"
+
+    current_span = contextvars.ContextVar("current_span", default=None)
+
+    class Span():
+        """Timed stage, parent is the current span if not given. As context manager
+        it becomes the current span of the block, otherwise call end()
+        """
+        def __init__(self, tracer, name, parent, attributes) -> None:
+            self.tracer = tracer
+            self.name = name
+            self.id = next(tracer.ids)
+            self.parent_id = parent.id if parent is not None else None
+            self.attributes = attributes
+            self.thread_id = threading.get_ident()
+            self.thread_name = threading.current_thread().name
+            self.start_time = time.perf_counter()
+            self.end_time = None
+            self.token = None
+
+        def set(self, **attributes) -> None:
+            self.attributes.update(attributes)
+
+        def event(self, name, /, **attributes) -> None:
+            self.tracer.event(name, **attributes)
+
+        def end(self, **attributes) -> None:
+            if self.end_time is not None:
+                return
+            self.attributes.update(attributes)
+            self.end_time = time.perf_counter()
+            self.tracer._finish(self)
+
+        def __enter__(self):
+            self.token = Tracer.current_span.set(self)
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            Tracer.current_span.reset(self.token)
+            if exc_type is not None:
+                self.attributes["error"] = f"{exc_type.__name__}: {exc_value}"
+            self.end()
+            return False
+
+    class NullSpan():
+        id = None
+
+        def set(self, **attributes) -> None:
+            pass
+
+        def event(self, name, /, **attributes) -> None:
+            pass
+
+        def end(self, **attributes) -> None:
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            return False
+
+    class Attach():
+        def __init__(self, span) -> None:
+            self.span = span
+            self.token = None
+
+        def __enter__(self):
+            self.token = Tracer.current_span.set(self.span)
+            return self.span
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            Tracer.current_span.reset(self.token)
+            return False
+
+    NULL_SPAN = NullSpan()
+
+    def __new__(cls, *args, **kwargs):
+        if not isinstance(cls.instance, cls):
+            cls.instance = super(Tracer, cls).__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> None:
+        if getattr(self, "lock", None) is not None:
+            return
+
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.spans = collections.deque(maxlen=Tracer.MAX_SPANS)  # finished spans and instant events
+        self.thread_names = {}
+        self.epoch = time.perf_counter()
+        self.enabled = bool(os.getenv("FAI_TRACE"))
+
+    def enable(self, enabled=True) -> None:
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        with self.lock:
+            self.spans.clear()
+            self.thread_names.clear()
+
+    def current(self):
+        return Tracer.current_span.get()
+
+    def span(self, name, /, **attributes):
+        """Span of the block (context manager), child of the current span
+        returns span, no-op if disabled
+        """
+        if not self.enabled:
+            return Tracer.NULL_SPAN
+        return Tracer.Span(self, name, Tracer.current_span.get(), attributes)
+
+    def start(self, name, /, parent=None, **attributes):
+        """Span ended explicitly, e.g. a stage spread over UI frames or an async generator,
+        child of parent or the current span
+        returns span, no-op if disabled
+        """
+        if not self.enabled:
+            return Tracer.NULL_SPAN
+        parent = parent if parent is not None else Tracer.current_span.get()
+        return Tracer.Span(self, name, parent if isinstance(parent, Tracer.Span) else None, attributes)
+
+    def attach(self, span):
+        """Make span the current one for the block, e.g. in a callback or another thread
+        returns context manager
+        """
+        return Tracer.Attach(span)
+
+    def event(self, name, /, **attributes) -> None:
+        """Instant event in the current span
+        """
+        if not self.enabled:
+            return
+        parent = Tracer.current_span.get()
+        self._record(name, time.perf_counter(), None, threading.get_ident(), threading.current_thread().name,
+                     parent.id if isinstance(parent, Tracer.Span) else None, attributes)
+
+    def _finish(self, span) -> None:
+        self._record(span.name, span.start_time, span.end_time, span.thread_id, span.thread_name, span.parent_id,
+                     dict(span.attributes, id=span.id))
+
+    def _record(self, name, start_time, end_time, thread_id, thread_name, parent_id, attributes) -> None:
+        if parent_id is not None:
+            attributes["parent"] = parent_id
+        with self.lock:
+            self.thread_names.setdefault(thread_id, thread_name)
+            self.spans.append((name, start_time, end_time, thread_id, attributes))
+
+    def chrome_trace(self) -> dict:
+        """Chrome trace event format: complete events for spans, instant events,
+        thread names; nested spans of a thread are drawn inside their parents
+        returns {"traceEvents": [...]}
+        """
+        def Value(value):
+            return value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+
+        pid = os.getpid()
+        events = []
+        with self.lock:
+            for thread_id, thread_name in self.thread_names.items():
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                               "args": {"name": thread_name}})
+
+            for name, start_time, end_time, thread_id, attributes in self.spans:
+                event = {"name": name, "cat": Tracer.CATEGORY, "pid": pid, "tid": thread_id,
+                         "ts": (start_time - self.epoch) * 1e6,
+                         "args": {key: Value(value) for key, value in attributes.items()}}
+                if end_time is None:
+                    event.update(ph="i", s="t")
+                else:
+                    event.update(ph="X", dur=(end_time - start_time) * 1e6)
+                events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path) -> None:
+        """Write Chrome trace event JSON
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        log.debug(f"Trace saved, {path=}")
@@ -4,10 +4,11 @@ Copyright   :   FoundAItion Inc.
 Description :   Voice recognition
 Written by  :   Alex Fedosov
 Created     :   06/29/2023
-Updated     :   06/29/2023
+Updated     :   10/17/2026
 """
 
 from vosk import Model, KaldiRecognizer
+from FaiCommon.Metrics import Metrics
 
 import json
 import logging
@@ -20,6 +21,7 @@ import time
 import threading
 
 log = logging.getLogger(__name__)
+metrics = Metrics()
 
 
 class VoicePlayerAsync(threading.Thread):
@@ -97,6 +99,7 @@ class VoiceCog():
         else:
             full_path_to_model = os.path.join(os.path.dirname(__file__), model_path)
 
+        self.model_name = model_name
         model = Model(full_path_to_model)
         self.recognizer = KaldiRecognizer(model, VoiceCog.SAMPLING_RATE)
         log.debug(f"Model loaded, {full_path_to_model=}")
@@ -110,6 +113,7 @@ class VoiceCog():
         returns text
         """
         result = ""
+        listen_start_time = time.monotonic()
 
         try:
             audio = pyaudio.PyAudio()
@@ -137,12 +141,15 @@ class VoiceCog():
                     result = result + VoiceCog.WORD_DELIMITER + text
 
             log.debug(f"Voice recognition result: {result}")
+            metrics.observe("voice_recognition_seconds", time.monotonic() - listen_start_time, model=self.model_name)
             return result
         except KeyboardInterrupt as err:
             log.error(f"Voice recognition interrupt: {err}")
+            metrics.error("voice_recognition", type(err).__name__, model=self.model_name)
             return ""
         except Exception as err:
             log.error(f"Voice recognition exception: {err}")
+            metrics.error("voice_recognition", type(err).__name__, model=self.model_name)
             return ""
         finally:
             stream.close()
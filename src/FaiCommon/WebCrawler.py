@@ -0,0 +1,162 @@
+"""
+Filename    :   WebCrawler.py
+Copyright   :   FoundAItion Inc.
+Description :   Concurrent web crawler for ingestion
+Written by  :   Alex Fedosov
+Created     :   10/17/2026
+Updated     :   10/17/2026
+"""
+
+from langchain.schema import Document
+
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin, urlparse, urlunparse
+
+from typing import AsyncIterator, Optional
+
+import aiohttp
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class WebCrawler():
+    MAX_CONNECTIONS = 32
+    MAX_PER_HOST = 8  # concurrent requests to the same host
+    MAX_PAGES = 500
+    TIMEOUT = 20  # sec
+    DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+    # skipped without downloading
+    SKIPPED_EXTENSIONS = (".css", ".js", ".json", ".xml", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico",
+                          ".pdf", ".zip", ".mp3", ".mp4", ".woff", ".woff2")
+    SKIPPED_PATTERNS = ("css", "wp-json")
+
+    def __init__(self, max_depth=2, max_pages=MAX_PAGES, max_per_host=MAX_PER_HOST) -> None:
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_per_host = max_per_host
+        self.pages_count = 0
+
+    @staticmethod
+    def normalize_url(url) -> Optional[str]:
+        """Canonical url to dedup pages: lower case scheme and host, no default port, no fragment
+        returns url or None if not http(s)
+        """
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        if scheme not in WebCrawler.DEFAULT_PORTS:
+            return None
+
+        netloc = parsed.netloc.lower()
+        if netloc.endswith(WebCrawler.DEFAULT_PORTS[scheme]):
+            netloc = netloc[:-len(WebCrawler.DEFAULT_PORTS[scheme])]
+        return urlunparse((scheme, netloc, parsed.path or "/", parsed.params, parsed.query, ""))
+
+    @staticmethod
+    def _is_skipped(url) -> bool:
+        path = urlparse(url).path.lower()
+        return path.endswith(WebCrawler.SKIPPED_EXTENSIONS) or \
+            any(pattern in url for pattern in WebCrawler.SKIPPED_PATTERNS)
+
+    @staticmethod
+    def _is_under(url, root) -> bool:
+        """Same scheme and host, path is the root path or below it, not a sibling sharing its prefix
+        returns True if url is in the crawled scope
+        """
+        parsed_url = urlparse(url)
+        parsed_root = urlparse(root)
+        if (parsed_url.scheme, parsed_url.netloc) != (parsed_root.scheme, parsed_root.netloc):
+            return False
+
+        root_path = parsed_root.path.rstrip("/")
+        return parsed_url.path.rstrip("/") == root_path or parsed_url.path.startswith(root_path + "/")
+
+    async def crawl(self, url) -> AsyncIterator[Document]:
+        """Crawl pages under url, up to max_depth levels and max_pages pages (async generator)
+        yields page documents as they arrive
+        """
+        root = WebCrawler.normalize_url(url)
+        if root is None:
+            return
+
+        frontier = asyncio.Queue()
+        pages = asyncio.Queue()
+        visited = {root}
+        frontier.put_nowait((root, 0))
+        self.pages_count = 0
+
+        connector = aiohttp.TCPConnector(limit=WebCrawler.MAX_CONNECTIONS, limit_per_host=self.max_per_host)
+        timeout = aiohttp.ClientTimeout(total=WebCrawler.TIMEOUT)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def Worker():
+                while True:
+                    page_url, depth = await frontier.get()
+                    try:
+                        page = await self._fetch(session, page_url)
+                        if page is None:
+                            continue
+
+                        text, links = page
+                        if depth + 1 < self.max_depth:
+                            for link in links:
+                                if len(visited) >= self.max_pages:
+                                    break
+                                if link not in visited and WebCrawler._is_under(link, root) and not WebCrawler._is_skipped(link):
+                                    visited.add(link)
+                                    frontier.put_nowait((link, depth + 1))
+
+                        if text:
+                            await pages.put(Document(page_content=text, metadata={"source": page_url}))
+                    except Exception as err:
+                        log.debug(f"Page {page_url} skipped: {err}")
+                    finally:
+                        frontier.task_done()
+
+            workers = [asyncio.create_task(Worker()) for _ in range(WebCrawler.MAX_CONNECTIONS)]
+            crawled = asyncio.create_task(frontier.join())
+
+            try:
+                while True:
+                    getter = asyncio.create_task(pages.get())
+                    done, _ = await asyncio.wait({getter, crawled}, return_when=asyncio.FIRST_COMPLETED)
+                    if getter not in done and getter.cancel():
+                        break
+
+                    self.pages_count += 1
+                    yield getter.result()
+
+                while not pages.empty():
+                    self.pages_count += 1
+                    yield pages.get_nowait()
+            finally:
+                crawled.cancel()
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(crawled, *workers, return_exceptions=True)
+
+        log.debug(f"Web crawl complete: {root} / {self.pages_count} page(s) / {len(visited)} url(s)")
+
+    async def _fetch(self, session, url) -> Optional[tuple[str, list]]:
+        """Download html page, other content types are rejected before the body is read
+        returns page text and normalized links or None
+        """
+        async with session.get(url) as response:
+            content_type = response.headers.get("Content-Type", "")
+            if response.status >= 400 or "html" not in content_type:
+                log.debug(f"Page {url} skipped: {response.status} / {content_type}")
+                return None
+
+            html = await response.text(errors="replace")
+            base_url = str(response.url)
+
+        soup = BeautifulSoup(html, "html.parser")
+        links = []
+        for anchor in soup.find_all("a", href=True):
+            link = WebCrawler.normalize_url(urljoin(base_url, anchor["href"]))
+            if link is not None:
+                links.append(link)
+
+        return soup.get_text().strip(), links
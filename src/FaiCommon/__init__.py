@@ -4,9 +4,13 @@ Copyright   :   FoundAItion Inc.
 Description :   Common FAI library
 Written by  :   Alex Fedosov
 Created     :   06/29/2023
-Updated     :   07/27/2023
+Updated     :   10/17/2026
 """
 
 __all__ = (
-    "OpenAIAccess", "VoiceCog", "ImageCog", "VoicePlayer", "VoicePlayerAsync", "RAGManager"
+    "OpenAIAccess", "AsyncOpenAIAccess", "VoiceCog", "ImageCog", "VoicePlayer", "VoicePlayerAsync", "RAGManager",
+    "ResponseCache", "EmbeddingCache", "IngestionManifest", "TextChunker", "WebCrawler",
+    "DuplicateFilter", "NumpyVectorStore", "EmbeddingQuantizer", "BM25Index", "SemanticCache", "ContextPacker",
+    "IngestionWorker", "IngestionJob", "RAGBenchmark", "OAIStandIn", "Metrics", "Tracer", "ConversationHistory",
+    "ChatSession"
 )
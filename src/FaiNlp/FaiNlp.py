@@ -4,7 +4,7 @@ Copyright   :   FoundAItion Inc.
 Description :   Application entry point and UI classes
 Written by  :   Alex Fedosov
 Created     :   06/26/2023
-Updated     :   10/16/2023
+Updated     :   10/17/2026
 """
 
 try:
@@ -36,8 +36,13 @@ from kivymd.uix.snackbar import MDSnackbar
 
 from PIL import Image as PilImage
 
+from FaiCommon.IngestionWorker import IngestionJob, IngestionWorker
+from FaiCommon.Metrics import Metrics
 from FaiCommon.OAIAccess import OpenAIAccess
 from FaiCommon.RAGManager import RAGManager
+from FaiCommon.ResponseCache import ResponseCache
+from FaiCommon.SemanticCache import SemanticCache
+from FaiCommon.Tracer import Tracer
 from FaiNlpUI import LoadMainUIFromString
 from FaiNlpLicense import License
 
@@ -60,8 +65,11 @@ Window.size = (1000, 700)
 
 
 class FeatureFlags:
+    ANSWER_CACHE = True  # RAG answers reused for near-identical questions, SemanticCache.DEFAULT_THRESHOLD
     FULL_VERSION = True
     IMAGE_RECOGNITION = False
+    METRICS = False  # saved to fai-metrics.prom / .json on exit, FAI_METRICS environment variable turns it on too
+    TRACING = False  # saved to fai-trace.json on exit, FAI_TRACE environment variable turns it on too
     VOICE_RECOGNITION = False
 
     def __init__(self, *args, **kwargs):
@@ -187,6 +195,14 @@ class RootWidget(MDScreen):
         self.voice_cog = None
         self.image_cog = None
         self.voice_player = None
+        self.fn_generator = None
+
+        if FeatureFlags.METRICS:
+            Metrics().enable()
+        if FeatureFlags.TRACING:
+            Tracer().enable()
+        self.run_span = Tracer.NULL_SPAN
+        self.round_span = Tracer.NULL_SPAN
 
         gc.set_debug(gc.DEBUG_STATS)
         # gc.set_debug(gc.DEBUG_SAVEALL)
@@ -196,6 +212,11 @@ class RootWidget(MDScreen):
     def stop(self):
         if self.voice_player is not None:
             self.voice_player.stop()
+        if Metrics().enabled:
+            Metrics().dump(Main.get_data_path("fai-metrics.prom"))
+            Metrics().dump(Main.get_data_path("fai-metrics.json"))
+        if Tracer().enabled:
+            Tracer().dump(Main.get_data_path("fai-trace.json"))
         os._exit(0)
 
     def on_kv_post(self, base_widget):
@@ -215,9 +236,12 @@ class RootWidget(MDScreen):
         embedding_model = self.ids.embedding_model.text
         ai_temperature = self.ids.ai_temperature.value
 
-        self.oai_access = OpenAIAccess(ai_model, ai_temperature, embedding_model)
+        # replayed prompts with zero temperature are answered from the cache
+        response_cache = ResponseCache(Main.get_data_path("fai-cache.db"))
+        self.oai_access = OpenAIAccess(ai_model, ai_temperature, embedding_model, cache=response_cache)
         self.main_graph = Image()
         self.rag_manager = None
+        self.ingestion_worker = None
 
         if FeatureFlags.FULL_VERSION:
             self.voice_cog = VoiceCog(audio_model)
@@ -239,10 +263,18 @@ class RootWidget(MDScreen):
         ai_model = self.ids.ai_model.text
         embedding_model = self.ids.embedding_model.text
         embedding_database = Main.get_data_path(self.ids.embedding_database.text)
-        self.rag_manager = self.rag_manager or RAGManager(ai_model, embedding_model, embedding_database)
+        answer_threshold = SemanticCache.DEFAULT_THRESHOLD if FeatureFlags.ANSWER_CACHE else None
+        self.rag_manager = self.rag_manager or RAGManager(ai_model, embedding_model, embedding_database,
+                                                          answer_threshold=answer_threshold)
+
+    def _get_tags(self):
+        """Comma separated tags of the Tuning panel, empty is untagged documents
+        returns list of tags
+        """
+        return [tag.strip() for tag in self.ids.ingestion_tag.text.split(",") if tag.strip()]
 
     def _open_rag_manager(self):
-        count = self.rag_manager.open()
+        count = self.rag_manager.open(self._get_tags())
         self.ids.ingest_status.text = f"Storage initialized, loaded {count} pages"
 
     def save_settings(self, *args):
@@ -280,17 +312,65 @@ class RootWidget(MDScreen):
             self._open_rag_manager()
             return
 
+        tags = self._get_tags()
+        if len(tags) > 1:
+            self.ids.ingest_status.text = "Ingest into one tag at a time"
+            return
+        tag = tags[0] if tags else ""
+
         MDSnackbar(MDLabel(text="Data ingestion is in progress...")).open()
 
+        # ingestion runs in background, progress is shown as it goes
         if ingestion_folder:
-            ok, status = self.rag_manager.ingest_from_folder(ingestion_folder)
+            self._get_ingestion_worker().submit_folder(ingestion_folder, tag=tag)
         else:
-            ok, status = self.rag_manager.ingest_from_web(ingestion_url, max_depth=2)
+            self._get_ingestion_worker().submit_web(ingestion_url, max_depth=2, tag=tag)
 
-        if not ok:
-            self.ids.ingest_status.text = f"Storage error: {status}"
+    def ingest_pause(self, *args):
+        job = self.ingestion_worker.current if self.ingestion_worker is not None else None
+        if job is None:
+            return
+
+        if job.state == IngestionJob.PAUSED:
+            job.resume()
+            self.ids.ingest_pause.text = "Pause"
+        else:
+            job.pause()
+            self.ids.ingest_pause.text = "Resume"
+
+    def ingest_cancel(self, *args):
+        if self.ingestion_worker is not None:
+            self.ingestion_worker.cancel_all()
+            self.ids.ingest_pause.text = "Pause"
+
+    def _get_ingestion_worker(self):
+        self.ingestion_worker = self.ingestion_worker or IngestionWorker(self.rag_manager, self._on_ingest_progress)
+        return self.ingestion_worker
+
+    def _on_ingest_progress(self, progress):
+        # called from the worker thread, UI is updated on the main one
+        Clock.schedule_once(lambda dt: self._show_ingest_progress(progress))
+
+    def _show_ingest_progress(self, progress):
+        queued = self.ingestion_worker.queued_count()
+        queued_text = f", {queued} job(s) queued" if queued else ""
+
+        if progress.state == IngestionJob.QUEUED:
+            self.ids.ingest_status.text = f"Ingestion queued{queued_text}"
+        elif progress.state in (IngestionJob.RUNNING, IngestionJob.PAUSED):
+            files_text = f"{progress.files}/{progress.files_total}" if progress.files_total is not None else f"{progress.files}"
+            eta_text = f", ETA {progress.eta:.0f} sec" if progress.eta is not None else ""
+            self.ids.ingest_status.text = f"{progress.state}: {files_text} page(s), {progress.chunks} chunk(s), " \
+                                          f"{progress.tokens} token(s){eta_text}{queued_text}"
+        elif progress.state == IngestionJob.FAILED:
+            self.ids.ingest_status.text = f"Storage error: {progress.status}"
+        elif progress.state == IngestionJob.CANCELLED:
+            self.ids.ingest_status.text = f"Ingestion cancelled{queued_text}"
+        elif progress.kind == IngestionJob.RESET:
+            self.ids.ingest_status.text = f"Reset is complete, {progress.status} record(s) removed{queued_text}"
         else:
-            self.ids.ingest_status.text = f"Loaded {status} page(s)"
+            self.ids.ingest_status.text = f"Loaded {progress.status} page(s), {progress.duplicates} duplicate(s) skipped" \
+                                          f"{queued_text}"
 
     def voice_play(self, *args):
         if self.voice_cog is None:
@@ -362,29 +442,31 @@ class RootWidget(MDScreen):
     def reset(self, *args):
         MDSnackbar(MDLabel(text="Database reset is in progress...")).open()
         self._create_rag_manager()
-        count = self.rag_manager.reset()
-        self.ids.ingest_status.text = f"Reset is complete, {count} record(s) removed"
+        # queued after ingestion jobs, if any; no tags clears the whole database
+        self._get_ingestion_worker().submit_reset(self._get_tags() or None)
 
     def visualize_object(self, description):
         if not description:
             return "No description"
         
-        image_str = self.oai_access.create_image(description)
-        if not image_str:
-            return "No image generated"
-        
-        image_binary = base64.b64decode(image_str)
-        return self.show_image(image_binary)
+        with Tracer().span("visualize_object"):
+            image_str = self.oai_access.create_image(description)
+            if not image_str:
+                return "No image generated"
+
+            image_binary = base64.b64decode(image_str)
+            return self.show_image(image_binary)
 
     def show_image(self, image_binary):
         try:
-            image_data = io.BytesIO(image_binary)
-            image_texture = CoreImage(image_data, ext="png").texture
-            
-            self.ids.main_graph_widget.remove_widget(self.main_graph)
-            self.main_graph = Image(texture=image_texture)
-            self.ids.main_graph_widget.add_widget(self.main_graph)
-            image_data.close()
+            with Tracer().span("show_image", size=len(image_binary)):
+                image_data = io.BytesIO(image_binary)
+                image_texture = CoreImage(image_data, ext="png").texture
+
+                self.ids.main_graph_widget.remove_widget(self.main_graph)
+                self.main_graph = Image(texture=image_texture)
+                self.ids.main_graph_widget.add_widget(self.main_graph)
+                image_data.close()
         except Exception as err:
             return "Image generation error {}".format(str(err))
         return "Complete"
@@ -444,23 +526,29 @@ class RootWidget(MDScreen):
         # or show bar chart of 15 numbers, each one is randomly selected from range 1 to 50
         # or load salary data and show them as a plot
         ai_prompt = self.ids.ai_prompt.text.strip()
-        total_tokens = 0
-        response = ""
-        status = ""
 
         if not ai_prompt:
             self.ids.prompt_status.text = "Empty prompt"
             self.ids.ai_response.text = ""
             return
+
+        # one span for the whole run, spread over UI frames, previous run (if any) is abandoned
+        self.round_span.end(abandoned=True)
+        self.run_span.end(abandoned=True)
+        self._close_run()
+        self.run_span = Tracer().start("run", prompt=ai_prompt, use_context=self.ids.prompt_use_in_context.active,
+                                       functions=bool(args[0]))
         
         # More flexible with "use context" checkbox
         # if self.rag_manager is not None:
         # 
         if self.ids.prompt_use_in_context.active:
-            self._create_rag_manager()
-            self._open_rag_manager()
-            print("Use in-context learning, RAG")
-            ok, ai_response = self.rag_manager.query(ai_prompt)
+            with Tracer().attach(self.run_span), Tracer().span("rag"):
+                with Tracer().span("rag_open"):
+                    self._create_rag_manager()
+                    self._open_rag_manager()
+                print("Use in-context learning, RAG")
+                ok, ai_response = self.rag_manager.query(ai_prompt, tags=self._get_tags())
             if ok:
                 answer = ai_response["answer"]
                 source = ai_response['sources']
@@ -472,56 +560,100 @@ class RootWidget(MDScreen):
                 if answer.find("I don\'t know") == -1:
                     self.ids.prompt_status.text = f"Source: {source}"
                     self.ids.ai_response.text = answer
+                    self.run_span.end(source=source)
                     return
 
+        self.trace = []
+
+        if args[0]:
+            fn_declaration = RootWidget.FN_DECLARATION
+            print("Using LLM function-calling")
+        else:
+            fn_declaration = None
+
+        # Streamed completion, pulled one item per frame so partial response is rendered
+        # as it arrives, previous run (if any) is abandoned
+        self.fn_generator = self.oai_access.complete_with_multi_fun(
+            ai_prompt,
+            fn_declaration,
+            keep_history = self.ids.prompt_keep_history.active,
+            stream = True
+            )
+        self.run_start_time = time.monotonic()
+        self.run_round = 0
+        self.round_span = Tracer().start("completion_round", parent=self.run_span, round=self.run_round)
+        self.run_total_tokens = 0
+        self.run_response = ""
+        self.ids.ai_response.text = ""
+        self.ids.prompt_status.text = "In progress"
+        self._schedule_run_step(self.fn_generator, None)
+
+    def _close_run(self):
+        # abandoned or finished completion, its async generator and HTTP stream are released
+        if self.fn_generator is not None:
+            self.fn_generator.close()
+            self.fn_generator = None
+
+    def _schedule_run_step(self, fn_generator, fn_call_result):
+        Clock.schedule_once(lambda dt: self._run_step(fn_generator, fn_call_result))
+
+    def _run_step(self, fn_generator, fn_call_result):
+        if fn_generator is not self.fn_generator:
+            return  # stale run
+
         try:
-            self.trace = []
-
-            if args[0]:
-                fn_declaration = RootWidget.FN_DECLARATION
-                print("Using LLM function-calling")
-            else:
-                fn_declaration = None
-
-            fn_generator = self.oai_access.complete_with_multi_fun(
-                ai_prompt,
-                fn_declaration,
-                keep_history = self.ids.prompt_keep_history.active
-                )
-            start_time = time.monotonic()
-            result = next(fn_generator)
-
-            while True:
-                total_tokens = total_tokens + result.usage_tokens
-                if not result.fn_called:
-                    status = f"Complete"
-                    # say it if there were no previous function calling, pure completion
-                    if not response:
-                        response = result.response
-                        if self.voice_player is not None and self.ids.voice_play.state == "down":
-                            self.ids.ai_response.text = response
-                            self.ids.ai_response.canvas.ask_update()
-                            self.voice_player.play(response)
-                    break
-                
-                response = response + "Call " + result.response + " ( " + result.status + " )\n"
-                _, fn_call_result = self.handle_fn_call(result.response, result.status)
+            # first send(None) is the same as next()
+            with Tracer().attach(self.round_span):
                 result = fn_generator.send(fn_call_result)
 
-            completion_time = time.monotonic() - start_time
+            if isinstance(result, str):
+                if not self.run_response:
+                    if not self.ids.ai_response.text:
+                        self.round_span.set(first_token_ms=(time.monotonic() - self.run_start_time) * 1000)
+                    self.ids.ai_response.text += result
+                self._schedule_run_step(fn_generator, None)
+                return
+
+            self.run_total_tokens = self.run_total_tokens + result.usage_tokens
+            self.round_span.end(tokens=result.usage_tokens, fn_called=result.fn_called,
+                                function=result.response if result.fn_called else None)
+            if result.fn_called:
+                self.run_response = self.run_response + "Call " + result.response + " ( " + result.status + " )\n"
+                self.ids.ai_response.text = self.run_response
+                with Tracer().attach(self.run_span), Tracer().span("function", function=result.response):
+                    _, fn_call_result = self.handle_fn_call(result.response, result.status)
+                self.run_round += 1
+                self.round_span = Tracer().start("completion_round", parent=self.run_span, round=self.run_round)
+                self._schedule_run_step(fn_generator, fn_call_result)
+                return
+
+            status = f"Complete"
+            response = self.run_response
+            # say it if there were no previous function calling, pure completion
+            if not response:
+                response = result.response
+                if self.voice_player is not None and self.ids.voice_play.state == "down":
+                    with Tracer().attach(self.run_span), Tracer().span("tts", characters=len(response)):
+                        self.voice_player.play(response)
+
+            completion_time = time.monotonic() - self.run_start_time
             print(f"OAI call(s) complete in {completion_time:.2f} sec")
 
             if self.trace:
-                fig = gobj.Figure(data=self.trace)
-                fig.update_layout(font=dict(size=30))
-                self.show_image(fig.to_image("png", width=1400, height=1400))
+                with Tracer().attach(self.run_span), Tracer().span("plot", traces=len(self.trace)):
+                    fig = gobj.Figure(data=self.trace)
+                    fig.update_layout(font=dict(size=30))
+                    self.show_image(fig.to_image("png", width=1400, height=1400))
 
         except Exception as err:
             response = ""
             status = str(err)
+            self.round_span.end(error=status)
 
+        self.run_span.end(status=status, tokens=self.run_total_tokens, rounds=self.run_round + 1)
+        self._close_run()
         self.ids.ai_response.text = response
-        self.ids.prompt_status.text = f"{status}, {total_tokens} token(s) used"
+        self.ids.prompt_status.text = f"{status}, {self.run_total_tokens} token(s) used"
 
 
 class FaiNlp(MDApp):
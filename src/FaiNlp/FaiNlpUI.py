@@ -4,7 +4,7 @@ Copyright   :   FoundAItion Inc.
 Description :   Main user interface widgets
 Written by  :   Alex Fedosov
 Created     :   06/26/2023
-Updated     :   09/26/2023
+Updated     :   10/17/2026
 """
 
 from kivy.lang import Builder
@@ -124,6 +124,17 @@ RootWidget:
                                 pos_hint: {'top': 0.2, 'right': 0.3}
                                 size_hint: .1, .1
                                 on_release: root.reset(*args)
+                            MDRoundFlatButton:
+                                id: ingest_pause
+                                text: 'Pause'
+                                pos_hint: {'top': 0.2, 'right': 0.45}
+                                size_hint: .1, .1
+                                on_release: root.ingest_pause(*args)
+                            MDRoundFlatButton:
+                                text: 'Cancel'
+                                pos_hint: {'top': 0.2, 'right': 0.6}
+                                size_hint: .1, .1
+                                on_release: root.ingest_cancel(*args)
 
                 MDBottomNavigationItem:
                     name: 'LearningDialog'